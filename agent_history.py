@@ -0,0 +1,144 @@
+# Token-budgeted conversation history for the agent loop in talk2mcp-2.py
+import re
+
+# A failed tool result starts with one of these, as does a failed draw_batch
+# item after its "N. " number. Matching only there keeps a drawn text such as
+# "error bars" from reading as a failure.
+_FAILURE = re.compile(r"^\[?(?:error|verification failed)|(?:^\[?|, )\d+\. error", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    """Rough token count for `text` (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def _short_args(arguments):
+    """Compact one-line rendering of a tool call's arguments"""
+    parts = []
+    for key, value in arguments.items():
+        value = str(value)
+        if len(value) > 40:
+            value = value[:37] + "..."
+        parts.append(f"{key}={value}")
+    return ", ".join(parts)
+
+
+def _short_result(result_str, limit=80):
+    result_str = " ".join(result_str.split())
+    return result_str if len(result_str) <= limit else result_str[:limit - 3] + "..."
+
+
+def result_failed(result):
+    """
+    Whether a tool result reports an error or a failed verification. `result`
+    is a result string or a list of content texts, which fails if any item does.
+    """
+    if isinstance(result, list):
+        return any(result_failed(item) for item in result)
+    return _FAILURE.search(result) is not None
+
+
+class ConversationHistory:
+    """
+    Stores each iteration of the agent loop once and renders it for the next prompt.
+
+    The most recent iterations are rendered in full, as long as they fit into
+    the token budget. Older ones, and recent ones too large to fit, are
+    shortened to a one-line summary each, and once even those no longer fit
+    they are folded into a single running tally of tool calls. The rendered
+    history therefore stays within `token_budget` tokens no matter how many
+    iterations have run or how large their results are.
+    """
+
+    def __init__(self, token_budget=1500, keep_recent=3):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        # One (full_text, short_text, tool_name, failed) tuple per iteration
+        self.entries = []
+        # entries[:folded] have been folded into the tally below
+        self.folded = 0
+        self.tally = {}
+        self.tally_errors = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add_call(self, iteration, func_name, arguments, result_str):
+        """Record a tool call and the result it returned"""
+        full = (f"In iteration {iteration}, you called {func_name} with arguments {arguments}, "
+                f"and the function returned {result_str}.")
+        short = f"#{iteration} {func_name}({_short_args(arguments)}) -> {_short_result(result_str)}"
+        self.entries.append((full, short, func_name, result_failed(result_str)))
+
+    def add_error(self, iteration, message):
+        """Record an iteration that failed before a tool result was available"""
+        full = f"Error in iteration {iteration}: {message}"
+        self.entries.append((full, f"#{iteration} error: {_short_result(message)}", None, True))
+
+    def add_skipped(self, iteration, count):
+        """Record that the rest of a multi-action turn was not run after a failure"""
+        full = f"The {count} action(s) after iteration {iteration} were not run because it failed."
+        self.entries.append((full, f"#{iteration} skipped {count} action(s)", None, False))
+
+    def add_note(self, iteration, text, failed=False):
+        """Record a message from the client itself, e.g. the outcome of a plan it ran"""
+        self.entries.append((text, f"#{iteration} {_short_result(text)}", None, failed))
+
+    def _fold(self, upto):
+        for _, _, func_name, failed in self.entries[self.folded:upto]:
+            if func_name:
+                self.tally[func_name] = self.tally.get(func_name, 0) + 1
+            self.tally_errors += failed
+        self.folded = upto
+
+    def _tally_line(self):
+        if not self.folded:
+            return None
+        calls = ", ".join(f"{name} x{count}" for name, count in self.tally.items())
+        return (f"Iterations 1-{self.folded} (summarised): called {calls or 'no tools'}; "
+                f"{self.tally_errors} reported errors.")
+
+    def render(self):
+        """Return the history text for the next prompt, within the token budget"""
+        budget = self.token_budget
+        # Leave room for the tally line, which only grows by a few tokens over time
+        tally = self._tally_line()
+        reserve = estimate_tokens(tally) + 16 if tally else 32
+
+        full_lines, short_lines = [], []
+        used = reserve
+        index = len(self.entries)
+        # The newest `keep_recent` iterations in full, while they fit
+        while index > self.folded and len(full_lines) < self.keep_recent:
+            full = self.entries[index - 1][0]
+            cost = estimate_tokens(full)
+            if used + cost > budget:
+                break
+            full_lines.append(full)
+            used += cost
+            index -= 1
+        # Older iterations as one-line summaries
+        while index > self.folded:
+            short = self.entries[index - 1][1]
+            cost = estimate_tokens(short)
+            if used + cost > budget:
+                break
+            short_lines.append(short)
+            used += cost
+            index -= 1
+        # Anything older than that is folded into the tally for good
+        if index > self.folded:
+            self._fold(index)
+
+        while True:
+            tally = self._tally_line()
+            parts = [tally] if tally else []
+            if short_lines:
+                parts.append("Earlier iterations: " + " | ".join(reversed(short_lines)))
+            parts.extend(reversed(full_lines))
+            text = " ".join(parts)
+            # The tally can outgrow its reserve; fold the oldest summaries until it fits
+            if estimate_tokens(text) <= budget or not short_lines:
+                return text
+            short_lines.pop()
+            self._fold(self.folded + 1)
@@ -0,0 +1,106 @@
+# Client-side verification of drawing steps for the agent loop in talk2mcp-2.py.
+# Verification is deterministic, so instead of spending an LLM round trip on every
+# verify_task call the client tracks what should be on the canvas and runs the
+# checks itself; the model only hears about them when one fails.
+import re
+
+from agent_history import result_failed
+
+VERIFY_POLICIES = ("off", "each", "every", "end")
+
+_OBSERVED_SHAPES = re.compile(r"Canvas shows (\d+) shape")
+
+
+class VerifyPolicy:
+    """
+    When to verify: "off" (the model calls verify_task itself), "each" drawing
+    call, "every:N" drawing calls, or only at the "end" before the final answer.
+    """
+
+    def __init__(self, mode="off", every=1):
+        if mode not in VERIFY_POLICIES:
+            raise ValueError(f"Unknown verify policy: {mode} (expected one of {', '.join(VERIFY_POLICIES)})")
+        if every < 1:
+            raise ValueError("The verify interval must be at least 1")
+        self.mode = mode
+        self.every = every
+
+    @classmethod
+    def parse(cls, spec):
+        """Build a policy from "off", "each", "every:N" or "end" """
+        mode, _, every = (spec or "off").strip().lower().partition(":")
+        if mode == "each":
+            return cls("every", 1)
+        return cls(mode, int(every) if every else 1)
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    def __str__(self):
+        return f"every:{self.every}" if self.mode == "every" else self.mode
+
+
+class AutoVerifier:
+    """Tracks the shapes and texts drawn so far and decides when to check them"""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.shapes = 0
+        self.texts = 0
+        # Successful drawing calls since the last check
+        self.pending = 0
+
+    def record(self, func_name, arguments, iteration_result):
+        """Account for a tool call's result; returns whether it drew anything"""
+        if func_name == "open_paint":
+            # A new canvas starts empty
+            self.shapes = self.texts = self.pending = 0
+            return False
+        results = iteration_result if isinstance(iteration_result, list) else [str(iteration_result)]
+        kinds = []
+        if func_name == "draw_batch":
+            operations = arguments.get("operations") or []
+            kinds = [
+                "text" if op.get("type") == "text" else "shape"
+                for op, result in zip(operations, results)
+                if _drew(result)
+            ]
+        elif func_name == "add_text_in_paint" or func_name.startswith("draw_"):
+            if all(_drew(result) for result in results):
+                kinds = ["text" if func_name == "add_text_in_paint" else "shape"]
+        self.texts += kinds.count("text")
+        self.shapes += kinds.count("shape")
+        self.pending += len(kinds)
+        return bool(kinds)
+
+    def due(self, final=False):
+        """Whether the checks should run now; `final` when the model is about to finish"""
+        if not self.policy.enabled or not self.pending:
+            return False
+        return final or (self.policy.mode == "every" and self.pending >= self.policy.every)
+
+    def checks(self):
+        """verify_task arguments for the current expectations"""
+        checks = [{"task": "shape", "expected_count": self.shapes}]
+        if self.texts:
+            # Texts are typed at the same spot and may merge, so only require some text
+            checks.append({"task": "text"})
+        return checks
+
+    def observe(self, arguments, result_str):
+        """
+        Take a check's result into account. After a failed shape check the
+        expectation is reset to what the canvas actually shows, so the model
+        is told about a discrepancy once rather than on every later check.
+        """
+        self.pending = 0
+        if arguments["task"] == "shape" and result_failed(result_str):
+            match = _OBSERVED_SHAPES.search(result_str)
+            if match:
+                self.shapes = int(match.group(1))
+
+
+def _drew(result):
+    """Whether a drawing result reports success (not an error, nor a closed canvas)"""
+    return not result_failed(result) and "not open" not in result
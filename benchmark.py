@@ -0,0 +1,217 @@
+# End-to-end throughput benchmark of the agent loop against the headless tool server.
+# A scripted stand-in replaces Gemini, so no API key, network or Windows desktop is needed.
+#
+#   python benchmark.py --sizes 1 10 100 1000 [--no-verify] [--stream] [--actions-per-turn N]
+#                      [--auto-verify POLICY] [--planner] [--error-rate P] [--slow-rate P] [--hedge PCT]
+#                      [--json results.json]
+# See --help for every option.
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+# The agent must talk to the headless backend and always run its loop, never a cache
+os.environ["PAINT_BACKEND"] = "headless"
+os.environ.setdefault("LLM_CACHE_MODE", "off")
+# Keep the server's per-request INFO logging out of the output
+os.environ.setdefault("PAINT_LOG_LEVEL", "WARNING")
+
+from mcp import ClientSession
+
+from server_pool import connect
+from tracing import percentile
+from fake_llm import FlakyModel, ScriptedModel, plan_workload, shape_workload
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def load_agent():
+    """Import talk2mcp-2.py, whose file name is not a valid module name"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "talk2mcp-2.py")
+    spec = importlib.util.spec_from_file_location("talk2mcp", path)
+    agent = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(agent)
+    return agent
+
+
+def peak_rss_mb(who):
+    """Peak resident set size in MB of this process or of its largest child so far"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # Linux reports kilobytes, macOS bytes
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return usage.ru_maxrss / scale
+
+
+class TimedSession:
+    """Wraps a ClientSession and records the latency of every call_tool"""
+
+    def __init__(self, session):
+        self.session = session
+        self.latencies = []
+        self.by_tool = {}
+
+    async def call_tool(self, name, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self.session.call_tool(name, *args, **kwargs)
+        finally:
+            latency = time.perf_counter() - started
+            self.latencies.append(latency)
+            self.by_tool.setdefault(name, []).append(latency)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+# Trailing explanation a chatty model adds after its one action line
+CHATTER = "\nI called the tool above because it is the next step of the plan, and I will verify it afterwards."
+
+
+class TimedGenerator:
+    """Wraps the agent's ResilientGenerator and records how long each LLM turn took, retries included"""
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.latencies = []
+
+    async def generate(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self.generator.generate(*args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self.generator, name)
+
+
+async def run_workload(agent, shapes, options):
+    # With client-side verification the model no longer asks for verify_task itself
+    client_verifies = agent.VerifyPolicy.parse(options.auto_verify).enabled
+    if options.planner:
+        script = plan_workload(shapes, verify=options.verify and not client_verifies)
+    else:
+        script = shape_workload(shapes, verify=options.verify and not client_verifies,
+                                actions_per_turn=options.actions_per_turn)
+    multi_action = options.actions_per_turn > 1
+    llm = ScriptedModel(script, chatter=CHATTER if options.chunk_delay else "", chunk_delay=options.chunk_delay)
+    # Injected faults; the fallback model shares the script, so either can answer any turn
+    model = FlakyModel(llm, options.error_rate, options.slow_rate, options.slow_delay, seed=1, model_name="primary")
+    fallbacks = [FlakyModel(llm, options.error_rate, options.slow_rate, options.slow_delay, seed=2,
+                            model_name="fallback")] if options.fallback else []
+    agent.STREAM_RESPONSES = options.stream
+    generator = agent.ResilientGenerator(agent.generate_with_timeout, retries=options.retries,
+                                         timeout=options.llm_timeout, hedge_percentile=options.hedge,
+                                         backoff=0.05, tracer=agent.tracer)
+    agent.llm_generator = timed_llm = TimedGenerator(generator)
+
+    started = time.perf_counter()
+    async with connect(agent.server_params()) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            tools = (await session.list_tools()).tools
+            startup = time.perf_counter() - started
+            system_prompt = agent.build_system_prompt(agent.build_tools_description(tools, verbose=False),
+                                                      multi_action, options.auto_verify, options.planner)
+
+            timed = TimedSession(session)
+            state = agent.AgentState(llm=model, multi_action=multi_action, verify=options.auto_verify,
+                                     fallbacks=fallbacks, planner=options.planner)
+            loop_started = time.perf_counter()
+            # The loop's progress logging is not what is being measured
+            with contextlib.redirect_stdout(io.StringIO()):
+                await agent.run_agent(timed, tools, system_prompt, f"Draw {shapes} shapes", state)
+            elapsed = time.perf_counter() - loop_started
+
+    if state.error:
+        raise RuntimeError(f"{shapes}-shape run failed: {state.error}")
+    failed_checks = sum(1 for entry in state.history.entries if entry[3])
+    iterations = llm.turns
+    return {
+        "shapes": shapes,
+        "iterations": iterations,
+        "llm_requests": llm.calls + model.errors + sum(f.errors for f in fallbacks),
+        "server_startup_s": round(startup, 3),
+        "loop_s": round(elapsed, 3),
+        "iterations_per_s": round(iterations / elapsed, 1),
+        "prompt_bytes_mean": round(statistics.mean(llm.prompt_bytes)),
+        "prompt_bytes_max": max(llm.prompt_bytes),
+        "llm_turn_p50_ms": round(percentile(timed_llm.latencies, 50) * 1000, 2),
+        "llm_turn_p99_ms": round(percentile(timed_llm.latencies, 99) * 1000, 2),
+        "llm_retries": generator.retried,
+        "llm_hedges": generator.hedges,
+        "llm_fallbacks": generator.fallbacks,
+        "tool_call_p50_ms": round(percentile(timed.latencies, 50) * 1000, 2),
+        "tool_call_p95_ms": round(percentile(timed.latencies, 95) * 1000, 2),
+        "tool_call_p50_ms_by_tool": {
+            name: round(percentile(values, 50) * 1000, 2) for name, values in sorted(timed.by_tool.items())
+        },
+        "failed_results": failed_checks,
+        "client_peak_rss_mb": peak_rss_mb("self"),
+        "server_peak_rss_mb": peak_rss_mb("children"),
+    }
+
+
+def print_table(results):
+    columns = [
+        ("shapes", "shapes"), ("iterations", "iters"), ("loop_s", "loop s"), ("iterations_per_s", "iter/s"),
+        ("prompt_bytes_mean", "prompt B"), ("prompt_bytes_max", "max B"),
+        ("llm_turn_p50_ms", "llm p50"), ("llm_turn_p99_ms", "llm p99"),
+        ("tool_call_p50_ms", "tool p50"), ("tool_call_p95_ms", "tool p95"),
+        ("failed_results", "failed"), ("client_peak_rss_mb", "client MB"), ("server_peak_rss_mb", "server MB"),
+    ]
+    print("  ".join(f"{title:>9}" for _, title in columns))
+    for result in results:
+        cells = []
+        for key, _ in columns:
+            value = result[key]
+            cells.append(f"{value:>9.1f}" if isinstance(value, float) else f"{str(value):>9}")
+        print("  ".join(cells))
+
+
+async def main(sizes, options, output):
+    agent = load_agent()
+    results = []
+    for shapes in sizes:
+        results.append(await run_workload(agent, shapes, options))
+    print_table(results)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop with a scripted LLM and the headless canvas")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000], help="shape counts to run")
+    parser.add_argument("--no-verify", dest="verify", action="store_false",
+                        help="skip the verify_task call after each shape")
+    parser.add_argument("--stream", action="store_true", help="stream responses and stop at the first action line")
+    parser.add_argument("--chunk-delay", type=float, default=0.0,
+                        help="seconds the scripted LLM takes per response chunk; also makes it append chatter")
+    parser.add_argument("--actions-per-turn", type=int, default=1,
+                        help="FUNCTION_CALL lines per scripted response; above 1 runs the agent in multi-action mode")
+    parser.add_argument("--auto-verify", default="off",
+                        help="client-side verification policy (off, each, every:N, end) instead of scripted verify_task calls")
+    parser.add_argument("--planner", action="store_true", help="script one structured plan that the client executes")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability that an LLM request fails")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="probability that an LLM request stalls")
+    parser.add_argument("--slow-delay", type=float, default=2.0, help="seconds a stalled LLM request takes")
+    parser.add_argument("--retries", type=int, default=2, help="LLM retries per model")
+    parser.add_argument("--llm-timeout", type=float, default=10.0, help="LLM per-attempt deadline before latencies are known")
+    parser.add_argument("--hedge", type=float, help="hedge LLM requests slower than this latency percentile")
+    parser.add_argument("--fallback", action="store_true", help="add a fallback model with the same faults")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args, args.json))
@@ -0,0 +1,215 @@
+# Pixel-based canvas analysis backing verify_task
+import numpy as np
+
+# A pixel counts as ink when the sum of its RGB channels is below this value.
+# Catches black and coloured strokes but not white paper or Paint's grey margin.
+INK_THRESHOLD = 480
+
+# Size of the tiles used to find which parts of the canvas changed between captures
+TILE_SIZE = 64
+
+# Components no larger than this (in either direction) are treated as glyphs of text
+GLYPH_MAX_SIZE = 24
+
+# Components smaller than this many pixels are treated as noise and ignored
+MIN_COMPONENT_AREA = 3
+
+# Slack, in pixels, around the known text and shape boxes passed to CanvasAnalyzer.summary
+BOX_MARGIN = 4
+
+
+def ink_mask(frame):
+    """Return a bool mask of the dark pixels in an (H, W, 3) uint8 frame"""
+    return frame.sum(axis=2, dtype=np.uint16) < INK_THRESHOLD
+
+
+def label_components(mask):
+    """
+    Label the 8-connected components of a 2D bool mask.
+    Returns (ys, xs, labels): the coordinates of every set pixel and a
+    component id per pixel, ids being 0..N-1.
+    Union-find over pixel adjacency, with hooking and pointer jumping done as
+    whole-array NumPy operations instead of a per-pixel Python loop.
+    """
+    h, w = mask.shape
+    ys, xs = np.nonzero(mask)
+    count = len(ys)
+    if count == 0:
+        return ys, xs, np.zeros(0, dtype=np.int64)
+
+    # Map every set pixel to a dense id
+    ids = np.full((h, w), -1, dtype=np.int64)
+    ids[ys, xs] = np.arange(count)
+
+    # Edges to the right, down, down-right and down-left neighbours
+    edges_a, edges_b = [], []
+    for dy, dx in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        if dx >= 0:
+            src, dst = ids[: h - dy, : w - dx], ids[dy:, dx:]
+        else:
+            src, dst = ids[: h - dy, -dx:], ids[dy:, : w + dx]
+        linked = (src >= 0) & (dst >= 0)
+        edges_a.append(src[linked])
+        edges_b.append(dst[linked])
+    a = np.concatenate(edges_a)
+    b = np.concatenate(edges_b)
+
+    parent = np.arange(count)
+    while True:
+        pa, pb = parent[a], parent[b]
+        differ = pa != pb
+        if not differ.any():
+            break
+        # Hook the larger root under the smaller one
+        np.minimum.at(parent, np.maximum(pa, pb)[differ], np.minimum(pa, pb)[differ])
+        # Pointer jumping until every pixel points at its root
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+    _, labels = np.unique(parent, return_inverse=True)
+    return ys, xs, labels
+
+
+def component_boxes(ys, xs, labels):
+    """Return (boxes, areas) for labelled pixels; boxes are (x0, y0, x1, y1), end exclusive"""
+    n = int(labels.max()) + 1 if len(labels) else 0
+    boxes = np.empty((n, 4), dtype=np.int64)
+    boxes[:, 0] = np.iinfo(np.int64).max
+    boxes[:, 1] = np.iinfo(np.int64).max
+    boxes[:, 2] = -1
+    boxes[:, 3] = -1
+    np.minimum.at(boxes[:, 0], labels, xs)
+    np.minimum.at(boxes[:, 1], labels, ys)
+    np.maximum.at(boxes[:, 2], labels, xs + 1)
+    np.maximum.at(boxes[:, 3], labels, ys + 1)
+    areas = np.bincount(labels, minlength=n)
+    return boxes, areas
+
+
+def dirty_windows(previous, current):
+    """Return the (x0, y0, x1, y1) windows of tiles that differ between two frames"""
+    h, w = current.shape[:2]
+    th, tw = -(-h // TILE_SIZE), -(-w // TILE_SIZE)
+    # Compare channel bytes row-wise; reducing over the channel axis first is much slower
+    padded = np.zeros((th * TILE_SIZE, tw * TILE_SIZE * 3), dtype=bool)
+    padded[:h, : w * 3] = (previous != current).reshape(h, w * 3)
+    tiles = padded.reshape(th, TILE_SIZE, tw, TILE_SIZE * 3).any(axis=(1, 3))
+
+    # Group neighbouring dirty tiles into one window each
+    ys, xs, labels = label_components(tiles)
+    boxes, _ = component_boxes(ys, xs, labels)
+    boxes *= TILE_SIZE
+    boxes[:, 2] = np.minimum(boxes[:, 2], w)
+    boxes[:, 3] = np.minimum(boxes[:, 3], h)
+    return [tuple(int(v) for v in box) for box in boxes]
+
+
+def group_text_regions(boxes):
+    """Merge glyph boxes that sit next to each other on a line into text regions"""
+    n = len(boxes)
+    if n == 0:
+        return boxes
+    heights = boxes[:, 3] - boxes[:, 1]
+    gap = np.maximum(heights[:, None], heights[None, :])
+    # Glyphs belong together when they overlap vertically and are at most one glyph height apart
+    v_overlap = (np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+                 - np.maximum(boxes[:, None, 1], boxes[None, :, 1])) > -2
+    h_gap = np.maximum(boxes[:, None, 0], boxes[None, :, 0]) - np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    adjacent = v_overlap & (h_gap <= gap)
+
+    group = np.arange(n)
+    while True:
+        # Every glyph takes the smallest group id among its neighbours
+        merged = np.where(adjacent, group[None, :], n).min(axis=1)
+        merged = np.minimum(merged, group)
+        if np.array_equal(merged, group):
+            break
+        group = merged
+    _, regions = np.unique(group, return_inverse=True)
+    out = np.empty((regions.max() + 1, 4), dtype=np.int64)
+    out[:, :2] = np.iinfo(np.int64).max
+    out[:, 2:] = -1
+    np.minimum.at(out[:, 0], regions, boxes[:, 0])
+    np.minimum.at(out[:, 1], regions, boxes[:, 1])
+    np.maximum.at(out[:, 2], regions, boxes[:, 2])
+    np.maximum.at(out[:, 3], regions, boxes[:, 3])
+    return out
+
+
+class CanvasAnalyzer:
+    """
+    Counts the objects on a canvas from captured frames.
+    Keeps the component boxes found so far and, on every new frame, only
+    relabels the windows whose pixels changed since the previous frame.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.boxes = np.empty((0, 4), dtype=np.int64)
+        self.areas = np.empty(0, dtype=np.int64)
+
+    def update(self, frame):
+        """Bring the cached components up to date with `frame`"""
+        if self.frame is None or self.frame.shape != frame.shape:
+            h, w = frame.shape[:2]
+            self.boxes = np.empty((0, 4), dtype=np.int64)
+            self.areas = np.empty(0, dtype=np.int64)
+            self._relabel(frame, (0, 0, w, h))
+        else:
+            for window in dirty_windows(self.frame, frame):
+                self._relabel(frame, window)
+        self.frame = frame
+
+    def _relabel(self, frame, window):
+        h, w = frame.shape[:2]
+        x0, y0, x1, y1 = window
+        # Grow the window until no cached component touches its border, so
+        # labelling inside it cannot split or miss a component
+        while len(self.boxes):
+            touching = ((self.boxes[:, 0] <= x1) & (self.boxes[:, 2] >= x0)
+                        & (self.boxes[:, 1] <= y1) & (self.boxes[:, 3] >= y0))
+            if not touching.any():
+                break
+            hit = self.boxes[touching]
+            x0, y0 = min(x0, int(hit[:, 0].min())), min(y0, int(hit[:, 1].min()))
+            x1, y1 = max(x1, int(hit[:, 2].max())), max(y1, int(hit[:, 3].max()))
+            self.boxes = self.boxes[~touching]
+            self.areas = self.areas[~touching]
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, w), min(y1, h)
+
+        ys, xs, labels = label_components(ink_mask(frame[y0:y1, x0:x1]))
+        boxes, areas = component_boxes(ys + y0, xs + x0, labels)
+        self.boxes = np.concatenate([self.boxes, boxes])
+        self.areas = np.concatenate([self.areas, areas])
+
+    def summary(self, text_boxes=(), shape_boxes=()):
+        """
+        Return (shape_boxes, text_region_boxes) for the current frame.
+        `text_boxes` and `shape_boxes` are the (x1, y1, x2, y2) boxes where text
+        and shapes are known to have been drawn. Components inside a text box
+        are glyphs and components inside a shape box are shapes, whatever their
+        size; only components outside both are told apart by GLYPH_MAX_SIZE.
+        """
+        keep = self.areas >= MIN_COMPONENT_AREA
+        boxes = self.boxes[keep]
+        size = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        glyphs = size <= GLYPH_MAX_SIZE
+        # Text written inside a shape lies in both, so text boxes are applied last
+        glyphs &= ~_inside_any(boxes, shape_boxes)
+        glyphs |= _inside_any(boxes, text_boxes)
+        return boxes[~glyphs], group_text_regions(boxes[glyphs])
+
+
+def _inside_any(boxes, known):
+    """Bool per box: whether it lies within one of the `known` boxes, give or take BOX_MARGIN"""
+    if not len(known):
+        return np.zeros(len(boxes), dtype=bool)
+    known = np.asarray(known, dtype=np.int64).reshape(-1, 4)
+    known[:, :2] -= BOX_MARGIN
+    known[:, 2:] += BOX_MARGIN
+    inside = ((boxes[:, None, 0] >= known[None, :, 0]) & (boxes[:, None, 1] >= known[None, :, 1])
+              & (boxes[:, None, 2] <= known[None, :, 2]) & (boxes[:, None, 3] <= known[None, :, 3]))
+    return inside.any(axis=1)
@@ -0,0 +1,217 @@
+# Independent canvases per client session, within a memory budget.
+#
+# Every session of a shared server draws on its own canvas, with its own
+# analyzer, snapshot cache and scene graph of the primitives drawn. When more canvases are in memory than
+# PAINT_MAX_CANVASES, or they hold more than PAINT_CANVAS_BUDGET_MB, the least
+# recently used ones are spilled to compressed PNG files and reloaded the next
+# time their session uses them. Each process spills into its own temporary
+# directory (inside PAINT_SPILL_DIR when set), so servers sharing a spill
+# directory never overwrite each other's canvases.
+#
+# Loading, spilling and drawing all run on the UI worker thread, so a canvas is
+# never spilled halfway through a draw.
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from canvas_snapshot import SnapshotCache
+from scene_graph import SceneGraph
+from shapes import SHAPES
+from tracing import Tracer
+
+tracer = Tracer.from_env("server")
+
+
+class ManagedCanvas:
+    """
+    One session's canvas. Exposes the backend interface (is_open, open,
+    draw_shape, draw_shapes, draw_path, add_text, capture); each call first has the
+    manager bring the canvas back into memory if it was spilled. Drawing calls
+    record what they drew in the scene graph and return the primitive IDs.
+    """
+
+    def __init__(self, key, backend, manager):
+        self.key = key
+        self.backend = backend
+        self.manager = manager
+        self.snapshots = SnapshotCache()
+        self.analyzer = None
+        # Vector data is small, so the scene stays in memory when the pixels are spilled
+        self.scene = SceneGraph()
+        # Set while the canvas lives on disk only
+        self.spill_path = None
+        self.last_used = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.spill_path is not None or self.backend.is_open
+
+    @property
+    def resident(self):
+        return self.spill_path is None and self.backend.is_open
+
+    @property
+    def nbytes(self):
+        analyzer = 0 if self.analyzer is None or self.analyzer.frame is None else self.analyzer.frame.nbytes
+        return getattr(self.backend, "nbytes", 0) + analyzer + self.snapshots.nbytes
+
+    def get_analyzer(self):
+        """Return the canvas analyzer, importing NumPy on first use"""
+        if self.analyzer is None:
+            from canvas_analysis import CanvasAnalyzer
+            self.analyzer = CanvasAnalyzer()
+        return self.analyzer
+
+    def open(self):
+        # A fresh canvas replaces any spilled one, so there is nothing to reload
+        self.manager.forget_spill(self)
+        self.manager.touch(self)
+        self.backend.open()
+        self.scene.clear()
+        self.manager.enforce(keep=self)
+
+    def draw_shape(self, shape, x1, y1, x2, y2):
+        return self.draw_shapes(shape, [(x1, y1, x2, y2)])[0]
+
+    def draw_shapes(self, shape, boxes):
+        self.manager.touch(self)
+        self.backend.draw_shapes(shape, boxes)
+        return [self.scene.add(SHAPES[shape].name, box) for box in boxes]
+
+    def draw_path(self, points):
+        self.manager.touch(self)
+        self.backend.draw_path(points)
+        (x1, y1), (x2, y2) = points.min(axis=0).tolist(), points.max(axis=0).tolist()
+        return self.scene.add("path", (x1, y1, x2, y2))
+
+    def add_text(self, text, x=None, y=None, size=None, font=None):
+        self.manager.touch(self)
+        box = self.backend.add_text(text, x, y, size, font)
+        return self.scene.add("text", box, text)
+
+    def capture(self):
+        self.manager.touch(self)
+        return self.backend.capture()
+
+
+class CanvasManager:
+    """
+    ManagedCanvas per key, created with `factory()` on first use. At most
+    `max_canvases` canvases and `max_bytes` bytes stay in memory; the canvas
+    in use is never evicted, so a single canvas over the byte budget stays.
+    Backends without save/load/unload (MS Paint) are never spilled.
+    """
+
+    def __init__(self, factory, max_canvases=32, max_bytes=1024 << 20, spill_dir=None):
+        self.factory = factory
+        self.max_canvases = max_canvases
+        self.max_bytes = max_bytes
+        # Parent of this manager's spill directory, the system default when None
+        self.spill_root = spill_dir
+        # Created on the first spill and removed by close()
+        self.spill_dir = None
+        self._canvases = OrderedDict()
+        self._lock = threading.RLock()
+        self.spills = 0
+        self.reloads = 0
+
+    @classmethod
+    def from_env(cls, factory):
+        """Configure from PAINT_MAX_CANVASES, PAINT_CANVAS_BUDGET_MB and PAINT_SPILL_DIR"""
+        return cls(
+            factory,
+            max_canvases=int(os.getenv("PAINT_MAX_CANVASES", "32")),
+            max_bytes=int(float(os.getenv("PAINT_CANVAS_BUDGET_MB", "1024")) * (1 << 20)),
+            spill_dir=os.getenv("PAINT_SPILL_DIR") or None,
+        )
+
+    def get(self, key):
+        """The canvas of `key`, created (not yet opened) on first use"""
+        with self._lock:
+            canvas = self._canvases.get(key)
+            if canvas is None:
+                canvas = self._canvases[key] = ManagedCanvas(key, self.factory(), self)
+            return canvas
+
+    def touch(self, canvas):
+        """Mark `canvas` most recently used and reload it if it was spilled (UI thread)"""
+        with self._lock:
+            canvas.last_used = time.monotonic()
+            if canvas.key in self._canvases:
+                self._canvases.move_to_end(canvas.key)
+            if canvas.spill_path is not None:
+                with tracer.span("canvas.reload", key=canvas.key):
+                    canvas.backend.load(canvas.spill_path)
+                self.forget_spill(canvas)
+                self.reloads += 1
+                self.enforce(keep=canvas)
+
+    def enforce(self, keep=None):
+        """Spill least recently used canvases until the limits hold again (UI thread)"""
+        with self._lock:
+            resident = [c for c in self._canvases.values()
+                        if c.resident and c is not keep and hasattr(c.backend, "save")]
+            count = sum(1 for c in self._canvases.values() if c.resident)
+            used = sum(c.nbytes for c in self._canvases.values() if c.resident)
+            for canvas in resident:
+                if count <= self.max_canvases and used <= self.max_bytes:
+                    break
+                used -= canvas.nbytes
+                count -= 1
+                self._spill(canvas)
+
+    def _spill(self, canvas):
+        if self.spill_dir is None:
+            if self.spill_root is not None:
+                os.makedirs(self.spill_root, exist_ok=True)
+            self.spill_dir = tempfile.mkdtemp(prefix=f"paint-canvases-{os.getpid()}-", dir=self.spill_root)
+        path = os.path.join(self.spill_dir, f"{canvas.key}.png")
+        with tracer.span("canvas.spill", key=canvas.key):
+            canvas.backend.save(path)
+        canvas.backend.unload()
+        canvas.spill_path = path
+        # The analyzer and snapshots are rebuilt from the reloaded canvas
+        canvas.analyzer = None
+        canvas.snapshots.invalidate()
+        self.spills += 1
+
+    def forget_spill(self, canvas):
+        if canvas.spill_path is not None:
+            try:
+                os.remove(canvas.spill_path)
+            except OSError:
+                pass
+            canvas.spill_path = None
+
+    def discard(self, key):
+        """Drop the canvas of `key` from memory and disk, e.g. when its session ends"""
+        with self._lock:
+            canvas = self._canvases.pop(key, None)
+            if canvas is not None:
+                self.forget_spill(canvas)
+
+    def close(self):
+        """Remove the spill directory with every spilled canvas file"""
+        with self._lock:
+            for canvas in self._canvases.values():
+                self.forget_spill(canvas)
+            if self.spill_dir is not None:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
+
+    def stats(self):
+        with self._lock:
+            canvases = list(self._canvases.values())
+            return {
+                "canvases": len(canvases),
+                "in_memory": sum(1 for c in canvases if c.resident),
+                "spilled": sum(1 for c in canvases if c.spill_path is not None),
+                "memory_mb": round(sum(c.nbytes for c in canvases if c.resident) / (1 << 20), 1),
+                "max_canvases": self.max_canvases,
+                "budget_mb": round(self.max_bytes / (1 << 20), 1),
+                "spills": self.spills,
+                "reloads": self.reloads,
+            }
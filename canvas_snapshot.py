@@ -0,0 +1,111 @@
+# Encoded snapshots of the canvas for the canvas://snapshot resource and the
+# get_canvas_snapshot tool. Frames and encodings are cached until a draw tool
+# changes the canvas, so clients can poll it cheaply.
+import io
+import threading
+from collections import OrderedDict
+
+# Format name -> (PIL format, MIME type, save options tuned for speed over size)
+SNAPSHOT_FORMATS = {
+    "png": ("PNG", "image/png", {"compress_level": 1}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 2}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 85}),
+}
+
+DEFAULT_SNAPSHOT_SCALE = 0.5
+
+
+def snapshot_format(name):
+    """Normalize a format name ("PNG", "jpg", ...) to a key of SNAPSHOT_FORMATS"""
+    name = name.lower().lstrip(".")
+    name = "jpeg" if name == "jpg" else name
+    if name not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unknown snapshot format: {name} (expected one of {', '.join(SNAPSHOT_FORMATS)})")
+    return name
+
+
+def snapshot_scale(scale):
+    scale = float(scale)
+    if not 0 < scale <= 1:
+        raise ValueError(f"Snapshot scale must be in (0, 1], got {scale}")
+    return scale
+
+
+class SnapshotCache:
+    """
+    The canvas version, the frame captured at it and its encodings by (scale, format).
+
+    Draw tools call invalidate() after changing the canvas, which bumps the
+    version and drops everything cached. Encoding goes to an in-memory
+    buffer rather than temporary files, outside the lock so invalidate()
+    never waits on an encode.
+    """
+
+    def __init__(self, max_encodings=8):
+        self.max_encodings = max_encodings
+        self.version = 0
+        self._frame = None
+        self._frame_version = None
+        self._encoded = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._frame = None
+            self._frame_version = None
+            self._encoded.clear()
+
+    @property
+    def nbytes(self):
+        """Memory held by the cached frame and encodings"""
+        with self._lock:
+            frame = 0 if self._frame is None else self._frame.nbytes
+            return frame + sum(len(data) for data in self._encoded.values())
+
+    def frame(self, version):
+        """The frame captured at `version`, or None"""
+        with self._lock:
+            return self._frame if self._frame_version == version else None
+
+    def put_frame(self, version, frame):
+        with self._lock:
+            if version == self.version:
+                self._frame = frame
+                self._frame_version = version
+
+    def get(self, version, scale, fmt):
+        """Cached encoded bytes, or None"""
+        with self._lock:
+            data = self._encoded.get((version, scale, fmt))
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._encoded.move_to_end((version, scale, fmt))
+            return data
+
+    def encode(self, version, frame, scale, fmt):
+        """Downscale and encode an (H, W, 3) uint8 frame; the result is cached for `version`"""
+        from PIL import Image
+        image = Image.fromarray(frame)
+        if scale != 1:
+            factor = 1 / scale
+            if factor.is_integer():
+                # Box-averaging by an integer factor is the cheapest downscale
+                image = image.reduce(int(factor))
+            else:
+                size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+                image = image.resize(size, Image.Resampling.BOX)
+        pil_format, _, options = SNAPSHOT_FORMATS[fmt]
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, **options)
+        data = buffer.getvalue()
+        with self._lock:
+            if version == self.version:
+                self._encoded[(version, scale, fmt)] = data
+                while len(self._encoded) > self.max_encodings:
+                    self._encoded.popitem(last=False)
+        return data
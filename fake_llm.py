@@ -0,0 +1,153 @@
+# Deterministic local stand-in for genai.GenerativeModel, for benchmarks and offline runs
+import json
+import random
+import threading
+import time
+
+from shapes import SHAPES
+
+
+class ScriptedResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class ScriptedModel:
+    """
+    Replays a fixed list of responses, one per distinct prompt, whatever the
+    prompt says. A repeated prompt (a retried or hedged request) gets the same
+    answer again. Once the script runs out it keeps answering FINAL_ANSWER.
+    Records the size of every prompt it was sent.
+
+    To mimic token-by-token generation, `chatter` is appended to every response
+    and each `chunk_size` characters take `chunk_delay` seconds to "generate",
+    whether or not the response is streamed.
+    """
+
+    def __init__(self, script, model_name="scripted", chatter="", chunk_size=24, chunk_delay=0.0):
+        self.script = list(script)
+        self.model_name = model_name
+        self.chatter = chatter
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self.prompt_bytes = []
+        self._turns = {}
+        self._lock = threading.Lock()
+
+    @property
+    def turns(self):
+        """Number of distinct prompts answered"""
+        return len(self._turns)
+
+    def generate_content(self, prompt, stream=False):
+        key = hash(prompt)
+        with self._lock:
+            self.calls += 1
+            if key not in self._turns:
+                self._turns[key] = len(self._turns)
+                self.prompt_bytes.append(len(prompt.encode("utf-8")))
+            index = self._turns[key]
+        text = self.script[index] if index < len(self.script) else "FINAL_ANSWER: Done!"
+        text += self.chatter
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        if stream:
+            return self._stream(chunks)
+        time.sleep(self.chunk_delay * len(chunks))
+        return ScriptedResponse(text)
+
+    def _stream(self, chunks):
+        for chunk in chunks:
+            time.sleep(self.chunk_delay)
+            yield ScriptedResponse(chunk)
+
+
+class FlakyModel:
+    """
+    Wraps a model and injects faults: each call fails with probability
+    `error_rate` or first stalls for `slow_delay` seconds with probability
+    `slow_rate`. For exercising retries, hedging and fallback.
+    """
+
+    def __init__(self, model, error_rate=0.0, slow_rate=0.0, slow_delay=5.0, seed=None, model_name=None):
+        self.model = model
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.model_name = model_name or getattr(model, "model_name", "flaky")
+        self.rng = random.Random(seed)
+        self.errors = 0
+        self.stalls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False):
+        with self._lock:
+            roll = self.rng.random()
+            fail = roll < self.error_rate
+            stall = not fail and roll < self.error_rate + self.slow_rate
+            self.errors += fail
+            self.stalls += stall
+        if fail:
+            raise RuntimeError("Injected LLM failure")
+        if stall:
+            time.sleep(self.slow_delay)
+        return self.model.generate_content(prompt, stream=stream)
+
+
+def function_call(name, **args):
+    return "FUNCTION_CALL: " + json.dumps({"name": name, "args": args})
+
+
+def _grid_draws(count, canvas_size, cell):
+    """(tool name, args) drawing `count` shapes on a grid that keeps them from touching"""
+    columns = (canvas_size[0] - cell) // cell
+    rows = (canvas_size[1] - cell) // cell
+    if count > columns * rows:
+        raise ValueError(f"At most {columns * rows} shapes fit on a {canvas_size[0]}x{canvas_size[1]} canvas")
+    names = list(SHAPES)
+    draws = []
+    for i in range(count):
+        x = cell // 2 + (i % columns) * cell
+        y = cell // 2 + (i // columns) * cell
+        size = cell - 10
+        draws.append((f"draw_{names[i % len(names)]}", {"x1": x, "y1": y, "x2": x + size, "y2": y + size}))
+    return draws
+
+
+def shape_workload(count, verify=True, canvas_size=(1920, 1080), cell=36, actions_per_turn=1):
+    """
+    Script drawing `count` shapes on a grid, cycling through every registered
+    shape, optionally verifying after each one, like the agent does on a real
+    query. With `actions_per_turn` > 1 the draw and verify calls are grouped
+    into multi-action responses.
+    """
+    script = [
+        function_call("show_reasoning", steps=json.dumps(["Open Paint", f"Draw {count} shapes", "Verify"])),
+        function_call("open_paint"),
+    ]
+    actions = []
+    for i, (name, args) in enumerate(_grid_draws(count, canvas_size, cell)):
+        actions.append(function_call(name, **args))
+        if verify:
+            actions.append(function_call("verify_task", task="shape", expected_count=i + 1))
+    for start in range(0, len(actions), actions_per_turn):
+        script.append("\n".join(actions[start:start + actions_per_turn]))
+    script.append("FINAL_ANSWER: Done!")
+    return script
+
+
+def plan_workload(count, verify=True, canvas_size=(1920, 1080), cell=36):
+    """
+    Script for planner mode: one structured show_reasoning plan that opens
+    Paint, draws `count` shapes (independent of each other) and verifies them,
+    then the final answer.
+    """
+    steps = [{"id": "open", "description": "Open Paint", "call": {"name": "open_paint", "args": {}}}]
+    for i, (name, args) in enumerate(_grid_draws(count, canvas_size, cell), start=1):
+        steps.append({"id": f"d{i}", "description": f"Draw shape {i}",
+                      "call": {"name": name, "args": args}, "after": ["open"]})
+    if verify:
+        steps.append({"id": "verify", "description": "Verify the shapes",
+                      "call": {"name": "verify_task", "args": {"task": "shape", "expected_count": count}},
+                      "after": [f"d{i}" for i in range(1, count + 1)]})
+    return [function_call("show_reasoning", steps=steps), "FINAL_ANSWER: Done!"]
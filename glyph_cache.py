@@ -0,0 +1,113 @@
+# Glyph atlas for the headless backend's text rendering.
+#
+# Each glyph is rasterized once per font and size into a small mask, and whole
+# labels are composed from those masks and kept in an LRU, so drawing a label
+# that was drawn before is a single masked paste onto the canvas.
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Font files to try for the family names MS Paint offers, first the Windows file
+# and then metric-compatible or similar free fonts, for hosts without Windows fonts
+FONT_FILES = {
+    "arial": ("arial.ttf", "LiberationSans-Regular.ttf", "DejaVuSans.ttf"),
+    "calibri": ("calibri.ttf", "Carlito-Regular.ttf", "DejaVuSans.ttf"),
+    "segoe ui": ("segoeui.ttf", "DejaVuSans.ttf"),
+    "verdana": ("verdana.ttf", "DejaVuSans.ttf"),
+    "times new roman": ("times.ttf", "LiberationSerif-Regular.ttf", "DejaVuSerif.ttf"),
+    "georgia": ("georgia.ttf", "DejaVuSerif.ttf"),
+    "courier new": ("cour.ttf", "LiberationMono-Regular.ttf", "DejaVuSansMono.ttf"),
+    "consolas": ("consola.ttf", "DejaVuSansMono.ttf"),
+}
+
+
+def font_candidates(font):
+    """File names to try for `font`: the name itself, then the files of its family, or <name>.ttf"""
+    family = font.lower()
+    return (font,) + FONT_FILES.get(family, (family.replace(" ", "") + ".ttf",))
+
+
+class GlyphAtlas:
+    """
+    Glyph masks by (font, size) and composed label masks by (text, font, size).
+
+    `font` is a TrueType font file PIL can find (e.g. "DejaVuSans.ttf") or a
+    family name from FONT_FILES (e.g. "Arial"); None is PIL's default font. A
+    size of None keeps the default font's size.
+    Not thread-safe: use it from the UI worker thread only.
+    """
+
+    def __init__(self, max_labels=256):
+        self.max_labels = max_labels
+        self._fonts = {}
+        self._glyphs = {}
+        self._labels = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, font=None, size=None):
+        key = (font, size)
+        if key not in self._fonts:
+            if font is None:
+                self._fonts[key] = ImageFont.load_default() if size is None else ImageFont.load_default(size)
+            else:
+                for candidate in font_candidates(font):
+                    try:
+                        self._fonts[key] = ImageFont.truetype(candidate, size or 10)
+                        break
+                    except OSError:
+                        continue
+                else:
+                    raise ValueError(f"Font not found: {font} (use a font file name such as DejaVuSans.ttf)")
+        return self._fonts[key]
+
+    def glyph(self, char, font=None, size=None):
+        """(mask or None for blank glyphs, (dx, dy) from the pen position, advance)"""
+        glyphs = self._glyphs.setdefault((font, size), {})
+        if char not in glyphs:
+            face = self.font(font, size)
+            x0, y0, x1, y1 = face.getbbox(char)
+            mask = None
+            if x1 > x0 and y1 > y0:
+                mask = Image.new("L", (x1 - x0, y1 - y0), 0)
+                ImageDraw.Draw(mask).text((-x0, -y0), char, font=face, fill=255)
+            glyphs[char] = (mask, (x0, y0), face.getlength(char))
+        return glyphs[char]
+
+    def label(self, text, font=None, size=None):
+        """(mask, (dx, dy)) of `text` drawn with its top-left anchor at (0, 0); mask is None for blank text"""
+        key = (text, font, size)
+        cached = self._labels.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._labels.move_to_end(key)
+            return cached
+        self.misses += 1
+
+        face = self.font(font, size)
+        ascent, descent = face.getmetrics()
+        placed = []
+        for line_number, line in enumerate(text.split("\n")):
+            pen = 0.0
+            for char in line:
+                mask, (dx, dy), advance = self.glyph(char, font, size)
+                if mask is not None:
+                    placed.append((mask, round(pen) + dx, line_number * (ascent + descent) + dy))
+                pen += advance
+
+        if not placed:
+            cached = (None, (0, 0))
+        else:
+            left = min(x for _, x, _ in placed)
+            top = min(y for _, _, y in placed)
+            right = max(x + mask.width for mask, x, _ in placed)
+            bottom = max(y + mask.height for mask, _, y in placed)
+            composed = Image.new("L", (right - left, bottom - top), 0)
+            for mask, x, y in placed:
+                composed.paste(255, (x - left, y - top, x - left + mask.width, y - top + mask.height), mask)
+            cached = (composed, (left, top))
+
+        self._labels[key] = cached
+        while len(self._labels) > self.max_labels:
+            self._labels.popitem(last=False)
+        return cached
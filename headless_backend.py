@@ -0,0 +1,129 @@
+# Canvas backend that draws onto an in-process PIL/NumPy canvas (any platform)
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from glyph_cache import GlyphAtlas
+from shapes import SHAPES
+from tracing import Tracer
+
+tracer = Tracer.from_env("server")
+
+# Shared by every canvas of the process, so a label drawn on one is blitted on the others
+glyphs = GlyphAtlas()
+
+DEFAULT_CANVAS_SIZE = (1920, 1080)
+
+def canvas_size_from_env():
+    """Read the canvas size from PAINT_CANVAS_SIZE ("WIDTHxHEIGHT")"""
+    value = os.getenv("PAINT_CANVAS_SIZE")
+    if not value:
+        return DEFAULT_CANVAS_SIZE
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+class HeadlessBackend:
+    """Draws the same primitives as MS Paint onto a white RGB image in memory."""
+
+    name = "headless"
+
+    # Where Paint's text tool is clicked and its default text size, see PaintBackend.add_text
+    TEXT_ORIGIN = (350, 533)
+    DEFAULT_TEXT_SIZE = 11
+
+    def __init__(self, size=None, line_width=1, color=(0, 0, 0)):
+        self.size = size or canvas_size_from_env()
+        self.line_width = line_width
+        self.color = color
+        self.image = None
+        self._draw = None
+        # (font, size) of the last text, kept for text without them, as in Paint
+        self.text_format = (None, None)
+
+    @property
+    def is_open(self):
+        return self.image is not None
+
+    def open(self):
+        """Start from a blank white canvas, like a freshly opened Paint window"""
+        self.image = Image.new("RGB", self.size, "white")
+        self._draw = ImageDraw.Draw(self.image)
+        self.text_format = (None, None)
+
+    def draw_shape(self, shape, x1, y1, x2, y2):
+        """Rasterize `shape` inside the box spanned by (x1,y1) and (x2,y2)"""
+        self.draw_shapes(shape, [(x1, y1, x2, y2)])
+
+    def draw_shapes(self, shape, boxes):
+        """Rasterize one `shape` per (x1, y1, x2, y2) box"""
+        if shape not in SHAPES:
+            raise ValueError(f"Unknown shape: {shape}")
+        shape = SHAPES[shape]
+        with tracer.span("ui.rasterize", shape=shape.name, count=len(boxes)):
+            if shape.is_ellipse:
+                for box in shape.boxes(boxes).astype(int).tolist():
+                    self._draw.ellipse(box, outline=self.color, width=self.line_width)
+                return
+            # Outline vertices for every box in one vectorized step
+            for points in shape.vertices(boxes).tolist():
+                points = [tuple(p) for p in points]
+                if shape.closed:
+                    self._draw.polygon(points, outline=self.color, width=self.line_width)
+                else:
+                    self._draw.line(points, fill=self.color, width=self.line_width)
+
+    def draw_path(self, points):
+        """Rasterize the polyline through an (N, 2) integer array of points in one call"""
+        with tracer.span("ui.rasterize", shape="path", count=len(points)):
+            self._draw.line(points.ravel().tolist(), fill=self.color, width=self.line_width,
+                            joint="curve" if self.line_width > 1 else None)
+
+    def add_text(self, text, x=None, y=None, size=None, font=None):
+        """
+        Render `text` with its top-left at (x, y), by default where Paint's text
+        box would be opened. The label mask comes from the glyph atlas and is
+        pasted in one step. Returns the box the text covers. Like Paint, an
+        omitted font or size keeps the last one set, and the size starts at
+        DEFAULT_TEXT_SIZE.
+        """
+        if x is None or y is None:
+            x, y = self.TEXT_ORIGIN
+        font = self.text_format[0] if font is None else font
+        size = size or self.text_format[1] or self.DEFAULT_TEXT_SIZE
+        with tracer.span("ui.text", chars=len(text)):
+            mask, (dx, dy) = glyphs.label(text, font, size)
+            # Only a font that rendered is kept for the next text
+            self.text_format = (font, size)
+            if mask is None:
+                return (x, y, x, y)
+            box = (x + dx, y + dy, x + dx + mask.width, y + dy + mask.height)
+            self.image.paste(self.color, box, mask)
+        return box
+
+    def capture(self):
+        """Return a copy of the canvas as an (H, W, 3) uint8 array"""
+        return np.array(self.image)
+
+    @property
+    def nbytes(self):
+        """Memory held by the canvas pixels"""
+        return 0 if self.image is None else self.size[0] * self.size[1] * 3
+
+    # Spilling, used by CanvasManager to move idle canvases out of memory
+
+    def save(self, path):
+        """Write the canvas to `path` as a quickly compressed PNG"""
+        self.image.save(path, format="PNG", compress_level=1)
+
+    def load(self, path):
+        """Replace the canvas with the one saved at `path`"""
+        with Image.open(path) as saved:
+            self.image = saved.convert("RGB")
+        self._draw = ImageDraw.Draw(self.image)
+
+    def unload(self):
+        """Drop the canvas pixels; is_open is False until open() or load()"""
+        self.image = None
+        self._draw = None
@@ -0,0 +1,132 @@
+# Content-addressed cache of LLM responses for talk2mcp-2.py
+import hashlib
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+# Cache modes:
+#   "readwrite" - serve hits from the cache, call the model on misses and store the result
+#   "replay"    - serve hits only; a miss raises CacheMiss instead of calling the model
+#   "off"       - always call the model
+CACHE_MODES = ("readwrite", "replay", "off")
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a prompt has no cached response"""
+
+
+class CachedResponse:
+    """Stand-in for a generate_content response, exposing the same `.text`"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def cache_key(model_name, prompt):
+    """Hash of the model name and prompt identifying a response"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier response cache: an in-memory LRU in front of an SQLite file.
+    The SQLite tier is capped at `max_bytes` of response text and evicts the
+    least recently used rows first.
+    """
+
+    def __init__(self, path=".llm_cache.sqlite", mode="readwrite", memory_entries=256, max_bytes=64 * 1024 * 1024):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode} (expected one of {', '.join(CACHE_MODES)})")
+        self.mode = mode
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if mode != "off" and path:
+            self.db = sqlite3.connect(path)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, text TEXT, size INTEGER, last_used REAL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+            self.db.commit()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from LLM_CACHE_MODE, LLM_CACHE_PATH and LLM_CACHE_MAX_MB"""
+        return cls(
+            path=os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite"),
+            mode=os.getenv("LLM_CACHE_MODE", "readwrite"),
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        )
+
+    def get(self, model_name, prompt):
+        """Return the cached response text, or None (raises CacheMiss in replay mode)"""
+        if self.mode == "off":
+            return None
+        key = cache_key(model_name, prompt)
+        text = self.memory.get(key)
+        if text is not None:
+            self.memory.move_to_end(key)
+        elif self.db is not None:
+            row = self.db.execute("SELECT text FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                text = row[0]
+                self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.db.commit()
+                self._remember(key, text)
+        if text is None:
+            self.misses += 1
+            if self.mode == "replay":
+                raise CacheMiss(f"No cached response for {model_name} prompt {key[:12]}")
+            return None
+        self.hits += 1
+        return text
+
+    def put(self, model_name, prompt, text):
+        """Store a response in both tiers"""
+        if self.mode != "readwrite":
+            return
+        key = cache_key(model_name, prompt)
+        self._remember(key, text)
+        if self.db is not None:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, text, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, text, len(text.encode("utf-8")), time.time()),
+            )
+            self._evict()
+            self.db.commit()
+
+    def _remember(self, key, text):
+        self.memory[key] = text
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until the total fits again
+        excess = total - self.max_bytes
+        doomed = []
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        for (key,) in doomed:
+            self.memory.pop(key, None)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,88 @@
+# Streaming generation that stops as soon as the response holds one complete action line.
+# The agent only ever acts on the first FUNCTION_CALL:/FINAL_ANSWER: line, so anything
+# the model writes after it is wasted time.
+import asyncio
+import json
+import threading
+
+ACTION_PREFIXES = ("FUNCTION_CALL:", "FINAL_ANSWER:")
+
+_decoder = json.JSONDecoder()
+
+
+def first_action_line(text, final=False):
+    """
+    Return the first complete action line in `text`, or None if there is none yet.
+
+    A FUNCTION_CALL line is complete as soon as its JSON object closes (anything
+    after it on the same line is dropped). A FINAL_ANSWER line is complete once
+    its newline arrives, or when `final` says the stream has ended.
+    """
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        terminated = final or i < len(lines) - 1
+        if line.startswith("FUNCTION_CALL:"):
+            body = line[len("FUNCTION_CALL:"):].strip().strip("`")
+            try:
+                _, end = _decoder.raw_decode(body)
+            except json.JSONDecodeError:
+                # Still arriving, or malformed; a finished line goes to the parser as is
+                return line if terminated else None
+            return "FUNCTION_CALL: " + body[:end]
+        if line.startswith("FINAL_ANSWER:"):
+            return line if terminated else None
+    return None
+
+
+class StreamedResponse:
+    """Stand-in for a generate_content response, exposing the same `.text`"""
+
+    def __init__(self, text, cut_off, chunks):
+        self.text = text
+        # Whether generation was abandoned after the action line arrived
+        self.cut_off = cut_off
+        self.chunks = chunks
+
+
+async def generate_until_action(model, prompt, timeout=10, executor=None):
+    """
+    Call `model.generate_content(prompt, stream=True)` on a worker thread and
+    return as soon as the text so far contains a complete action line. The
+    remaining chunks are abandoned: the worker stops pulling from the stream.
+    Without an action line the whole response text is returned once the stream ends.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for chunk in model.generate_content(prompt, stream=True):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk.text)
+        except Exception as e:
+            loop.call_soon_threadsafe(chunks.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(chunks.put_nowait, done)
+
+    loop.run_in_executor(executor, produce)
+    text = ""
+    count = 0
+    try:
+        async with asyncio.timeout(timeout):
+            while True:
+                item = await chunks.get()
+                if item is done:
+                    line = first_action_line(text, final=True)
+                    return StreamedResponse(line or text, False, count)
+                if isinstance(item, Exception):
+                    raise item
+                text += item
+                count += 1
+                line = first_action_line(text)
+                if line is not None:
+                    return StreamedResponse(line, True, count)
+    finally:
+        stop.set()
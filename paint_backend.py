@@ -0,0 +1,340 @@
+# Canvas backend that drives the real MS Paint window (Windows only)
+from pywinauto.application import Application
+from pywinauto.keyboard import send_keys
+import win32gui
+import win32con
+import win32clipboard
+import pywintypes
+from win32api import GetSystemMetrics
+from PIL import ImageGrab
+import numpy as np
+
+from shapes import SHAPES
+from tracing import Tracer
+from ui_worker import wait_until
+
+tracer = Tracer.from_env("server")
+
+# Upper bounds for the readiness waits below; they normally return much sooner
+WINDOW_TIMEOUT = 10.0
+INPUT_IDLE_TIMEOUT = 2.0
+FOCUS_TIMEOUT = 1.0
+PASTE_TIMEOUT = 2.0
+
+# Pencil button in the Tools group, used for freehand paths
+PENCIL_TOOLBAR = (246, 63)
+
+# Where text boxes open unless a position is given, and Paint's default text size
+TEXT_ORIGIN = (350, 533)
+DEFAULT_TEXT_SIZE = 11
+# Key tips of the Text tab's font family and size boxes, shown while a text box is open
+TEXT_TAB_KEYS = "%X"
+FONT_FAMILY_KEYS = "FF"
+FONT_SIZE_KEYS = "FS"
+
+
+def read_clipboard():
+    """
+    The clipboard's contents as {format: data}, for the formats held in plain
+    memory (text, DIB images, HTML, ...); GDI handle formats are left out
+    """
+    saved = {}
+    win32clipboard.OpenClipboard()
+    try:
+        format = win32clipboard.EnumClipboardFormats(0)
+        while format:
+            try:
+                data = win32clipboard.GetClipboardData(format)
+            except pywintypes.error:
+                data = None
+            if isinstance(data, (bytes, str)):
+                saved[format] = data
+            format = win32clipboard.EnumClipboardFormats(format)
+    finally:
+        win32clipboard.CloseClipboard()
+    return saved
+
+
+def write_clipboard(formats):
+    """Replace the clipboard's contents with {format: data}, e.g. from read_clipboard"""
+    win32clipboard.OpenClipboard()
+    try:
+        win32clipboard.EmptyClipboard()
+        for format, data in formats.items():
+            if format == win32con.CF_UNICODETEXT:
+                win32clipboard.SetClipboardText(data, format)
+            else:
+                win32clipboard.SetClipboardData(format, data)
+    finally:
+        win32clipboard.CloseClipboard()
+
+
+class PaintUIState:
+    """
+    Session-level cache of the Paint window: resolved window and canvas
+    wrappers, plus which toolbar tool is active. Lets the backend skip focus
+    changes and tool clicks that would not change anything.
+
+    Resolving `paint_app.window(...)` walks the window tree on every access, so
+    the wrappers are resolved once and reused until the window handle goes
+    away. Focus is re-checked with the cheap GetForegroundWindow call, because
+    the user can switch windows at any time.
+    """
+
+    def __init__(self, paint_app):
+        self.paint_app = paint_app
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget everything; the next access resolves the window again"""
+        self._window = None
+        self._canvas = None
+        self.handle = None
+        self.active_tool = None
+        # (font, size) last set in the Text tab; Paint keeps it for new text boxes
+        self.text_format = (None, None)
+
+    def _validate(self):
+        if self.handle is not None and not win32gui.IsWindow(self.handle):
+            self.invalidate()
+
+    @property
+    def window(self):
+        self._validate()
+        if self._window is None:
+            self._window = self.paint_app.window(class_name='MSPaintApp').wrapper_object()
+            self.handle = self._window.handle
+        return self._window
+
+    @property
+    def canvas(self):
+        window = self.window
+        if self._canvas is None:
+            self._canvas = window.child_window(class_name='MSPaintView').wrapper_object()
+        return self._canvas
+
+    def ensure_focus(self):
+        """Bring Paint to the foreground unless it already is; returns the window"""
+        window = self.window
+        if win32gui.GetForegroundWindow() != self.handle:
+            with tracer.span("ui.focus"):
+                window.set_focus()
+                wait_until(lambda: win32gui.GetForegroundWindow() == self.handle, timeout=FOCUS_TIMEOUT)
+        return window
+
+
+class PaintBackend:
+    """
+    Draws primitives by automating MS Paint with pywinauto/win32gui.
+
+    Instead of fixed sleeps after each input, it waits until Paint is ready:
+    until its UI thread answers a probe message after a click or keystroke,
+    until the window has focus, until it is maximized, or until pasted text
+    shows on the canvas. Each wait has a timeout.
+    Window handles, focus and the active tool are cached in PaintUIState.
+    Not thread-safe: call it from a single UIWorker thread.
+    """
+
+    name = "paint"
+
+    def __init__(self):
+        self.paint_app = None
+        self.ui = None
+
+    @property
+    def is_open(self):
+        return self.paint_app is not None
+
+    def _wait_idle(self, timeout=INPUT_IDLE_TIMEOUT):
+        """
+        Block until Paint's UI thread is back in its message loop and not busy
+        with earlier work. A WM_NULL sent to the window is only answered from
+        there; a hung window fails at once. Sent messages are answered ahead of
+        queued input, so this does not prove that the last click or keystroke
+        has been handled; steps that depend on its effect wait for the effect.
+        """
+        with tracer.span("ui.wait_idle"):
+            try:
+                win32gui.SendMessageTimeout(self.ui.window.handle, win32con.WM_NULL, 0, 0,
+                                            win32con.SMTO_ABORTIFHUNG, int(timeout * 1000))
+            except pywintypes.error:
+                raise TimeoutError(f"Paint did not respond within {timeout} s")
+
+    def open(self):
+        """Open Microsoft Paint maximized on the secondary monitor"""
+        self.paint_app = Application().start('mspaint.exe')
+
+        # Get the Paint window once it is ready for input
+        self.paint_app.window(class_name='MSPaintApp').wait('visible ready', timeout=WINDOW_TIMEOUT)
+        self.ui = PaintUIState(self.paint_app)
+        paint_window = self.ui.window
+
+        # Get primary monitor width
+        primary_width = GetSystemMetrics(0)
+
+        # First move to secondary monitor without specifying size
+        win32gui.SetWindowPos(
+            paint_window.handle,
+            win32con.HWND_TOP,
+            primary_width - 1920, 0,  # Position it on secondary monitor
+            0, 0,  # Let Windows handle the size
+            win32con.SWP_NOSIZE  # Don't change the size
+        )
+
+        # Now maximize the window
+        win32gui.ShowWindow(paint_window.handle, win32con.SW_MAXIMIZE)
+        wait_until(
+            lambda: win32gui.GetWindowPlacement(paint_window.handle)[1] == win32con.SW_SHOWMAXIMIZED,
+            timeout=WINDOW_TIMEOUT,
+        )
+        self._wait_idle()
+
+    def _select_tool(self, shape):
+        """Click the toolbar button for `shape` unless that tool is already active"""
+        if self.ui.active_tool == shape:
+            return
+        with tracer.span("ui.select_tool", shape=shape):
+            self.ui.window.click_input(coords=SHAPES[shape].toolbar)
+            self._wait_idle()
+        self.ui.active_tool = shape
+
+    def draw_shape(self, shape, x1, y1, x2, y2):
+        """Select the toolbar tool for `shape` and drag it from (x1,y1) to (x2,y2)"""
+        self.draw_shapes(shape, [(x1, y1, x2, y2)])
+
+    def draw_shapes(self, shape, boxes):
+        """Select the toolbar tool for `shape` once and drag out every box in `boxes`"""
+        try:
+            self.ui.ensure_focus()
+
+            # Select the shape tool; it stays active after each deselect click
+            self._select_tool(shape)
+
+            canvas = self.ui.canvas
+            for x1, y1, x2, y2 in boxes:
+                with tracer.span("ui.drag", shape=shape):
+                    canvas.press_mouse_input(coords=(x1, y1))
+                    canvas.move_mouse_input(coords=(x2, y2))
+                    canvas.release_mouse_input(coords=(x2, y2))
+                    self._wait_idle()
+
+                # Deselect
+                with tracer.span("ui.deselect"):
+                    canvas.click_input(coords=(x2 + 5, y2 + 5))
+                    self._wait_idle()
+        except Exception:
+            # The window may have changed under us; resolve everything again next time
+            self.ui.invalidate()
+            raise
+
+    def draw_path(self, points):
+        """Drag the pencil through an (N, 2) array of points as one press/move/release stroke"""
+        try:
+            self.ui.ensure_focus()
+            if self.ui.active_tool != "pencil":
+                with tracer.span("ui.select_tool", shape="pencil"):
+                    self.ui.window.click_input(coords=PENCIL_TOOLBAR)
+                    self._wait_idle()
+                self.ui.active_tool = "pencil"
+
+            canvas = self.ui.canvas
+            points = [tuple(p) for p in points.tolist()]
+            with tracer.span("ui.drag", shape="path", count=len(points)):
+                canvas.press_mouse_input(coords=points[0])
+                for point in points[1:]:
+                    canvas.move_mouse_input(coords=point)
+                canvas.release_mouse_input(coords=points[-1])
+                self._wait_idle()
+        except Exception:
+            self.ui.invalidate()
+            raise
+
+    def _set_text_format(self, font, size):
+        """Pick the font family and size in the Text tab; None, or the value already set, leaves it alone"""
+        current_font, current_size = self.ui.text_format
+        font = None if font == current_font else font
+        size = None if size == current_size else size
+        if font is None and size is None:
+            return
+        with tracer.span("ui.text_format"):
+            if font is not None:
+                send_keys(TEXT_TAB_KEYS + FONT_FAMILY_KEYS)
+                send_keys(font + "{ENTER}", with_spaces=True)
+                self._wait_idle()
+                current_font = font
+            if size is not None:
+                send_keys(TEXT_TAB_KEYS + FONT_SIZE_KEYS)
+                send_keys(f"{size}{{ENTER}}")
+                self._wait_idle()
+                current_size = size
+        self.ui.text_format = (current_font, current_size)
+
+    def _grab(self, box):
+        """Screenshot the (x1, y1, x2, y2) box of the canvas view as an array"""
+        rect = self.ui.canvas.rectangle()
+        x1, y1, x2, y2 = box
+        image = ImageGrab.grab(bbox=(rect.left + x1, rect.top + y1, rect.left + x2, rect.top + y2), all_screens=True)
+        return np.asarray(image.convert("RGB"))
+
+    def add_text(self, text, x=None, y=None, size=None, font=None):
+        """
+        Paste `text` through the clipboard into a new text box at (x, y); the
+        user's clipboard is put back once the text shows on the canvas.
+        Returns the box the text roughly covers.
+        """
+        if x is None or y is None:
+            x, y = TEXT_ORIGIN
+        # Paint sizes are points; a line is about 1.5 x the size in pixels
+        estimate = size or self.ui.text_format[1] or DEFAULT_TEXT_SIZE
+        lines = text.split("\n")
+        box = (x, y, x + round(0.6 * estimate * max(len(line) for line in lines)), y + round(1.5 * estimate * len(lines)))
+        saved = None
+        try:
+            self.ui.ensure_focus()
+
+            # 1) Open the Home tab (ALT+H), then select Text (T), unless it is still active
+            if self.ui.active_tool != "text":
+                with tracer.span("ui.select_tool", shape="text"):
+                    send_keys('%H')    # ALT+H
+                    self._wait_idle()
+                    send_keys('T')     # Text tool
+                    self._wait_idle()
+                self.ui.active_tool = "text"
+
+            # 2) Click on canvas to begin your text box
+            canvas = self.ui.canvas
+            # What the text will cover, to see when the pasted text has landed
+            before = self._grab(box) if text.strip() else None
+            canvas.click_input(coords=(x, y))
+            self._wait_idle()
+
+            # 3) Set the font while the box is open, then insert the whole text at once
+            self._set_text_format(font, size)
+            with tracer.span("ui.type", chars=len(text)):
+                saved = read_clipboard()
+                write_clipboard({win32con.CF_UNICODETEXT: text})
+                send_keys("^v")
+                self._wait_idle()
+
+            # 4) Click outside to finish, away from the new text box
+            canvas.click_input(coords=(600, 800) if abs(y - 800) > 100 else (600, 100))
+            self._wait_idle()
+
+            # 5) Paint may handle ^v after the probe above returned; once the text
+            # shows on the canvas it has read the clipboard, which can go back
+            if before is not None:
+                with tracer.span("ui.wait_paste"):
+                    wait_until(lambda: not np.array_equal(self._grab(box), before), timeout=PASTE_TIMEOUT)
+        except Exception:
+            self.ui.invalidate()
+            raise
+        finally:
+            if saved is not None:
+                write_clipboard(saved)
+        return box
+
+    def capture(self):
+        """Screenshot the canvas view as an (H, W, 3) uint8 array"""
+        rect = self.ui.canvas.rectangle()
+        image = ImageGrab.grab(bbox=(rect.left, rect.top, rect.right, rect.bottom), all_screens=True)
+        return np.asarray(image.convert("RGB"))
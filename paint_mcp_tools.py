@@ -1,87 +1,170 @@
 # basic import 
+# Heavy and platform-specific modules (pywinauto/win32, PIL, NumPy, rich) are imported
+# on first use, so a fresh server answers initialize/list_tools as early as possible.
+# Run startup_benchmark.py to measure it.
 from mcp.server.fastmcp import FastMCP, Image
 from mcp.server.fastmcp.prompts import base
 from mcp.types import TextContent
-from PIL import Image as PILImage
 import sys
-from pywinauto.application import Application
-import win32gui
-import win32con
-import time
-from win32api import GetSystemMetrics
-from pywinauto.keyboard import send_keys
 import os
+import asyncio
+from ui_worker import UIWorker
+from shapes import SHAPES
+from tracing import Tracer, set_run_id, reset_run_id
+from session_state import SessionBusy, SessionRegistry, current_session
+from canvas_snapshot import SNAPSHOT_FORMATS, DEFAULT_SNAPSHOT_SCALE, snapshot_format, snapshot_scale
+from canvas_manager import CanvasManager
 
 import json
-import tempfile
-from rich.console import Console
-from rich.panel import Panel
 import re
 from typing import Optional
 
-console = Console()
+# Spans go to PAINT_TRACE_FILE when set (see tracing.py)
+tracer = Tracer.from_env("server")
+
+# State of each connected client session; PAINT_MAX_IN_FLIGHT bounds the
+# requests one session may have running at once (0 for no limit), and requests
+# over it wait up to PAINT_QUEUE_TIMEOUT seconds for a slot
+sessions = SessionRegistry(int(os.getenv("PAINT_MAX_IN_FLIGHT", "4")),
+                           float(os.getenv("PAINT_QUEUE_TIMEOUT", "30")))
+
+class TracedFastMCP(FastMCP):
+    """
+    FastMCP that records a span around every tool call, tagged with the caller's
+    run ID, and runs it within the in-flight limit of the caller's session
+    """
+
+    async def call_tool(self, name, arguments):
+        request_context = self.get_context().request_context
+        meta = request_context.meta if request_context else None
+        session = sessions.get(request_context.session) if request_context else None
+        run_token = set_run_id(getattr(meta, "run_id", None))
+        session_token = current_session.set(session)
+        try:
+            with tracer.span("tool", tool=name, session=session.id if session else None):
+                if session is None:
+                    return await super().call_tool(name, arguments)
+                async with session:
+                    return await super().call_tool(name, arguments)
+        except SessionBusy as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+        finally:
+            current_session.reset(session_token)
+            reset_run_id(run_token)
+
+    async def read_resource(self, uri):
+        # Resources such as canvas://snapshot read the caller's canvas
+        request_context = self.get_context().request_context
+        session = sessions.get(request_context.session) if request_context else None
+        session_token = current_session.set(session)
+        try:
+            return await super().read_resource(uri)
+        finally:
+            current_session.reset(session_token)
+
 # instantiate an MCP server client
-mcp = FastMCP("MSPainter")
+# FastMCP logs every request at INFO; PAINT_LOG_LEVEL=WARNING quiets it
+# (FastMCP's own FASTMCP_LOG_LEVEL is overridden by its constructor's default)
+mcp = TracedFastMCP("MSPainter", log_level=os.getenv("PAINT_LOG_LEVEL", "INFO").upper())
+
+# SELECT CANVAS BACKEND
+# "paint" drives MS Paint on a Windows desktop, "headless" draws onto an in-memory
+# PIL/NumPy canvas. Chosen with the PAINT_BACKEND env var or the --backend flag.
+BACKENDS = ("paint", "headless")
+backend_name = os.getenv("PAINT_BACKEND", "paint")
+
+def create_backend(name):
+    """Import and instantiate the canvas backend called `name` (its imports load here)"""
+    if name == "paint":
+        from paint_backend import PaintBackend
+        return PaintBackend()
+    if name == "headless":
+        from headless_backend import HeadlessBackend
+        return HeadlessBackend()
+    raise ValueError(f"Unknown backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+# All backend calls run on this one thread, so blocking UI automation never
+# stalls the event loop and other requests are served while a shape is drawn
+ui = UIWorker()
+
+# One canvas per client session, each with its own analyzer for verify_task and
+# its own encoded snapshots (which every tool that changes the canvas invalidates).
+# Idle headless canvases are spilled to disk beyond PAINT_MAX_CANVASES or
+# PAINT_CANVAS_BUDGET_MB, see canvas_manager.py
+canvases = CanvasManager.from_env(lambda: create_backend(backend_name))
+
+# A session's canvas goes away with the session
+sessions.on_close = canvases.discard
+
+def get_canvas():
+    """Return the calling session's canvas, creating it on first use"""
+    # There is only one MS Paint window to draw in, so every session shares it
+    if backend_name == "paint":
+        return canvases.get("paint")
+    session = current_session.get()
+    return canvases.get(session.id if session else "default")
 
 # DEFINE TOOLS
 
+def make_shape_tool(shape):
+    """Build the draw_<name> tool for a registered shape"""
+    async def draw(x1: int, y1: int, x2: int, y2: int) -> dict:
+        try:
+            canvas = get_canvas()
+            if not canvas.is_open:
+                return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
+            id = await ui.run(canvas.draw_shape, shape.name, x1, y1, x2, y2)
+            canvas.snapshots.invalidate()
+            return {"content":[TextContent(type="text",text=f"{shape.label} drawn from ({x1},{y1}) to ({x2},{y2}) as #{id}")]}
+        except Exception as e:
+            return {"content":[TextContent(type="text",text=f"Error drawing {shape.label.lower()}: {e}")]}
+    draw.__name__ = f"draw_{shape.name}"
+    draw.__doc__ = f"Draw {shape.article} in Paint from (x1,y1) to (x2,y2)"
+    return draw
+
+# One draw_<name> tool per registered shape (draw_rectangle, draw_oval, draw_right_arrow, ...)
+for shape in SHAPES.values():
+    mcp.tool()(make_shape_tool(shape))
+
+def prepare_path(points, tolerance=1.0, closed=False):
+    """Parse and simplify a draw_path point list; returns (input point count, simplified points)"""
+    # NumPy is imported on first use, like the other heavy modules
+    from paths import path_points, simplify_path
+    points = path_points(points, closed)
+    return len(points), simplify_path(points, tolerance)
+
 @mcp.tool()
-async def draw_rectangle(x1: int, y1: int, x2: int, y2: int) -> dict:
-    """Draw a rectangle in Paint from (x1,y1) to (x2,y2)"""
-    global paint_app
+async def draw_path(points: list, tolerance: float = 1.0, closed: bool = False) -> dict:
+    """
+    Draw a freehand path or polyline through `points`, a list of [x, y] pairs, as one stroke.
+    The path is simplified to within `tolerance` pixels first, so long point lists are cheap.
+    With closed=True the path returns to its first point.
+    E.g. points=[[100, 100], [150, 80], [200, 100], [250, 140]]
+    """
     try:
-        if not paint_app:
-            return {
-                "content": [
-                    TextContent(
-                        type="text",
-                        text="Paint is not open. Please call open_paint first."
-                    )
-                ]
-            }
-        
-        paint_window = paint_app.window(class_name='MSPaintApp')
-        if not paint_window.has_focus():
-            paint_window.set_focus(); time.sleep(0.2)
-        
-        # Select the Rectangle tool
-        paint_window.click_input(coords=(440, 63))
-        time.sleep(0.2)
-        
-        canvas = paint_window.child_window(class_name='MSPaintView')
-        canvas.press_mouse_input(coords=(x1, y1))
-        canvas.move_mouse_input(coords=(x2, y2))
-        canvas.release_mouse_input(coords=(x2, y2))
-        
-        # Deselect
-        time.sleep(0.1)
-        canvas.click_input(coords=(x2 + 5, y2 + 5))
-        time.sleep(0.2)    # ← added sleep after deselect
-        
-        return {
-            "content": [
-                TextContent(
-                    type="text",
-                    text=f"Rectangle drawn from ({x1},{y1}) to ({x2},{y2})"
-                )
-            ]
-        }
+        canvas = get_canvas()
+        if not canvas.is_open:
+            return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
+        count, simplified = prepare_path(points, tolerance, closed)
+        id = await ui.run(canvas.draw_path, simplified)
+        canvas.snapshots.invalidate()
+        (x1, y1), (x2, y2) = simplified[0].tolist(), simplified[-1].tolist()
+        return {"content":[TextContent(type="text",text=(
+            f"Path drawn from ({x1},{y1}) to ({x2},{y2}) through {len(simplified)} of {count} points as #{id}"))]}
     except Exception as e:
-        return {
-            "content": [
-                TextContent(
-                    type="text",
-                    text=f"Error drawing rectangle: {str(e)}"
-                )
-            ]
-        }
+        return {"content":[TextContent(type="text",text=f"Error drawing path: {e}")]}
 
 @mcp.tool()
-async def add_text_in_paint(text: str) -> dict:
-    """Add text in Paint"""
-    global paint_app
+async def add_text_in_paint(text: str, x: Optional[int] = None, y: Optional[int] = None,
+                            size: Optional[int] = None, font: Optional[str] = None) -> dict:
+    """
+    Add text in Paint, with its top-left corner at (x, y) when given.
+    `size` is the font size and `font` a font name (e.g. "Arial"); both are optional
+    and keep their last value when left out (size 11 at first).
+    """
     try:
-        if not paint_app:
+        canvas = get_canvas()
+        if not canvas.is_open:
             return {
                 "content": [
                     TextContent(
@@ -91,37 +174,14 @@ async def add_text_in_paint(text: str) -> dict:
                 ]
             }
         
-        # Get the Paint window
-        paint_window = paint_app.window(class_name='MSPaintApp')
-        
-        # Ensure Paint window is active
-        if not paint_window.has_focus():
-            paint_window.set_focus()
-            time.sleep(0.2)
-        
-        # 1) Open the Home tab (ALT+H), then select Text (T)
-        send_keys('%H')    # ALT+H
-        time.sleep(0.2)
-        send_keys('T')     # Text tool
-        time.sleep(0.5)
-
-        # 2) Click on canvas to begin your text box
-        canvas = paint_window.child_window(class_name='MSPaintView')
-        canvas.click_input(coords=(350, 533))
-        time.sleep(0.5)
-
-        # 3) Type the actual text
-        send_keys(text)
-        time.sleep(0.5)
-
-        # 4) Click outside to finish
-        canvas.click_input(coords=(600, 800))
+        id = await ui.run(canvas.add_text, text, x, y, size, font)
+        canvas.snapshots.invalidate()
         
         return {
             "content": [
                 TextContent(
                     type="text",
-                    text=f"Text:'{text}' added successfully"
+                    text=f"Text:'{text}' added successfully as #{id}"
                 )
             ]
         }
@@ -138,29 +198,10 @@ async def add_text_in_paint(text: str) -> dict:
 @mcp.tool()
 async def open_paint() -> dict:
     """Open Microsoft Paint maximized on secondary monitor"""
-    global paint_app
     try:
-        paint_app = Application().start('mspaint.exe')
-        time.sleep(0.2)
-        
-        # Get the Paint window
-        paint_window = paint_app.window(class_name='MSPaintApp')
-        
-        # Get primary monitor width
-        primary_width = GetSystemMetrics(0)
-        
-        # First move to secondary monitor without specifying size
-        win32gui.SetWindowPos(
-            paint_window.handle,
-            win32con.HWND_TOP,
-            primary_width - 1920, 0,  # Position it on secondary monitor
-            0, 0,  # Let Windows handle the size
-            win32con.SWP_NOSIZE  # Don't change the size
-        )
-        
-        # Now maximize the window
-        win32gui.ShowWindow(paint_window.handle, win32con.SW_MAXIMIZE)
-        time.sleep(0.2)
+        canvas = get_canvas()
+        await ui.run(canvas.open)
+        canvas.snapshots.invalidate()
         
         return {
             "content": [
@@ -201,6 +242,8 @@ def show_reasoning(steps) -> TextContent:
         steps_list = steps  # assume already List[str]
 
     # 2) Render them to a temporary console
+    from rich.console import Console
+    from rich.panel import Panel
     record_console = Console(record=True, width=80)
     for idx, step in enumerate(steps_list, start=1):
         record_console.print(Panel(
@@ -218,121 +261,85 @@ def show_reasoning(steps) -> TextContent:
         text=rendered
     )
 
-@mcp.tool()
-async def draw_oval(x1: int, y1: int, x2: int, y2: int) -> dict:
-    """Draw an oval in Paint from (x1,y1) to (x2,y2)"""
-    global paint_app
-    try:
-        if not paint_app:
-            return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
-        paint_window = paint_app.window(class_name="MSPaintApp")
-        if not paint_window.has_focus():
-            paint_window.set_focus(); time.sleep(0.2)
-        # Select Oval tool
-        paint_window.click_input(coords=(421, 63)); time.sleep(0.2)
-        canvas = paint_window.child_window(class_name="MSPaintView")
-        canvas.press_mouse_input(coords=(x1, y1))
-        canvas.move_mouse_input(coords=(x2, y2))
-        canvas.release_mouse_input(coords=(x2, y2))
-        # Deselect
-        time.sleep(0.1)
-        canvas.click_input(coords=(x2 + 5, y2 + 5))
-        time.sleep(0.2)  
-        return {"content":[TextContent(type="text",text=f"Oval drawn from ({x1},{y1}) to ({x2},{y2})")]}
-    except Exception as e:
-        return {"content":[TextContent(type="text",text=f"Error drawing oval: {e}")]}
-
-@mcp.tool()
-async def draw_right_arrow(x1: int, y1: int, x2: int, y2: int) -> dict:
-    """Draw a right arrow in Paint from (x1,y1) to (x2,y2)"""
-    global paint_app
-    try:
-        if not paint_app:
-            return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
-        paint_window = paint_app.window(class_name="MSPaintApp")
-        if not paint_window.has_focus():
-            paint_window.set_focus(); time.sleep(0.2)
-        # Select Right Arrow tool
-        paint_window.click_input(coords=(460, 82)); time.sleep(0.2)
-        canvas = paint_window.child_window(class_name="MSPaintView")
-        canvas.press_mouse_input(coords=(x1, y1))
-        canvas.move_mouse_input(coords=(x2, y2))
-        canvas.release_mouse_input(coords=(x2, y2))
-        time.sleep(0.1)
-        canvas.click_input(coords=(x2 + 5, y2 + 5))
-        time.sleep(0.2)  
-        return {"content":[TextContent(type="text",text=f"Right arrow drawn from ({x1},{y1}) to ({x2},{y2})")]}
-    except Exception as e:
-        return {"content":[TextContent(type="text",text=f"Error drawing right arrow: {e}")]}
+def group_batch_operations(operations):
+    """
+    Split an ordered list of operations into runs of the same kind.
+    Returns a list of (kind, [(index, operation), ...]) so each toolbar tool
+    is selected once per run while the drawing order is preserved.
+    """
+    runs = []
+    for index, op in enumerate(operations):
+        kind = op.get("type")
+        if runs and runs[-1][0] == kind and kind != "text":
+            runs[-1][1].append((index, op))
+        else:
+            runs.append((kind, [(index, op)]))
+    return runs
 
 @mcp.tool()
-async def draw_left_arrow(x1: int, y1: int, x2: int, y2: int) -> dict:
-    """Draw a left arrow in Paint from (x1,y1) to (x2,y2)"""
-    global paint_app
+async def draw_batch(operations: list[dict]) -> dict:
+    """
+    Draw many shapes and texts in one call, in the given order.
+    Each operation is an object with a "type": a shape name as in the draw_* tools
+    without the "draw_" prefix (rectangle, oval, right_arrow, ...) plus x1, y1, x2, y2,
+    path plus "points" (and optionally "tolerance" and "closed") as in draw_path,
+    or text plus "text" (and optionally "x", "y", "size" and "font" as in add_text_in_paint).
+    E.g. [{"type": "rectangle", "x1": 272, "y1": 310, "x2": 559, "y2": 657},
+          {"type": "oval", "x1": 300, "y1": 350, "x2": 500, "y2": 550},
+          {"type": "text", "text": "baby_AGI"}]
+    Returns one result line per operation.
+    """
     try:
-        if not paint_app:
+        canvas = get_canvas()
+        if not canvas.is_open:
             return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
-        paint_window = paint_app.window(class_name="MSPaintApp")
-        if not paint_window.has_focus():
-            paint_window.set_focus(); time.sleep(0.2)
-        # Select Left Arrow tool
-        paint_window.click_input(coords=(482, 82)); time.sleep(0.2)
-        canvas = paint_window.child_window(class_name="MSPaintView")
-        canvas.press_mouse_input(coords=(x1, y1))
-        canvas.move_mouse_input(coords=(x2, y2))
-        canvas.release_mouse_input(coords=(x2, y2))
-        time.sleep(0.1)
-        canvas.click_input(coords=(x2 + 5, y2 + 5))
-        time.sleep(0.2)  
-        return {"content":[TextContent(type="text",text=f"Left arrow drawn from ({x1},{y1}) to ({x2},{y2})")]}
-    except Exception as e:
-        return {"content":[TextContent(type="text",text=f"Error drawing left arrow: {e}")]}
+        if isinstance(operations, str):
+            operations = json.loads(operations)
 
-@mcp.tool()
-async def draw_up_arrow(x1: int, y1: int, x2: int, y2: int) -> dict:
-    """Draw an up arrow in Paint from (x1,y1) to (x2,y2)"""
-    global paint_app
-    try:
-        if not paint_app:
-            return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
-        paint_window = paint_app.window(class_name="MSPaintApp")
-        if not paint_window.has_focus():
-            paint_window.set_focus(); time.sleep(0.2)
-        # Select Up Arrow tool
-        paint_window.click_input(coords=(800, 82)); time.sleep(0.2)
-        canvas = paint_window.child_window(class_name="MSPaintView")
-        canvas.press_mouse_input(coords=(x1, y1))
-        canvas.move_mouse_input(coords=(x2, y2))
-        canvas.release_mouse_input(coords=(x2, y2))
-        time.sleep(0.1)
-        canvas.click_input(coords=(x2 + 5, y2 + 5))
-        time.sleep(0.2)  
-        return {"content":[TextContent(type="text",text=f"Up arrow drawn from ({x1},{y1}) to ({x2},{y2})")]}
-    except Exception as e:
-        return {"content":[TextContent(type="text",text=f"Error drawing up arrow: {e}")]}
+        results = [None] * len(operations)
+        for kind, items in group_batch_operations(operations):
+            try:
+                if kind == "text":
+                    index, op = items[0]
+                    id = await ui.run(canvas.add_text, str(op["text"]), op.get("x"), op.get("y"),
+                                      op.get("size"), op.get("font"))
+                    results[index] = f"Text:'{op['text']}' added successfully as #{id}"
+                elif kind in SHAPES:
+                    boxes = [
+                        tuple(int(op[k]) for k in ("x1", "y1", "x2", "y2"))
+                        for _, op in items
+                    ]
+                    ids = await ui.run(canvas.draw_shapes, kind, boxes)
+                    for (index, _), (x1, y1, x2, y2), id in zip(items, boxes, ids):
+                        results[index] = f"{SHAPES[kind].label} drawn from ({x1},{y1}) to ({x2},{y2}) as #{id}"
+                elif kind == "path":
+                    # Each path is its own stroke, so each gets its own result
+                    for index, op in items:
+                        try:
+                            count, simplified = prepare_path(op["points"], op.get("tolerance", 1.0),
+                                                             op.get("closed", False))
+                            id = await ui.run(canvas.draw_path, simplified)
+                            results[index] = f"Path drawn through {len(simplified)} of {count} points as #{id}"
+                        except KeyError as e:
+                            results[index] = f"Error in path operation: missing field {e}"
+                        except Exception as e:
+                            results[index] = f"Error in path operation: {e}"
+                else:
+                    raise ValueError(f"Unknown operation type: {kind}")
+            except KeyError as e:
+                for index, _ in items:
+                    results[index] = f"Error in {kind} operation: missing field {e}"
+            except Exception as e:
+                for index, _ in items:
+                    results[index] = f"Error in {kind} operation: {e}"
+        canvas.snapshots.invalidate()
 
-@mcp.tool()
-async def draw_down_arrow(x1: int, y1: int, x2: int, y2: int) -> dict:
-    """Draw a down arrow in Paint from (x1,y1) to (x2,y2)"""
-    global paint_app
-    try:
-        if not paint_app:
-            return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
-        paint_window = paint_app.window(class_name="MSPaintApp")
-        if not paint_window.has_focus():
-            paint_window.set_focus(); time.sleep(0.2)
-        # Select Down Arrow tool
-        paint_window.click_input(coords=(379, 105)); time.sleep(0.2)
-        canvas = paint_window.child_window(class_name="MSPaintView")
-        canvas.press_mouse_input(coords=(x1, y1))
-        canvas.move_mouse_input(coords=(x2, y2))
-        canvas.release_mouse_input(coords=(x2, y2))
-        time.sleep(0.1)
-        canvas.click_input(coords=(x2 + 5, y2 + 5))
-        time.sleep(0.2)  
-        return {"content":[TextContent(type="text",text=f"Down arrow drawn from ({x1},{y1}) to ({x2},{y2})")]}
+        return {"content":[
+            TextContent(type="text",text=f"{i}. {result}")
+            for i, result in enumerate(results, start=1)
+        ]}
     except Exception as e:
-        return {"content":[TextContent(type="text",text=f"Error drawing down arrow: {e}")]}
+        return {"content":[TextContent(type="text",text=f"Error drawing batch: {e}")]}
 
 @mcp.tool()
 async def verify_task(task: str, expected_count: Optional[int] = None) -> dict:
@@ -342,6 +349,7 @@ async def verify_task(task: str, expected_count: Optional[int] = None) -> dict:
     Parameters:
       - task (str): A description of what is to be verified. For example: "shape" or "text".
       - expected_count (int, optional): For shape verification, the expected number of shapes on the canvas.
+        For text verification, the expected number of text regions (defaults to at least one).
       
     Examples:
       - After drawing the first shape:
@@ -356,12 +364,14 @@ async def verify_task(task: str, expected_count: Optional[int] = None) -> dict:
     If the tool determines that what has been drawn does not meet expectations, the agent may decide
     to retry the last action with altered parameters.
     
-    Note: This verification is simulated. In a production system, one might capture a screenshot from the canvas,
-    analyze it (for example, by counting drawn objects or detecting text), and then return the appropriate verification result.
+    The canvas is captured and its separate drawn objects are counted. Small objects lying next to each
+    other on a line are counted as one text region rather than as shapes, unless a draw tool drew them;
+    text of any size written with add_text_in_paint is text. Shapes whose outlines touch or cross are
+    counted as one object.
     """
-    global paint_app
     try:
-        if not paint_app:
+        canvas = get_canvas()
+        if not canvas.is_open:
             return {
                 "content": [
                     TextContent(
@@ -371,15 +381,37 @@ async def verify_task(task: str, expected_count: Optional[int] = None) -> dict:
                 ]
             }
             
-        # Simulate verification based on provided parameters.
-        if expected_count is not None:
-            # Simulate verification for shapes using the expected count.
-            message = f"Verification successful: Canvas shows {expected_count} shape(s) as expected."
-        elif "text" in task.lower():
-            # Simulate text verification.
-            message = "Verification successful: Canvas contains text as expected."
+        # Only the parts of the canvas changed since the last verification are re-analysed.
+        # Runs on the UI thread so it sees every draw queued before it.
+        def analyze():
+            with tracer.span("ui.capture"):
+                frame = canvas.capture()
+            # After the capture, which reloads a spilled canvas and with it a fresh analyzer
+            analyzer = canvas.get_analyzer()
+            # Text and shapes of any size are told apart by where the scene graph says they were drawn
+            primitives = canvas.scene.all()
+            text_boxes = [p.bbox for p in primitives if p.type == "text"]
+            shape_boxes = [p.bbox for p in primitives if p.type != "text"]
+            with tracer.span("analysis"):
+                analyzer.update(frame)
+                return analyzer.summary(text_boxes, shape_boxes)
+        shapes, text_regions = await ui.run(analyze)
+        shape_count, text_count = len(shapes), len(text_regions)
+
+        if "text" in task.lower():
+            if (expected_count is None and text_count > 0) or text_count == expected_count:
+                message = f"Verification successful: Canvas contains {text_count} text region(s) as expected."
+            else:
+                expected = "at least 1" if expected_count is None else expected_count
+                message = f"Verification failed: Canvas contains {text_count} text region(s), expected {expected}."
+        elif expected_count is not None:
+            if shape_count == expected_count:
+                message = f"Verification successful: Canvas shows {expected_count} shape(s) as expected."
+            else:
+                message = f"Verification failed: Canvas shows {shape_count} shape(s), expected {expected_count}."
         else:
-            message = f"Verification complete for task '{task}'."
+            message = (f"Verification complete for task '{task}': canvas shows {shape_count} shape(s) "
+                       f"and {text_count} text region(s).")
             
         return {
             "content": [
@@ -409,8 +441,123 @@ verify_task.inputSchema = {
     "required": ["task"]
 }
 
+QUERIES = ("list", "region", "within", "overlaps", "inside", "nearest", "relation")
+
+def require(query, **arguments):
+    """Raise a ValueError naming the arguments `query` needs that were not given"""
+    missing = [name for name, value in arguments.items() if value is None]
+    if missing:
+        raise ValueError(f"query '{query}' needs {', '.join(missing)}")
+
+@mcp.tool()
+def query_canvas(query: str, id: Optional[int] = None, other: Optional[int] = None,
+                 x1: Optional[int] = None, y1: Optional[int] = None,
+                 x2: Optional[int] = None, y2: Optional[int] = None, limit: int = 10) -> dict:
+    """
+    Answer layout questions from the record of everything drawn, without a screenshot.
+    Every draw tool reports the #id of what it drew. Queries:
+      - list: everything drawn, in drawing order (later on top)
+      - region / within: primitives overlapping / entirely inside the box (x1,y1)-(x2,y2)
+      - overlaps / inside: primitives overlapping / entirely inside primitive `id`
+      - nearest: the `limit` primitives closest to the point (x1,y1)
+      - relation: whether `id` is inside `other`, overlaps it, or how far apart they are
+    E.g. query_canvas("relation", id=2, other=1) -> "#2 is inside #1"
+    Boxes are compared, so "inside" means inside the bounding box.
+    """
+    try:
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, got {limit}")
+        scene = get_canvas().scene
+        query = query.lower()
+        if query == "relation":
+            require(query, id=id, other=other)
+            return {"content":[TextContent(type="text",text=scene.relation(id, other))]}
+        if query == "nearest":
+            require(query, x1=x1, y1=y1)
+            found = [f"{p.describe()} at {d:.0f} px" for d, p in scene.nearest(x1, y1, limit)]
+        elif query == "list":
+            found = [p.describe() for p in scene.all()[:limit]]
+        elif query in ("region", "within"):
+            require(query, x1=x1, y1=y1, x2=x2, y2=y2)
+            found = [p.describe() for p in scene.region((x1, y1, x2, y2), inside=query == "within")[:limit]]
+        elif query == "overlaps":
+            require(query, id=id)
+            found = [p.describe() for p in scene.overlapping(id)[:limit]]
+        elif query == "inside":
+            require(query, id=id)
+            found = [p.describe() for p in scene.inside(id)[:limit]]
+        else:
+            raise ValueError(f"Unknown query: {query} (expected one of {', '.join(QUERIES)})")
+        if not found:
+            return {"content":[TextContent(type="text",text=f"No primitives found ({len(scene)} on the canvas)")]}
+        return {"content":[TextContent(type="text",text=f"{len(found)} primitive(s): " + "; ".join(found))]}
+    except KeyError as e:
+        return {"content":[TextContent(type="text",text=f"Error: {e.args[0]}")]}
+    except Exception as e:
+        return {"content":[TextContent(type="text",text=f"Error querying canvas: {e}")]}
+
+async def encode_snapshot(scale=DEFAULT_SNAPSHOT_SCALE, format="png"):
+    """Encoded bytes of the current canvas, from the cache when it has not changed"""
+    scale, format = snapshot_scale(scale), snapshot_format(format)
+    canvas = get_canvas()
+    if not canvas.is_open:
+        raise ValueError("Paint is not open. Please call open_paint first.")
+    snapshots = canvas.snapshots
+    version = snapshots.version
+    data = snapshots.get(version, scale, format)
+    if data is None:
+        frame = snapshots.frame(version)
+        if frame is None:
+            # Captured on the UI thread, after any draws queued before it
+            with tracer.span("ui.capture"):
+                frame = await ui.run(canvas.capture)
+            snapshots.put_frame(version, frame)
+        # Encoding is CPU work that should not hold up the UI thread or the event loop
+        with tracer.span("snapshot.encode", scale=scale, format=format):
+            data = await asyncio.to_thread(snapshots.encode, version, frame, scale, format)
+    return data
+
+@mcp.tool()
+async def get_canvas_snapshot(scale: float = DEFAULT_SNAPSHOT_SCALE, format: str = "png") -> Image:
+    """
+    Return the current canvas as an image, downscaled by `scale` (0 < scale <= 1)
+    and encoded as png, webp or jpeg. Cheap to call repeatedly: the image is only
+    re-encoded after the canvas changes.
+    """
+    try:
+        return Image(data=await encode_snapshot(scale, format), format=snapshot_format(format))
+    except Exception as e:
+        return {"content":[TextContent(type="text",text=f"Error taking snapshot: {e}")]}
+
 # DEFINE RESOURCES
 
+# The canvas as a PNG at the default scale
+@mcp.resource("canvas://snapshot", mime_type="image/png")
+async def canvas_snapshot() -> bytes:
+    """Current canvas as a PNG, downscaled by half"""
+    return await encode_snapshot()
+
+def make_snapshot_resource(format):
+    """Build the canvas://snapshot/<format>/{scale} resource for one format"""
+    async def snapshot(scale: str) -> bytes:
+        return await encode_snapshot(scale, format)
+    snapshot.__name__ = f"canvas_snapshot_{format}"
+    snapshot.__doc__ = f"Current canvas as {format}, downscaled by `scale`"
+    return snapshot
+
+# canvas://snapshot/png/0.25, canvas://snapshot/webp/1, ...
+for fmt, (_, mime_type, _) in SNAPSHOT_FORMATS.items():
+    mcp.resource(f"canvas://snapshot/{fmt}/{{scale}}", mime_type=mime_type)(make_snapshot_resource(fmt))
+
+
+# Connected client sessions, for watching a shared server
+@mcp.resource("server://sessions", mime_type="application/json")
+def session_stats() -> str:
+    """Connected sessions with their in-flight, completed and rejected call counts"""
+    return json.dumps({"max_in_flight": sessions.max_in_flight, "sessions": sessions.stats(),
+                       "canvases": canvases.stats()})
+
+
 # Add a dynamic greeting resource
 @mcp.resource("greeting://{name}")
 def get_greeting(name: str) -> str:
@@ -432,10 +579,42 @@ def debug_error(error: str) -> list[base.Message]:
         base.AssistantMessage("I'll help debug that. What have you tried so far?"),
     ]
 
+# stdio serves the one client that spawned the process; the network transports
+# keep one long-lived server that many agents connect to at the same time
+TRANSPORTS = ("stdio", "sse", "streamable-http")
+
+def option(name, default):
+    """Value following `name` on the command line, or `default`"""
+    if name in sys.argv:
+        return sys.argv[sys.argv.index(name) + 1]
+    return default
+
 if __name__ == "__main__":
+    # Pick the canvas backend: --backend <name> overrides PAINT_BACKEND
+    backend_name = option("--backend", backend_name)
+    if backend_name not in BACKENDS:
+        sys.exit(f"Unknown backend: {backend_name} (expected one of {', '.join(BACKENDS)})")
+
+    # --transport/--host/--port override PAINT_TRANSPORT, PAINT_HOST and PAINT_PORT
+    transport = option("--transport", os.getenv("PAINT_TRANSPORT", "stdio"))
+    if transport not in TRANSPORTS:
+        sys.exit(f"Unknown transport: {transport} (expected one of {', '.join(TRANSPORTS)})")
+    mcp.settings.host = option("--host", os.getenv("PAINT_HOST", mcp.settings.host))
+    mcp.settings.port = int(option("--port", os.getenv("PAINT_PORT", mcp.settings.port)))
+
     # Check if running with mcp dev command
     print("STARTING")
-    if len(sys.argv) > 1 and sys.argv[1] == "dev":
-        mcp.run()  # Run without transport for dev server
-    else:
-        mcp.run(transport="stdio")  # Run with stdio for direct execution
+    try:
+        if len(sys.argv) > 1 and sys.argv[1] == "dev":
+            mcp.run()  # Run without transport for dev server
+        elif transport == "stdio":
+            # The only client is the one that spawned us, so there is nobody to share with
+            sessions.max_in_flight = 0
+            mcp.run(transport="stdio")  # Run with stdio for direct execution
+        else:
+            print(f"Serving on http://{mcp.settings.host}:{mcp.settings.port}"
+                  f"{mcp.settings.sse_path if transport == 'sse' else mcp.settings.streamable_http_path}")
+            mcp.run(transport=transport)
+    finally:
+        # Spilled canvases are this process's own, also when it is interrupted
+        canvases.close()
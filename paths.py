@@ -0,0 +1,80 @@
+# Point lists for the draw_path tool: parsing and Douglas-Peucker simplification.
+#
+# A freehand outline from the model can hold thousands of points, most of them
+# on nearly straight runs. Simplifying it to within a pixel tolerance keeps the
+# shape while bounding the number of mouse moves MS Paint has to process.
+import json
+
+import numpy as np
+
+# Upper bound on the points of a simplified path; the tolerance is raised until it fits
+MAX_PATH_POINTS = 500
+
+
+def path_points(points, closed=False):
+    """
+    (N, 2) float array from [[x, y], ...], a flat [x1, y1, x2, y2, ...] list,
+    or either of them JSON-encoded; `closed` appends the first point
+    """
+    if isinstance(points, str):
+        points = json.loads(points)
+    array = np.asarray(points, dtype=float)
+    if array.ndim == 1 and len(array) % 2 == 0:
+        array = array.reshape(-1, 2)
+    if array.ndim != 2 or array.shape[1] != 2 or len(array) < 2:
+        raise ValueError("points must be a list of at least two [x, y] pairs")
+    if closed:
+        array = np.vstack([array, array[:1]])
+    return array
+
+
+def _douglas_peucker(points, tolerance):
+    """Boolean mask of the points kept within `tolerance` pixels of the original"""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    # Iterative, so long paths cannot exhaust the recursion limit
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        inner = points[start + 1:end]
+        a, b = points[start], points[end]
+        segment = b - a
+        squared = segment @ segment
+        if squared == 0:
+            # A path returning to its start: distance to that point
+            distances = np.hypot(*(inner - a).T)
+        else:
+            # Distance of every inner point to the chord as a segment, not an infinite line,
+            # so a path that backtracks beyond an endpoint keeps its turning point
+            t = np.clip((inner - a) @ segment / squared, 0.0, 1.0)
+            distances = np.hypot(*(inner - (a + t[:, None] * segment)).T)
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def simplify_path(points, tolerance=1.0, max_points=MAX_PATH_POINTS):
+    """
+    Simplify an (N, 2) path to the fewest points that stay within `tolerance`
+    pixels of it, doubling the tolerance while more than `max_points` remain.
+    Returns integer (M, 2) pixel coordinates without consecutive duplicates.
+    """
+    points = np.rint(points).astype(int)
+    # Consecutive duplicates add mouse moves without drawing anything
+    moved = np.ones(len(points), dtype=bool)
+    moved[1:] = np.any(points[1:] != points[:-1], axis=1)
+    points = points[moved]
+    if len(points) < 2:
+        return points
+    tolerance = max(float(tolerance), 0.0)
+    while True:
+        simplified = points[_douglas_peucker(points.astype(float), tolerance)]
+        if max_points is None or len(simplified) <= max_points:
+            return simplified
+        tolerance = max(tolerance * 2, 1.0)
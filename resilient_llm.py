@@ -0,0 +1,176 @@
+# Retries, hedged requests and model fallback around single LLM attempts.
+#
+# Each attempt gets a deadline derived from the latencies seen so far, failed
+# attempts are retried after a jittered backoff, and once a model has failed
+# every retry the next model of the fallback list takes over. With hedging on,
+# an attempt that is slower than the chosen latency percentile gets a duplicate
+# request and whichever answers first wins.
+import asyncio
+import os
+import random
+import time
+from collections import deque
+
+from llm_cache import CacheMiss, CachedResponse
+from tracing import Tracer, percentile
+
+
+def model_name(model):
+    return getattr(model, "model_name", type(model).__name__)
+
+
+class LatencyTracker:
+    """Recent generation latencies of one model, in seconds"""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        return percentile(self.samples, q)
+
+
+class ResilientGenerator:
+    """
+    Calls `attempt(model, prompt, timeout, **kwargs)`, a coroutine making one
+    generation attempt (generate_with_timeout), with retries, hedging and fallback.
+
+    - retries: extra attempts per model after the first one fails
+    - backoff / max_backoff: the wait before retry n is uniform in
+      [0, min(max_backoff, backoff * 2**(n-1))] seconds
+    - timeout: the per-attempt deadline until `min_samples` latencies are known;
+      then deadline_factor x the model's p99, kept within [min_timeout, timeout]
+    - hedge_percentile: send a duplicate request once an attempt has run longer
+      than this percentile of the model's latencies (None turns hedging off)
+    """
+
+    def __init__(self, attempt, retries=2, backoff=0.5, max_backoff=8.0, timeout=10.0, min_timeout=2.0,
+                 deadline_factor=3.0, hedge_percentile=None, min_samples=20, tracer=None, rng=None):
+        self.attempt = attempt
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.deadline_factor = deadline_factor
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.tracer = tracer or Tracer()
+        self.rng = rng or random.Random()
+        self.latencies = {}
+        self._stragglers = set()
+        self.hedges = 0
+        self.retried = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def from_env(cls, attempt, tracer=None):
+        """Configure from LLM_RETRIES, LLM_TIMEOUT and LLM_HEDGE_PERCENTILE"""
+        hedge = os.getenv("LLM_HEDGE_PERCENTILE")
+        return cls(
+            attempt,
+            retries=int(os.getenv("LLM_RETRIES", "2")),
+            timeout=float(os.getenv("LLM_TIMEOUT", "10")),
+            hedge_percentile=float(hedge) if hedge else None,
+            tracer=tracer,
+        )
+
+    def tracker(self, name):
+        if name not in self.latencies:
+            self.latencies[name] = LatencyTracker()
+        return self.latencies[name]
+
+    def deadline(self, name):
+        """Seconds an attempt on model `name` may take"""
+        tracker = self.tracker(name)
+        if len(tracker) < self.min_samples:
+            return self.timeout
+        return min(self.timeout, max(self.min_timeout, tracker.percentile(99) * self.deadline_factor))
+
+    def hedge_delay(self, name):
+        """Seconds after which an attempt gets a duplicate, or None"""
+        tracker = self.tracker(name)
+        if self.hedge_percentile is None or len(tracker) < self.min_samples:
+            return None
+        return tracker.percentile(self.hedge_percentile)
+
+    def backoff_delay(self, retry):
+        return self.rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** (retry - 1)))
+
+    async def generate(self, models, prompt, log=print, **kwargs):
+        """Return the first successful response, trying `models` in order"""
+        last_error = None
+        with self.tracer.span("llm.call") as span:
+            for index, model in enumerate(models):
+                name = model_name(model)
+                if index:
+                    self.fallbacks += 1
+                    log(f"Falling back to model {name}")
+                for retry in range(self.retries + 1):
+                    if retry:
+                        self.retried += 1
+                        await asyncio.sleep(self.backoff_delay(retry))
+                    try:
+                        response = await self._hedged(model, name, prompt, kwargs, span)
+                        span["model"] = name
+                        return response
+                    except CacheMiss:
+                        # Replay mode: another attempt cannot produce a cached response
+                        raise
+                    except Exception as e:
+                        last_error = e
+                        log(f"LLM attempt {retry + 1}/{self.retries + 1} with {name} failed: {e!r}")
+            raise last_error
+
+    async def _hedged(self, model, name, prompt, kwargs, span):
+        deadline = self.deadline(name)
+        delay = self.hedge_delay(name)
+        tasks = [asyncio.ensure_future(self._timed(model, name, prompt, deadline, kwargs))]
+        try:
+            if delay is not None and delay < deadline:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self.hedges += 1
+                    span["hedged"] = True
+                    tasks.append(asyncio.ensure_future(self._timed(model, name, prompt, deadline, kwargs)))
+            # The first success wins; an error only counts once every request has failed
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The blocking call of a losing request cannot be interrupted, so it is left
+            # to finish (its latency still counts) instead of being cancelled
+            for task in tasks:
+                if not task.done():
+                    self._stragglers.add(task)
+                    task.add_done_callback(self._forget)
+
+    def _forget(self, task):
+        self._stragglers.discard(task)
+        if not task.cancelled():
+            # Retrieve the error of a losing request so it is not reported as unhandled
+            task.exception()
+
+    async def _timed(self, model, name, prompt, deadline, kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.attempt(model, prompt, deadline, **kwargs)
+        except (TimeoutError, asyncio.TimeoutError):
+            # A timed-out attempt took at least the deadline; count it so slow spells raise the estimates
+            self.tracker(name).add(deadline)
+            raise
+        # A cache hit says nothing about how fast the model answers
+        if not isinstance(response, CachedResponse):
+            self.tracker(name).add(time.perf_counter() - started)
+        return response
@@ -0,0 +1,223 @@
+# Vector record of everything drawn on a canvas, for layout queries without a screenshot.
+#
+# Every primitive a draw tool puts on the canvas is kept with its type, bounding
+# box, z-order (drawing order) and text. A uniform grid indexes the boxes, so
+# region, overlap and nearest queries only look at the cells they touch.
+# Boxes too large for the grid and queries that would visit more cells than
+# there are primitives fall back to a linear scan, so neither a huge box nor a
+# far-away point can make a call take longer than looking at everything.
+import math
+import threading
+
+# Boxes covering more grid cells than this are not indexed but scanned on every query
+MAX_BOX_CELLS = 1024
+
+
+class Primitive:
+    def __init__(self, id, type, bbox, text=None):
+        self.id = id
+        self.type = type
+        # (x1, y1, x2, y2) with x1 <= x2 and y1 <= y2
+        self.bbox = bbox
+        self.text = text
+
+    @property
+    def z(self):
+        # Primitives are numbered in drawing order, so later ones lie on top
+        return self.id
+
+    def describe(self):
+        x1, y1, x2, y2 = self.bbox
+        text = f" '{self.text}'" if self.text is not None else ""
+        return f"#{self.id} {self.type}{text} ({x1},{y1})-({x2},{y2}) z={self.z}"
+
+
+def normalize_box(x1, y1, x2, y2):
+    return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+
+def intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+def box_distance(a, b):
+    """Gap between two boxes; 0 when they touch or overlap"""
+    dx = max(b[0] - a[2], a[0] - b[2], 0)
+    dy = max(b[1] - a[3], a[1] - b[3], 0)
+    return math.hypot(dx, dy)
+
+
+def _ring(column, row, ring):
+    """The cells at Chebyshev distance `ring` from (column, row)"""
+    if ring == 0:
+        yield column, row
+        return
+    for c in range(column - ring, column + ring + 1):
+        yield c, row - ring
+        yield c, row + ring
+    for r in range(row - ring + 1, row + ring):
+        yield column - ring, r
+        yield column + ring, r
+
+
+class SceneGraph:
+    """
+    Primitives by ID plus a grid index from (column, row) cells of `cell`
+    pixels to the IDs whose boxes overlap the cell. Writes come from the UI
+    thread and queries from the event loop, so both take the lock.
+    """
+
+    def __init__(self, cell=64):
+        self.cell = cell
+        self.primitives = {}
+        self._grid = {}
+        # IDs of the boxes over MAX_BOX_CELLS cells, kept out of the grid
+        self._large = set()
+        # (min column, min row, max column, max row) of the indexed cells
+        self._extent = None
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.primitives)
+
+    def clear(self):
+        with self._lock:
+            self.primitives.clear()
+            self._grid.clear()
+            self._large.clear()
+            self._extent = None
+            self._next_id = 1
+
+    def _cell_range(self, bbox):
+        """(min column, min row, max column, max row) of the cells `bbox` touches"""
+        return tuple(int(v // self.cell) for v in bbox)
+
+    def _cells(self, cells):
+        x1, y1, x2, y2 = cells
+        for column in range(x1, x2 + 1):
+            for row in range(y1, y2 + 1):
+                yield column, row
+
+    def add(self, type, bbox, text=None):
+        """Record a primitive drawn on top of the others; returns its ID"""
+        with self._lock:
+            primitive = Primitive(self._next_id, type, normalize_box(*bbox), text)
+            self._next_id += 1
+            self.primitives[primitive.id] = primitive
+            x1, y1, x2, y2 = cells = self._cell_range(primitive.bbox)
+            if (x2 - x1 + 1) * (y2 - y1 + 1) > MAX_BOX_CELLS:
+                self._large.add(primitive.id)
+                return primitive.id
+            for cell in self._cells(cells):
+                self._grid.setdefault(cell, set()).add(primitive.id)
+            if self._extent is None:
+                self._extent = (x1, y1, x2, y2)
+            else:
+                e = self._extent
+                self._extent = (min(e[0], x1), min(e[1], y1), max(e[2], x2), max(e[3], y2))
+            return primitive.id
+
+    def all(self):
+        """Every primitive in drawing order"""
+        with self._lock:
+            return list(self.primitives.values())
+
+    def get(self, id):
+        primitive = self.primitives.get(id)
+        if primitive is None:
+            raise KeyError(f"No primitive #{id} on the canvas")
+        return primitive
+
+    def _candidates(self, bbox):
+        """Primitives that may overlap `bbox`, in drawing order"""
+        ids = set(self._large)
+        if self._extent is not None:
+            # Cells outside the extent of the indexed boxes are empty
+            x1, y1, x2, y2 = self._cell_range(bbox)
+            e = self._extent
+            cells = (max(x1, e[0]), max(y1, e[1]), min(x2, e[2]), min(y2, e[3]))
+            count = max(cells[2] - cells[0] + 1, 0) * max(cells[3] - cells[1] + 1, 0)
+            if count > len(self.primitives):
+                return list(self.primitives.values())
+            for cell in self._cells(cells):
+                ids.update(self._grid.get(cell, ()))
+        return [self.primitives[id] for id in sorted(ids)]
+
+    def region(self, bbox, inside=False):
+        """Primitives overlapping `bbox`, or lying entirely inside it with `inside`"""
+        bbox = normalize_box(*bbox)
+        test = contains if inside else intersects
+        with self._lock:
+            return [p for p in self._candidates(bbox) if test(bbox, p.bbox)]
+
+    def overlapping(self, id):
+        """Primitives whose boxes overlap primitive `id`'s box"""
+        with self._lock:
+            bbox = self.get(id).bbox
+            return [p for p in self._candidates(bbox) if p.id != id and intersects(bbox, p.bbox)]
+
+    def inside(self, id):
+        """Primitives lying entirely inside primitive `id`'s box"""
+        with self._lock:
+            bbox = self.get(id).bbox
+            return [p for p in self._candidates(bbox) if p.id != id and contains(bbox, p.bbox)]
+
+    def nearest(self, x, y, limit=1):
+        """
+        The `limit` primitives closest to the point (x, y), by distance to their
+        boxes, as (distance, primitive) pairs. Searches rings of grid cells
+        outwards and stops once no unvisited cell can hold anything closer.
+        Points outside the indexed area, and searches that would visit more
+        cells than there are primitives, compare every primitive instead.
+        """
+        point = (x, y, x, y)
+        column, row = int(x // self.cell), int(y // self.cell)
+        with self._lock:
+            if not self.primitives:
+                return []
+
+            def scan():
+                found = sorted((box_distance(point, p.bbox), p.id, p) for p in self.primitives.values())
+                return [(distance, primitive) for distance, _, primitive in found[:limit]]
+
+            if self._extent is None:
+                return scan()
+            x1, y1, x2, y2 = self._extent
+            if not (x1 <= column <= x2 and y1 <= row <= y2):
+                return scan()
+            # Furthest ring that can contain a cell of an indexed box
+            reach = max(column - x1, x2 - column, row - y1, y2 - row)
+            seen = set(self._large)
+            found = [(box_distance(point, self.primitives[id].bbox), id, self.primitives[id]) for id in self._large]
+            for ring in range(reach + 1):
+                # Visiting more cells than there are primitives costs more than comparing them all
+                if (2 * ring + 1) ** 2 > len(self.primitives):
+                    return scan()
+                for cell in _ring(column, row, ring):
+                    for id in self._grid.get(cell, ()):
+                        if id not in seen:
+                            seen.add(id)
+                            primitive = self.primitives[id]
+                            found.append((box_distance(point, primitive.bbox), primitive.id, primitive))
+                found.sort(key=lambda item: item[:2])
+                # Cells of the next ring are at least `ring` cells away from the point
+                if len(found) >= limit and found[limit - 1][0] <= ring * self.cell:
+                    break
+            return [(distance, primitive) for distance, _, primitive in found[:limit]]
+
+    def relation(self, a, b):
+        """How the boxes of primitives `a` and `b` relate, in words"""
+        with self._lock:
+            first, second = self.get(a), self.get(b)
+        if contains(second.bbox, first.bbox):
+            return f"#{a} is inside #{b}"
+        if contains(first.bbox, second.bbox):
+            return f"#{b} is inside #{a}"
+        if intersects(first.bbox, second.bbox):
+            return f"#{a} and #{b} overlap"
+        return f"#{a} and #{b} are apart, {box_distance(first.bbox, second.bbox):.0f} px between them"
@@ -0,0 +1,151 @@
+# Pool of tool server sessions shared by concurrent agent sessions: pre-spawned
+# paint_mcp_tools.py processes over stdio, or sessions on one shared server over HTTP/SSE
+import asyncio
+from contextlib import asynccontextmanager
+
+import anyio
+from mcp import ClientSession
+from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+# Seconds to wait before respawning a server that stopped after startup
+RESTART_DELAY = 1.0
+
+
+@asynccontextmanager
+async def connect(server):
+    """
+    Open the (read, write) streams to a tool server: `server` is either
+    StdioServerParameters for a process of our own, or the URL of a shared
+    server (".../sse" for the SSE transport, otherwise streamable HTTP).
+    """
+    if not isinstance(server, str):
+        async with stdio_client(server) as (read, write):
+            yield read, write
+    elif server.rstrip("/").endswith("/sse"):
+        from mcp.client.sse import sse_client
+        async with sse_client(server) as (read, write):
+            yield read, write
+    else:
+        from mcp.client.streamable_http import streamablehttp_client
+        async with streamablehttp_client(server) as (read, write, _):
+            yield read, write
+
+
+class ServerWorker:
+    """One tool server session: the initialized session and its tool list"""
+
+    def __init__(self, index, session, tools):
+        self.index = index
+        self.session = session
+        self.tools = tools
+        # Free for the client to cache per-worker data (e.g. the rendered system prompt)
+        self.cache = {}
+        # Set once the session is gone; the pool then drops and respawns it
+        self.stopped = asyncio.Event()
+
+    @property
+    def alive(self):
+        return not self.stopped.is_set()
+
+
+def connection_lost(error):
+    """True if `error` means the server's connection is gone rather than a failed call"""
+    if isinstance(error, (anyio.ClosedResourceError, anyio.BrokenResourceError, EOFError)):
+        return True
+    return isinstance(error, McpError) and error.error.code == CONNECTION_CLOSED
+
+
+class ServerPool:
+    """
+    Opens `size` tool server sessions up front and lends them out to agent
+    sessions one at a time, so each query reuses a warm session instead of
+    paying process startup. With stdio parameters every session is its own
+    server process; with a URL they all connect to the one shared server.
+
+    Each session lives in its own task, because the client's task group
+    has to be entered and exited by the same task. When a server stops after
+    startup its task drops the worker from the pool and respawns it.
+    """
+
+    def __init__(self, server_params, size):
+        # StdioServerParameters or a server URL, as taken by connect()
+        self.server_params = server_params
+        self.size = size
+        self._idle = asyncio.Queue()
+        self._closed = asyncio.Event()
+        self._tasks = []
+        self._workers = {}
+
+    async def start(self):
+        """Spawn and initialize every server; raises if any of them fails to start"""
+        loop = asyncio.get_running_loop()
+        ready = [loop.create_future() for _ in range(self.size)]
+        self._tasks = [
+            asyncio.create_task(self._serve(index, future))
+            for index, future in enumerate(ready)
+        ]
+        try:
+            await asyncio.gather(*ready)
+        except Exception:
+            await self.close()
+            raise
+
+    async def _serve(self, index, ready):
+        while not self._closed.is_set():
+            try:
+                async with connect(self.server_params) as (read, write):
+                    async with ClientSession(read, write) as session:
+                        await session.initialize()
+                        tools = (await session.list_tools()).tools
+                        worker = ServerWorker(index, session, tools)
+                        self._workers[index] = worker
+                        self._idle.put_nowait(worker)
+                        if not ready.done():
+                            ready.set_result(index)
+                        await worker.stopped.wait()
+            except Exception as e:
+                if not ready.done():
+                    ready.set_exception(e)
+                    return
+                print(f"Tool server {index} stopped: {e}")
+            finally:
+                worker = self._workers.pop(index, None)
+                if worker:
+                    worker.stopped.set()
+            if not self._closed.is_set():
+                print(f"Restarting tool server {index}")
+                await asyncio.sleep(RESTART_DELAY)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow an idle server for the duration of the block, skipping stopped ones"""
+        worker = await self._idle.get()
+        while not worker.alive:
+            worker = await self._idle.get()
+        try:
+            yield worker
+        except Exception as e:
+            if connection_lost(e):
+                # Wakes the worker's task, which replaces it with a fresh server
+                worker.stopped.set()
+            raise
+        finally:
+            if worker.alive:
+                self._idle.put_nowait(worker)
+
+    async def close(self):
+        """Stop every server process"""
+        self._closed.set()
+        for worker in list(self._workers.values()):
+            worker.stopped.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
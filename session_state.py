@@ -0,0 +1,108 @@
+# Per-client session state for a tool server shared by many agents over HTTP/SSE.
+#
+# Over stdio a server has exactly one client. Over the network transports every
+# connected client is its own MCP session, so the server keeps a SessionState
+# per session: a short ID, call counters and a bound on how many of its
+# requests may be in flight at once, so one busy client cannot fill the shared
+# UI worker's queue for everybody else. Requests over the bound wait for a
+# free slot, and fail only when none frees up in time.
+import asyncio
+import contextvars
+import itertools
+import time
+import weakref
+
+# The SessionState of the request being served, e.g. to pick the session's canvas
+current_session = contextvars.ContextVar("current_session", default=None)
+
+
+class SessionBusy(Exception):
+    """Raised when a request waited too long for one of its session's in-flight slots"""
+
+
+class SessionState:
+    """
+    Used as `async with state:` around a request. Once `max_in_flight`
+    requests are running, further ones wait up to `wait_timeout` seconds for
+    one of them to finish, then raise SessionBusy.
+    """
+
+    def __init__(self, id, max_in_flight, wait_timeout=30.0):
+        self.id = id
+        self.max_in_flight = max_in_flight
+        self.wait_timeout = wait_timeout
+        self._slots = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.rejected = 0
+        self.created = time.time()
+        self.last_seen = self.created
+
+    async def __aenter__(self):
+        if self._slots is not None:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise SessionBusy(f"Session {self.id} waited {self.wait_timeout:g} s with {self.in_flight} requests "
+                                  f"in flight (limit {self.max_in_flight}); retry once one of them has finished")
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+        self.calls += 1
+        self.last_seen = time.time()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.in_flight -= 1
+        self.last_seen = time.time()
+        if self._slots is not None:
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "id": self.id,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "age_s": round(time.time() - self.created, 1),
+            "idle_s": round(time.time() - self.last_seen, 1),
+        }
+
+
+class SessionRegistry:
+    """
+    SessionState per MCP server session object. Entries are weakly keyed, so a
+    session's state goes away with the connection. `max_in_flight` of 0 or
+    None means no limit; `wait_timeout` is how long a request over the limit
+    waits for a slot.
+    """
+
+    def __init__(self, max_in_flight=4, wait_timeout=30.0):
+        self.max_in_flight = max_in_flight
+        self.wait_timeout = wait_timeout
+        self._states = weakref.WeakKeyDictionary()
+        self._ids = itertools.count(1)
+        # Called with the session ID once a session is gone
+        self.on_close = None
+
+    def get(self, session):
+        state = self._states.get(session)
+        if state is None:
+            state = SessionState(f"s{next(self._ids)}", self.max_in_flight, self.wait_timeout)
+            self._states[session] = state
+            weakref.finalize(session, self._closed, state.id)
+        return state
+
+    def _closed(self, id):
+        if self.on_close is not None:
+            self.on_close(id)
+
+    def __len__(self):
+        return len(self._states)
+
+    def stats(self):
+        return [state.stats() for state in self._states.values()]
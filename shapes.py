@@ -0,0 +1,106 @@
+# Registry of the shape primitives every backend can draw.
+# Each entry is all that is needed to add a shape: the server generates its
+# draw_<name> tool, the Paint backend clicks its toolbar button and the headless
+# backend rasterizes its outline.
+# Outlines are plain lists so importing this module stays cheap for the server;
+# NumPy is only imported by the headless rasterizer.
+import math
+
+
+class Shape:
+    """
+    A primitive dragged out from (x1,y1) to (x2,y2).
+
+    - toolbar: (x, y) of the tool's button in the maximized Paint window
+    - outline: vertices in unit-square coordinates, mapped onto the drag box;
+      None for ellipses
+    - closed: whether the outline is a closed polygon or an open polyline
+    - keep_direction: map the outline onto the drag as given (e.g. a line
+      from start to end) instead of onto the normalized bounding box
+    """
+
+    def __init__(self, name, label, article, toolbar, outline=None, closed=True, keep_direction=False):
+        self.name = name
+        self.label = label
+        self.article = article
+        self.toolbar = toolbar
+        self.outline = None if outline is None else [tuple(map(float, p)) for p in outline]
+        self.closed = closed
+        self.keep_direction = keep_direction
+
+    @property
+    def is_ellipse(self):
+        return self.outline is None
+
+    def boxes(self, drags):
+        """(N, 4) drag coordinates -> (N, 4) boxes the outline is mapped onto"""
+        import numpy as np
+        drags = np.asarray(drags, dtype=float).reshape(-1, 4)
+        if self.keep_direction:
+            return drags
+        return np.column_stack([
+            np.minimum(drags[:, 0], drags[:, 2]), np.minimum(drags[:, 1], drags[:, 3]),
+            np.maximum(drags[:, 0], drags[:, 2]), np.maximum(drags[:, 1], drags[:, 3]),
+        ])
+
+    def vertices(self, drags):
+        """Outline vertices for N drags at once, as an (N, K, 2) integer array"""
+        import numpy as np
+        boxes = self.boxes(drags)
+        origin = boxes[:, None, :2]
+        extent = boxes[:, None, 2:] - origin
+        return np.rint(origin + np.asarray(self.outline)[None, :, :] * extent).astype(int)
+
+
+def _star(points, inner=0.38):
+    """Unit-square outline of a star with `points` tips, the first pointing up"""
+    outline = []
+    for i in range(points * 2):
+        angle = math.pi / 2 + i * math.pi / points
+        radius = 0.5 if i % 2 == 0 else 0.5 * inner
+        outline.append((0.5 + radius * math.cos(angle), 0.5 - radius * math.sin(angle)))
+    return outline
+
+
+def _regular_polygon(sides):
+    """Unit-square outline of a regular polygon with a vertex pointing up"""
+    return [
+        (0.5 + 0.5 * math.cos(math.pi / 2 + i * 2 * math.pi / sides),
+         0.5 - 0.5 * math.sin(math.pi / 2 + i * 2 * math.pi / sides))
+        for i in range(sides)
+    ]
+
+
+# Block arrows, pointing right; the other directions are mirrored or transposed
+_RIGHT_ARROW = [
+    (0.0, 0.25), (0.6, 0.25), (0.6, 0.0), (1.0, 0.5),
+    (0.6, 1.0), (0.6, 0.75), (0.0, 0.75),
+]
+_LEFT_ARROW = [(1.0 - x, y) for x, y in _RIGHT_ARROW]
+_DOWN_ARROW = [(y, x) for x, y in _RIGHT_ARROW]
+_UP_ARROW = [(y, 1.0 - x) for x, y in _RIGHT_ARROW]
+
+SHAPES = {}
+
+def register_shape(shape):
+    """Add `shape` to the registry; the server exposes it as draw_<name>"""
+    SHAPES[shape.name] = shape
+    return shape
+
+
+# Paint lays its shape gallery out seven buttons per row, about 19px apart,
+# starting at (379, 63)
+register_shape(Shape("rectangle", "Rectangle", "a rectangle", (440, 63), [[0, 0], [1, 0], [1, 1], [0, 1]]))
+register_shape(Shape("oval", "Oval", "an oval", (421, 63)))
+register_shape(Shape("right_arrow", "Right arrow", "a right arrow", (460, 82), _RIGHT_ARROW))
+register_shape(Shape("left_arrow", "Left arrow", "a left arrow", (482, 82), _LEFT_ARROW))
+register_shape(Shape("up_arrow", "Up arrow", "an up arrow", (800, 82), _UP_ARROW))
+register_shape(Shape("down_arrow", "Down arrow", "a down arrow", (379, 105), _DOWN_ARROW))
+register_shape(Shape("line", "Line", "a straight line", (379, 63), [[0, 0], [1, 1]],
+                     closed=False, keep_direction=True))
+register_shape(Shape("triangle", "Triangle", "an isosceles triangle", (497, 63), [[0.5, 0], [1, 1], [0, 1]]))
+register_shape(Shape("right_triangle", "Right triangle", "a right triangle", (379, 82), [[0, 0], [1, 1], [0, 1]]))
+register_shape(Shape("diamond", "Diamond", "a diamond", (398, 82), [[0.5, 0], [1, 0.5], [0.5, 1], [0, 0.5]]))
+register_shape(Shape("pentagon", "Pentagon", "a pentagon", (417, 82), _regular_polygon(5)))
+register_shape(Shape("hexagon", "Hexagon", "a hexagon", (436, 82), _regular_polygon(6)))
+register_shape(Shape("star", "Star", "a five-point star", (417, 105), _star(5)))
@@ -0,0 +1,59 @@
+# Measures cold start of the paint_mcp_tools.py stdio server, or, with --server-url,
+# how long a new session on an already running HTTP/SSE server takes to get ready
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from mcp import ClientSession, StdioServerParameters
+
+from server_pool import connect
+
+
+async def measure_once(server_params):
+    """Connect once; return seconds to `initialize` and to `list_tools`"""
+    started = time.perf_counter()
+    async with connect(server_params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            initialized = time.perf_counter() - started
+            await session.list_tools()
+            listed = time.perf_counter() - started
+    return initialized, listed
+
+
+def describe(samples):
+    return (f"min {min(samples) * 1000:7.1f} ms  median {statistics.median(samples) * 1000:7.1f} ms  "
+            f"max {max(samples) * 1000:7.1f} ms")
+
+
+async def main(runs, backend, server_url=None):
+    server_params = server_url or StdioServerParameters(
+        command=sys.executable,
+        args=["paint_mcp_tools.py", "--backend", backend]
+    )
+    # One untimed run so the first measurement doesn't include filling the OS file cache
+    await measure_once(server_params)
+
+    to_initialize, to_list_tools = [], []
+    for _ in range(runs):
+        initialized, listed = await measure_once(server_params)
+        to_initialize.append(initialized)
+        to_list_tools.append(listed)
+
+    if server_url:
+        print(f"New session on {server_url} ({runs} runs)")
+    else:
+        print(f"Startup of paint_mcp_tools.py ({backend} backend, {runs} runs)")
+    print(f"  time to initialize: {describe(to_initialize)}")
+    print(f"  time to list_tools: {describe(to_list_tools)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cold start of the MCP tool server")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--backend", default="headless", help="canvas backend passed to the server")
+    parser.add_argument("--server-url", help="measure sessions on this running HTTP/SSE server instead")
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.backend, args.server_url))
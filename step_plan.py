@@ -0,0 +1,172 @@
+# Executable show_reasoning plans for the agent's planner mode.
+#
+# In planner mode the model's first show_reasoning call lists structured steps:
+#   {"id": "s2", "description": "Draw the face", "call": {"name": "draw_oval", "args": {...}}, "after": ["s1"]}
+# The client runs every step that has a call itself, level by level along the
+# "after" dependencies: drawing calls of a level go out as one draw_batch call and
+# the other calls of a level run concurrently. Steps without a call, and steps
+# whose dependencies failed, are reported back to the model to handle.
+import asyncio
+import json
+
+from agent_history import result_failed
+from tool_table import BATCH_TOOL, as_batch_operation
+
+
+class PlanError(ValueError):
+    """Raised for plans with malformed steps, unknown dependencies or cycles"""
+
+
+class Step:
+    def __init__(self, id, description, call=None, after=()):
+        self.id = id
+        self.description = description
+        # (tool name, args) or None when the step needs the model's judgment
+        self.call = call
+        self.after = list(after)
+
+
+def parse_plan(steps):
+    """
+    Build the Step list from show_reasoning's `steps`: a list or JSON-encoded
+    list of step objects. Plain strings become steps without a call.
+    """
+    if isinstance(steps, str):
+        try:
+            steps = json.loads(steps)
+        except json.JSONDecodeError as e:
+            raise PlanError(f"steps is not a JSON list: {e}")
+    if not isinstance(steps, list):
+        raise PlanError("steps must be a list")
+
+    plan = []
+    for index, item in enumerate(steps, start=1):
+        if isinstance(item, str):
+            plan.append(Step(f"s{index}", item))
+            continue
+        if not isinstance(item, dict):
+            raise PlanError(f"step {index} must be an object or a string")
+        call = item.get("call")
+        if call is not None:
+            if not isinstance(call, dict) or "name" not in call:
+                raise PlanError(f"step {index}: call must be an object with a name")
+            args = call.get("args") or {}
+            if not isinstance(args, dict):
+                raise PlanError(f"step {index}: args must be an object")
+            call = (call["name"], args)
+        after = item.get("after") or []
+        if isinstance(after, str):
+            after = [after]
+        description = item.get("description") or item.get("step") or (call[0] if call else f"Step {index}")
+        plan.append(Step(str(item.get("id", f"s{index}")), str(description), call, [str(a) for a in after]))
+
+    ids = [step.id for step in plan]
+    if len(set(ids)) != len(ids):
+        raise PlanError("step ids must be unique")
+    for step in plan:
+        unknown = [dep for dep in step.after if dep not in ids]
+        if unknown:
+            raise PlanError(f"step {step.id} depends on unknown step(s) {', '.join(unknown)}")
+    return plan
+
+
+def levels(plan):
+    """Group the steps into levels; every step comes after all the steps it depends on"""
+    level_of = {}
+    remaining = list(plan)
+    while remaining:
+        ready = [step for step in remaining if all(dep in level_of for dep in step.after)]
+        if not ready:
+            raise PlanError(f"dependency cycle among steps {', '.join(step.id for step in remaining)}")
+        for step in ready:
+            level_of[step.id] = max((level_of[dep] + 1 for dep in step.after), default=0)
+        remaining = [step for step in remaining if step.id not in level_of]
+    grouped = {}
+    for step in plan:
+        grouped.setdefault(level_of[step.id], []).append(step)
+    return [grouped[level] for level in sorted(grouped)]
+
+
+class PlanReport:
+    """Outcome of each step: done, failed, skipped (a dependency failed), open (needs the model) or waiting"""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.status = {}
+        self.calls = []
+
+    def ids(self, status):
+        return [step.id for step in self.plan if self.status.get(step.id) == status]
+
+    @property
+    def complete(self):
+        return all(status == "done" for status in self.status.values())
+
+    def summary(self):
+        parts = [f"The client ran your plan: {len(self.ids('done'))} of {len(self.plan)} step(s) done."]
+        for status, text in (("failed", "Failed"), ("skipped", "Skipped because a step they need failed"),
+                             ("open", "Left for you"), ("waiting", "Waiting for the steps left for you")):
+            ids = self.ids(status)
+            if ids:
+                described = "; ".join(f"{step.id}: {step.description}" for step in self.plan if step.id in ids)
+                parts.append(f"{text}: {described}.")
+        if self.complete:
+            parts.append("All steps are complete.")
+        return " ".join(parts)
+
+
+async def execute_plan(plan, run_call, batch_size=100, max_concurrency=4):
+    """
+    Run the plan's calls with `run_call(name, args)`, a coroutine returning
+    (iteration_result, result_str). Returns a PlanReport; report.calls lists
+    (step ids, name, args, result_str) for every call made. At most
+    `max_concurrency` calls run at once (0 or None for no limit), so a wide
+    level stays within the tool server's PAINT_MAX_IN_FLIGHT.
+    """
+    slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def run_limited(name, args):
+        if slots is None:
+            return await run_call(name, args)
+        async with slots:
+            return await run_call(name, args)
+
+    report = PlanReport(plan)
+    status = report.status
+    for level in levels(plan):
+        runnable = []
+        for step in level:
+            needs = [status[dep] for dep in step.after]
+            if any(s in ("failed", "skipped") for s in needs):
+                status[step.id] = "skipped"
+            elif any(s in ("open", "waiting") for s in needs):
+                status[step.id] = "waiting"
+            elif step.call is None:
+                status[step.id] = "open"
+            else:
+                runnable.append(step)
+
+        drawing = [step for step in runnable if as_batch_operation(*step.call) is not None]
+        if len(drawing) < 2:
+            drawing = []
+        # Drawing steps of a level go out as draw_batch calls, before the level's other calls
+        for start in range(0, len(drawing), batch_size):
+            chunk = drawing[start:start + batch_size]
+            args = {"operations": [as_batch_operation(*step.call) for step in chunk]}
+            iteration_result, result_str = await run_call(BATCH_TOOL, args)
+            report.calls.append(([step.id for step in chunk], BATCH_TOOL, args, result_str))
+            per_step = iteration_result if isinstance(iteration_result, list) and len(iteration_result) == len(chunk) \
+                else [result_str] * len(chunk)
+            for step, result in zip(chunk, per_step):
+                status[step.id] = "failed" if result_failed(result) else "done"
+
+        others = [step for step in runnable if step not in drawing]
+        outcomes = await asyncio.gather(*(run_limited(*step.call) for step in others), return_exceptions=True)
+        for step, outcome in zip(others, outcomes):
+            if isinstance(outcome, Exception):
+                result_str = f"Error: {outcome}"
+            else:
+                result_str = outcome[1]
+            report.calls.append(([step.id], step.call[0], step.call[1], result_str))
+            status[step.id] = "failed" if result_failed(result_str) else "done"
+    return report
@@ -1,15 +1,26 @@
 import os
 from dotenv import load_dotenv
 from mcp import ClientSession, StdioServerParameters, types
-from mcp.client.stdio import stdio_client
 import asyncio
 import google.generativeai as genai
 import json
 import re
+import time
+import argparse
 from rich.console import Console
 from rich.panel import Panel
-from concurrent.futures import TimeoutError
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from functools import partial
+from agent_history import ConversationHistory, result_failed
+from auto_verify import AutoVerifier, VerifyPolicy
+from llm_cache import LLMCache, CachedResponse
+from llm_stream import generate_until_action
+from resilient_llm import ResilientGenerator
+from server_pool import ServerPool, connect
+from tool_table import ToolTable, parse_call, unwrap_content
+from tool_journal import ToolJournal
+from step_plan import PlanError, parse_plan, execute_plan
+from tracing import Tracer, new_run_id, set_run_id, reset_run_id
 
 console = Console()
 # Load environment variables from .env file
@@ -20,97 +31,177 @@ api_key = os.getenv("GEMINI_API_KEY")
 genai.configure(api_key=api_key)
 # instantiate exactly one model
 model = genai.GenerativeModel("gemini-2.0-flash-lite")
-
-# Global variables to track iterations and responses
-last_response = None
-iteration = 0
-iteration_response = []
-
-async def generate_with_timeout(model, prompt, timeout=10):
-    """Generate content with a timeout using the new google.generativeai API."""
-    try:
-        loop = asyncio.get_event_loop()
-        response = await asyncio.wait_for(
-            loop.run_in_executor(
-                None,
-                lambda: model.generate_content(prompt)
-            ),
-            timeout=timeout
-        )
-        return response
-    except TimeoutError:
-        print("LLM generation timed out!")
-        raise
-    except Exception as e:
-        print(f"Error in LLM generation: {e}")
-        raise
-
-def reset_state():
-    """Reset all global variables to their initial state"""
-    global last_response, iteration, iteration_response
-    last_response = None
-    iteration = 0
-    iteration_response = []
-
-async def main():
-    reset_state()  # Reset at the start of main
-    print("Starting main execution...")
-    try:
-        # Create a single MCP server connection
-        print("Establishing connection to MCP server...")
-        server_params = StdioServerParameters(
-            command="python",
-            args=["paint_mcp_tools.py"]
-        )
-
-        async with stdio_client(server_params) as (read, write):
-            print("Connection established, creating session...")
-            async with ClientSession(read, write) as session:
-                print("Session created, initializing...")
-                await session.initialize()
-                
-                # Get available tools
-                print("Requesting tool list...")
-                tools_result = await session.list_tools()
-                tools = tools_result.tools
-                print(f"Successfully retrieved {len(tools)} tools")
-
-                # Create system prompt with available tools
-                print("Creating system prompt...")
-                tools_description = []
-                for i, tool in enumerate(tools):
-                    try:
-                        params = tool.inputSchema
-                        desc = getattr(tool, 'description', 'No description available')
-                        name = getattr(tool, 'name', f'tool_{i}')
-                        
-                        # Format the input schema in a more readable way
-                        if 'properties' in params:
-                            param_details = []
-                            for param_name, param_info in params['properties'].items():
-                                param_type = param_info.get('type', 'unknown')
-                                param_details.append(f"{param_name}: {param_type}")
-                            params_str = ', '.join(param_details)
-                        else:
-                            params_str = 'no parameters'
-
-                        tool_desc = f"{i+1}. {name}({params_str}) - {desc}"
-                        tools_description.append(tool_desc)
-                        print(f"Added description for tool: {tool_desc}")
-                    except Exception as e:
-                        print(f"Error processing tool {i}: {e}")
-                        tools_description.append(f"{i+1}. Error processing tool")
-                
-                tools_description = "\n".join(tools_description)
-                print("Successfully created tools description")
-                
-                # Updated system prompt with JSON formatted function calls
-                system_prompt = f"""You are a creative and artistic agent that works step by step to create beautiful art. You can reason about your tasks and work in MS Paint using basic tools. You can verify your work and decide how you would like to proceed.
+# Models to fall back to, in order, when the main one keeps failing (comma-separated names)
+FALLBACK_MODELS = [
+    genai.GenerativeModel(name.strip())
+    for name in os.getenv("LLM_FALLBACK_MODELS", "").split(",")
+    if name.strip()
+]
+
+# Blocking LLM requests run here rather than in the loop's small default executor, so
+# retried and hedged requests are not queued behind stalled ones
+llm_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_THREADS", "32")), thread_name_prefix="llm")
+
+# Response cache keyed by model name and prompt hash; LLM_CACHE_MODE=replay fails on misses
+llm_cache = LLMCache.from_env()
+
+# Latency spans go to PAINT_TRACE_FILE when set; summarize with `python tracing.py <file>`
+tracer = Tracer.from_env("client")
+
+# Stream responses and act on the first complete action line instead of waiting for the whole reply
+STREAM_RESPONSES = os.getenv("LLM_STREAM", "0") == "1"
+
+# Let the model emit several FUNCTION_CALL lines per response (opt-in, see --multi-action)
+MULTI_ACTION = os.getenv("AGENT_MULTI_ACTION", "0") == "1"
+MAX_ACTIONS_PER_TURN = int(os.getenv("AGENT_MAX_ACTIONS", "20"))
+
+# Executed tool calls are appended to AGENT_JOURNAL when set; replay them with tool_journal.py
+journal = ToolJournal.from_env()
+
+# Planner mode: the first show_reasoning plan carries tool calls that the client runs itself
+PLANNER = os.getenv("AGENT_PLANNER", "0") == "1"
+
+# When the client verifies drawing steps itself: off, each, every:N or end (see auto_verify.py)
+VERIFY_POLICY = os.getenv("AGENT_VERIFY", "off")
+
+# Approximate token budget for the iteration history included in each prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+
+DEFAULT_QUERY = """Get creative with shapes! Open paint and draw a rectangle with corner points (272,310) and (559, 657). Then draw an oval inside the rectangle. Then draw some more ovals and arrows to make a face in the rectangle. Finally, add text "baby_AGI" in the canvas."""
+
+class AgentState:
+    """Per-session state of one agent run (previously module globals)"""
+
+    def __init__(self, label=None, llm=None, multi_action=None, verify=None, fallbacks=None, planner=None):
+        self.label = label
+        # The model this session talks to (tests and benchmarks pass a scripted stand-in)
+        self.llm = llm or model
+        # Tried in order after the main model has failed all its retries
+        self.models = [self.llm] + list(FALLBACK_MODELS if fallbacks is None else fallbacks)
+        # Run every action line of a response instead of only the first
+        self.multi_action = MULTI_ACTION if multi_action is None else multi_action
+        # Run the tool calls of a structured show_reasoning plan client-side
+        self.planner = PLANNER if planner is None else planner
+        # Runs verify_task after drawing steps so the model does not have to
+        self.verifier = AutoVerifier(VerifyPolicy.parse(verify or VERIFY_POLICY))
+        # Sent with every tool call so client and server spans of one run can be joined
+        self.run_id = new_run_id()
+        self.last_response = None
+        self.iteration = 0
+        self.history = ConversationHistory(HISTORY_TOKEN_BUDGET)
+        self.final_answer = None
+        self.error = None
+
+    def log(self, message):
+        """Print a message, prefixed with the session label when running several sessions"""
+        if self.label is None:
+            print(message)
+        else:
+            stripped = message.lstrip("\n")
+            print(f"{message[:len(message) - len(stripped)]}[{self.label}] {stripped}")
+
+def server_params():
+    """
+    The URL of a shared tool server when PAINT_SERVER_URL (or --server-url) is
+    set, otherwise parameters for spawning our own server over stdio
+    """
+    if os.getenv("PAINT_SERVER_URL"):
+        return os.getenv("PAINT_SERVER_URL")
+    return StdioServerParameters(
+        command="python",
+        args=["paint_mcp_tools.py", "--backend", os.getenv("PAINT_BACKEND", "paint")],
+        # Pass our environment through so settings such as PAINT_TRACE_FILE reach the server
+        env=dict(os.environ)
+    )
+
+async def generate_with_timeout(model, prompt, timeout=10, stream=None):
+    """
+    Generate content with a timeout using the new google.generativeai API.
+    When streaming, return as soon as the first complete action line arrives.
+    """
+    model_name = getattr(model, "model_name", type(model).__name__)
+    stream = STREAM_RESPONSES if stream is None else stream
+    with tracer.span("llm.generate", model=model_name, prompt_bytes=len(prompt), stream=stream) as span:
+        cached = llm_cache.get(model_name, prompt)
+        span["cached"] = cached is not None
+        if cached is not None:
+            return CachedResponse(cached)
+        try:
+            if stream:
+                response = await generate_until_action(model, prompt, timeout, llm_executor)
+                span["cut_off"] = response.cut_off
+                span["chunks"] = response.chunks
+                llm_cache.put(model_name, prompt, response.text)
+                return response
+            loop = asyncio.get_event_loop()
+            response = await asyncio.wait_for(
+                loop.run_in_executor(
+                    llm_executor,
+                    lambda: model.generate_content(prompt)
+                ),
+                timeout=timeout
+            )
+            llm_cache.put(model_name, prompt, response.text)
+            return response
+        except TimeoutError:
+            print("LLM generation timed out!")
+            raise
+        except Exception as e:
+            print(f"Error in LLM generation: {e}")
+            raise
+
+# Retries, hedging and fallback around generate_with_timeout; shared so every session
+# contributes to the latency estimates (LLM_RETRIES, LLM_TIMEOUT, LLM_HEDGE_PERCENTILE)
+llm_generator = ResilientGenerator.from_env(generate_with_timeout, tracer)
+
+def build_tools_description(tools, verbose=True):
+    """Render the tool list for the system prompt (precomputed per tool by ToolTable)"""
+    table = tools if isinstance(tools, ToolTable) else ToolTable(tools)
+    if verbose:
+        for i, compiled in enumerate(table.compiled):
+            if compiled.error is None:
+                print(f"Added description for tool: {compiled.fragment}")
+            else:
+                print(f"Error processing tool {i}: {compiled.error}")
+    return table.description
+
+SINGLE_ACTION_FORMAT = "When you respond, you MUST produce exactly one line, and that line MUST be in one of these two and only two formats:"
+
+MULTI_ACTION_FORMAT = f"""When you respond, you MAY produce several lines (at most {MAX_ACTIONS_PER_TURN}), one action per line, and every line MUST be in one of these two and only two formats.
+The FUNCTION_CALL lines are run in order and you get all their results back together. If one of them fails (an error or a failed verification), the lines after it are not run.
+A FINAL_ANSWER line ends the run, so it must be the last line."""
+
+MODEL_VERIFY_RULE = "- After completing a step, verify whether your action was successful using the verify_task tool. If it was, proceed to the next step. If not, repeat the same step."
+
+AUTO_VERIFY_RULE = "- Do NOT call verify_task yourself: your drawing steps are verified automatically. A failed check shows up in the history as a verify_task result; then repeat or fix the step before proceeding."
+
+PLAN_RULE = """- On the very first iteration, do NOT emit planning in plain text; to communicate your plan use exactly:
+     FUNCTION_CALL: {"name": "show_reasoning", "args": {"steps": <JSON-encoded-list-of-steps>}}"""
+
+PLANNER_RULE = """- On the very first iteration, do NOT emit planning in plain text; send your plan as structured steps:
+     FUNCTION_CALL: {"name": "show_reasoning", "args": {"steps": [{"id": "s1", "description": "...", "call": {"name": "<tool_name>", "args": {...}}, "after": ["<ids of the steps it needs>"]}, ...]}}
+  Give the call of every step whose tool and arguments you already know; leave out "call" for steps that need your judgment later.
+  The client runs those calls itself (independent steps together) and reports which steps are done, failed or left for you. Then continue only with those."""
+
+def build_system_prompt(tools_description, multi_action=None, verify=None, planner=None):
+    """System prompt with JSON formatted function calls"""
+    multi_action = MULTI_ACTION if multi_action is None else multi_action
+    plan_rule = PLANNER_RULE if (PLANNER if planner is None else planner) else PLAN_RULE
+    auto_verify = VerifyPolicy.parse(verify or VERIFY_POLICY).enabled
+    response_format = MULTI_ACTION_FORMAT if multi_action else SINGLE_ACTION_FORMAT
+    verify_rule = AUTO_VERIFY_RULE if auto_verify else MODEL_VERIFY_RULE
+    if multi_action and auto_verify:
+        batching_rule = "- Plan as many steps per response as you can."
+    elif multi_action:
+        batching_rule = "- Put a drawing step and its verify_task call in the same response, and plan as many steps per response as you can."
+    else:
+        batching_rule = "- When several shapes or texts can be drawn one after another, draw them together with a single draw_batch call."
+    return f"""You are a creative and artistic agent that works step by step to create beautiful art. You can reason about your tasks and work in MS Paint using basic tools. You can verify your work and decide how you would like to proceed.
 
 You have access to these tools:
 {tools_description}
 
-When you respond, you MUST produce exactly one line, and that line MUST be in one of these two and only two formats:
+{response_format}
 
   1) Tool invocation:
      ```
@@ -134,9 +225,9 @@ When you respond, you MUST produce exactly one line, and that line MUST be in on
 or any variant that treats FINAL_ANSWER as a tool.
 
 🧠 Very Important Behavior Rules
-- On the very first iteration, do NOT emit planning in plain text; to communicate your plan use exactly:
-     FUNCTION_CALL: {{"name": "show_reasoning", "args": {{"steps": <JSON-encoded-list-of-steps>}}}}
-- After completing a step, verify whether your action was successful using the verify_task tool. If it was, proceed to the next step. If not, repeat the same step.
+{plan_rule}
+{verify_rule}
+{batching_rule}
 - There should be no step called "Finalize the image" in the initial plan.
 - Do NOT use the show_reasoning tool in two consecutive iterations.
 - Only issue FINAL_ANSWER when you have completed all steps.
@@ -179,149 +270,363 @@ LLM Response: FINAL_ANSWER: Done!
 
   """
 
-                query = """Get creative with shapes! Open paint and draw a rectangle with corner points (272,310) and (559, 657). Then draw an oval inside the rectangle. Then draw some more ovals and arrows to make a face in the rectangle. Finally, add text "baby_AGI" in the canvas."""
-                print("Starting iteration loop...")
-                
-                # Use global iteration variables
-                global iteration, last_response
-                
-                # Adaptive iteration loop; exit on FINAL_ANSWER
-                while True:
-                    print(f"\n--- Iteration {iteration + 1} ---")
-                    if last_response is None:
-                        current_query = query
-                    else:
-                        current_query = current_query + "\n\n" + " ".join(iteration_response)
-                        current_query = current_query + "  What should I do next?"
-
-                    # Get model's response with timeout
-                    prompt = f"{system_prompt}\n\nQuery: {current_query}"
+async def run_agent(session, tools, system_prompt, query, state=None):
+    """Run the iteration loop for one query until FINAL_ANSWER or an error; returns the state"""
+    state = state or AgentState()
+    # Name lookups and argument coercion go through the compiled table
+    tools = tools if isinstance(tools, ToolTable) else ToolTable(tools)
+    log = state.log
+    log("Starting iteration loop...")
+    # Tag every span of this session (including the server's, via _meta) with its run ID
+    run_token = set_run_id(state.run_id)
+    journal.start_run(state.run_id, query)
+    try:
+        await _iterate(session, tools, system_prompt, query, state)
+    finally:
+        reset_run_id(run_token)
+    return state
+
+def extract_actions(response_text, multi_action=False):
+    """
+    The action lines of a response, in order. Only the first one in single-action
+    mode; up to MAX_ACTIONS_PER_TURN, ending at any FINAL_ANSWER, in multi-action mode.
+    A response without action lines is returned as is, to be reported as unexpected.
+    """
+    lines = [line.strip() for line in response_text.split('\n')]
+    actions = [line for line in lines if line.startswith(("FUNCTION_CALL:", "FINAL_ANSWER:"))]
+    if not actions:
+        return [response_text]
+    if not multi_action:
+        return actions[:1]
+    for i, line in enumerate(actions):
+        if line.startswith("FINAL_ANSWER:"):
+            actions = actions[:i + 1]
+            break
+    return actions[:MAX_ACTIONS_PER_TURN]
+
+def parse_function_call(response_text):
+    """Return (name, args) of a FUNCTION_CALL: line"""
+    return parse_call(response_text[len("FUNCTION_CALL:"):])
+
+async def execute_tool(session, tools, func_name, arguments, state):
+    """Coerce the arguments to the tool's schema, call it and return (result, result_str)"""
+    log = state.log
+    compiled = tools.get(func_name)
+    if not compiled:
+        log(f"DEBUG: Available tools: {tools.names}")
+        raise ValueError(f"Unknown tool: {func_name}")
+
+    with tracer.span("coerce", tool=func_name):
+        # Convert each argument's type based on the tool's schema
+        compiled.coerce(arguments)
+
+    started = time.perf_counter()
+    with tracer.span("call_tool", tool=func_name):
+        result = await session.call_tool(func_name, arguments=arguments, meta={"run_id": state.run_id})
+    elapsed = time.perf_counter() - started
+
+    # For "show_reasoning", render the steps using rich panels
+    if func_name == "show_reasoning" and state.label is None:
+        raw = arguments.get("steps", "")
+        try:
+            steps_list = json.loads(raw)
+        except json.JSONDecodeError:
+            steps_list = [
+                s.strip()
+                for s in re.split(r"[;,]", raw)
+                if s.strip()
+            ]
+        for idx, step in enumerate(steps_list, start=1):
+            console.print(
+                Panel(
+                    step,
+                    title=f"Step {idx}",
+                    border_style="cyan",
+                    expand=False,
+                )
+            )
+
+    # Process the result content
+    if hasattr(result, 'content'):
+        if isinstance(result.content, list):
+            iteration_result = unwrap_content([
+                item.text if hasattr(item, 'text')
+                # Images (e.g. get_canvas_snapshot) are summarised rather than pasted into the prompt as base64
+                else f"<{item.mimeType} image, {len(item.data) * 3 // 4} bytes>" if item.type == "image"
+                else str(item)
+                for item in result.content
+            ])
+        else:
+            iteration_result = str(result.content)
+    else:
+        iteration_result = str(result)
+
+    if isinstance(iteration_result, list):
+        result_str = f"[{', '.join(iteration_result)}]"
+    else:
+        result_str = str(iteration_result)
+    journal.record(state.run_id, func_name, arguments, iteration_result, elapsed)
+    return iteration_result, result_str
+
+async def run_verification(session, tools, label, state):
+    """Run the verifier's checks as verify_task calls; returns whether they all passed"""
+    for arguments in state.verifier.checks():
+        with tracer.span("auto_verify", task=arguments["task"]):
+            _, result_str = await execute_tool(session, tools, "verify_task", dict(arguments), state)
+        state.log(f"Automatic verification: {result_str}")
+        state.history.add_call(f"{label} (automatic)", "verify_task", arguments, result_str)
+        state.verifier.observe(arguments, result_str)
+        if result_failed(result_str):
+            return False
+    return True
+
+async def run_plan(session, tools, plan, label, state):
+    """Run the calls of a planner-mode plan client-side; returns whether every step is done"""
+    async def run_call(name, args):
+        iteration_result, result_str = await execute_tool(session, tools, name, dict(args), state)
+        state.verifier.record(name, args, iteration_result)
+        return iteration_result, result_str
+
+    with tracer.span("plan", steps=len(plan)) as span:
+        # Stay within the server's per-session limit, so no call of a wide level has to queue there
+        report = await execute_plan(plan, run_call, max_concurrency=int(os.getenv("PAINT_MAX_IN_FLIGHT", "4")))
+        span["done"] = len(report.ids("done"))
+    for step_ids, name, args, result_str in report.calls:
+        steps = step_ids[0] if len(step_ids) == 1 else f"{step_ids[0]}-{step_ids[-1]}"
+        if "operations" in args:
+            # Keep the history line short; the steps themselves are in the plan
+            args = {"operations": f"<{len(args['operations'])} operations>"}
+        state.history.add_call(f"{label} step {steps}", name, args, result_str)
+    state.history.add_note(label, report.summary(), failed=not report.complete)
+    state.log(report.summary())
+
+    passed = True
+    if state.verifier.due():
+        passed = await run_verification(session, tools, label, state)
+    return report.complete and passed
+
+async def _iterate(session, tools, system_prompt, query, state):
+    log = state.log
+
+    # Adaptive iteration loop; exit on FINAL_ANSWER
+    while True:
+        log(f"\n--- Iteration {state.iteration + 1} ---")
+        if state.last_response is None:
+            current_query = query
+        else:
+            # Each iteration is stored once; older ones are compacted to fit the budget
+            current_query = query + "\n\n" + state.history.render()
+            current_query = current_query + "  What should I do next?"
+
+        # Get model's response with timeout
+        prompt = f"{system_prompt}\n\nQuery: {current_query}"
+        try:
+            # Cutting the stream off at the first action line would drop the rest of a multi-action turn
+            response = await llm_generator.generate(
+                state.models, prompt, log=log, stream=False if state.multi_action else None
+            )
+            response_text = response.text.strip()
+            log(f"LLM Response: {response_text}")
+            actions = extract_actions(response_text, state.multi_action)
+        except Exception as e:
+            log(f"Failed to get LLM response: {e}")
+            state.error = str(e)
+            break
+
+        for index, response_text in enumerate(actions):
+            # Actions of a multi-action turn are numbered 3.1, 3.2, ... in the history
+            label = state.iteration + 1 if len(actions) == 1 else f"{state.iteration + 1}.{index + 1}"
+
+            if response_text.startswith("FUNCTION_CALL:"):
+                try:
+                    with tracer.span("parse"):
+                        func_name, arguments = parse_function_call(response_text)
+                except Exception as e:
+                    log(f"Error parsing JSON function call: {e}")
+                    state.error = f"Error parsing JSON function call: {e}"
+                    break
+
+                plan = None
+                if state.planner and func_name == "show_reasoning":
                     try:
-                        response = await generate_with_timeout(model, prompt)
-                        response_text = response.text.strip()
-                        print(f"LLM Response: {response_text}")
-                        
-                        # Keep only the single relevant line
-                        for line in response_text.split('\n'):
-                            if line.startswith("FUNCTION_CALL:") or line.startswith("FINAL_ANSWER:"):
-                                response_text = line
-                                break
-                    except Exception as e:
-                        print(f"Failed to get LLM response: {e}")
+                        plan = parse_plan(arguments.get("steps", []))
+                    except PlanError as e:
+                        log(f"Invalid plan: {e}")
+                        state.history.add_error(label, f"Invalid plan: {e}")
+                        # Make the next prompt include the history, so the model sees why
+                        state.last_response = []
                         break
-
-                    if response_text.startswith("FUNCTION_CALL:"):
-                        # New parsing: expect a JSON blob after "FUNCTION_CALL:"
-                        json_str = response_text[len("FUNCTION_CALL:"):].strip()
-                        # Remove any wrapping backticks (if the model output included markdown formatting)
-                        json_str = json_str.strip("`")
-                        try:
-                            # First decode attempt
-                            call_obj = json.loads(json_str)
-                            # If the resulting object is a string, it means the JSON was double encoded.
-                            if isinstance(call_obj, str):
-                                call_obj = json.loads(call_obj)
-                            func_name = call_obj["name"]
-                            arguments = call_obj.get("args", {})
-                        except Exception as e:
-                            print(f"Error parsing JSON function call: {e}")
-                            break
-                        
-                        try:
-                            tool = next((t for t in tools if t.name == func_name), None)
-                            if not tool:
-                                print(f"DEBUG: Available tools: {[t.name for t in tools]}")
-                                raise ValueError(f"Unknown tool: {func_name}")
-
-                            # Use the parsed `arguments` instead of reinitializing it to {}
-                            schema_properties = tool.inputSchema.get('properties', {})
-
-                            # Convert each argument's type based on the tool's schema
-                            for param_name, param_info in schema_properties.items():
-                                if param_name in arguments:
-                                    expected_type = param_info.get('type', 'string')
-                                    value = arguments[param_name]
-                                    if expected_type == 'integer':
-                                        arguments[param_name] = int(value)
-                                    elif expected_type == 'number':
-                                        arguments[param_name] = float(value)
-                                    elif expected_type == 'array':
-                                        if isinstance(value, str):
-                                            # Convert a comma-separated string into a list of integers
-                                            arguments[param_name] = [int(x.strip()) for x in value.strip('[]').split(',')]
-                                    else:
-                                        arguments[param_name] = str(value)
-                            
-                            result = await session.call_tool(func_name, arguments=arguments)
-                            
-                            # For "show_reasoning", render the steps using rich panels
-                            if func_name == "show_reasoning":
-                                raw = arguments.get("steps", "")
-                                try:
-                                    steps_list = json.loads(raw)
-                                except json.JSONDecodeError:
-                                    steps_list = [
-                                        s.strip()
-                                        for s in re.split(r"[;,]", raw)
-                                        if s.strip()
-                                    ]
-                                for idx, step in enumerate(steps_list, start=1):
-                                    console.print(
-                                        Panel(
-                                            step,
-                                            title=f"Step {idx}",
-                                            border_style="cyan",
-                                            expand=False,
-                                        )
-                                    )
-
-                            # Process the result content
-                            if hasattr(result, 'content'):
-                                if isinstance(result.content, list):
-                                    iteration_result = [
-                                        item.text if hasattr(item, 'text') else str(item)
-                                        for item in result.content
-                                    ]
-                                else:
-                                    iteration_result = str(result.content)
-                            else:
-                                iteration_result = str(result)
-                            
-                            if isinstance(iteration_result, list):
-                                result_str = f"[{', '.join(iteration_result)}]"
-                            else:
-                                result_str = str(iteration_result)
-                            
-                            iteration_response.append(
-                                f"In iteration {iteration + 1}, you called {func_name} with arguments {arguments}, and the function returned {result_str}."
-                            )
-                            last_response = iteration_result
-
-                        except Exception as e:
-                            import traceback
-                            traceback.print_exc()
-                            iteration_response.append(f"Error in iteration {iteration + 1}: {str(e)}")
-                            break
-
-                    elif response_text.startswith("FINAL_ANSWER:"):
-                        # Agent is done
-                        final_answer = response_text.split("FINAL_ANSWER:", 1)[1].strip()
-                        print("\n=== Agent Execution Complete ===")
+                    # The tool only displays the plan; it gets the step descriptions
+                    arguments = {"steps": json.dumps([step.description for step in plan])}
+
+                try:
+                    iteration_result, result_str = await execute_tool(session, tools, func_name, arguments, state)
+                    state.history.add_call(label, func_name, arguments, result_str)
+                    state.last_response = iteration_result
+                    failed = result_failed(iteration_result)
+
+                    if plan is not None and any(step.call for step in plan):
+                        failed = not await run_plan(session, tools, plan, label, state)
+
+                    # Verify drawing steps client-side when the policy says so
+                    if state.verifier.record(func_name, arguments, iteration_result) and state.verifier.due():
+                        failed = not await run_verification(session, tools, label, state)
+                except Exception as e:
+                    import traceback
+                    traceback.print_exc()
+                    state.history.add_error(label, str(e))
+                    state.error = str(e)
+                    break
+
+                # Stop the turn at the first failed result and let the model react to it
+                skipped = actions[index + 1:]
+                if skipped and failed:
+                    log(f"Skipping {len(skipped)} remaining action(s) after a failed result")
+                    state.history.add_skipped(label, len(skipped))
+                    break
+
+            elif response_text.startswith("FINAL_ANSWER:"):
+                # Check whatever has not been verified yet before accepting the answer
+                if state.verifier.due(final=True):
+                    try:
+                        passed = await run_verification(session, tools, label, state)
+                    except Exception as e:
+                        state.history.add_error(label, str(e))
+                        state.error = str(e)
                         break
-                    else:
-                        print("Unexpected model response—terminating loop.")
+                    if not passed:
+                        log("Final verification failed—returning to the model.")
                         break
 
-                    iteration += 1
+                # Agent is done
+                state.final_answer = response_text.split("FINAL_ANSWER:", 1)[1].strip()
+                log("\n=== Agent Execution Complete ===")
+                break
+            else:
+                log("Unexpected model response—terminating loop.")
+                state.error = "Unexpected model response"
+                break
+
+        if state.error is not None or state.final_answer is not None:
+            break
+        state.iteration += 1
+
+async def main(query=DEFAULT_QUERY):
+    print("Starting main execution...")
+    try:
+        # Create a single MCP server connection
+        print("Establishing connection to MCP server...")
+        async with connect(server_params()) as (read, write):
+            print("Connection established, creating session...")
+            async with ClientSession(read, write) as session:
+                print("Session created, initializing...")
+                await session.initialize()
+                
+                # Get available tools
+                print("Requesting tool list...")
+                tools_result = await session.list_tools()
+                tools = ToolTable(tools_result.tools)
+                print(f"Successfully retrieved {len(tools)} tools")
+
+                # Create system prompt with available tools
+                print("Creating system prompt...")
+                tools_description = build_tools_description(tools)
+                print("Successfully created tools description")
+                system_prompt = build_system_prompt(tools_description)
+
+                await run_agent(session, tools, system_prompt, query)
 
     except Exception as e:
         print(f"Error in main execution: {e}")
         import traceback
         traceback.print_exc()
-    finally:
-        reset_state()  # Reset at the end of main
+
+def load_queries(path):
+    """One query per non-empty line"""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+async def run_queries(queries, concurrency, pool_size=None, output=None):
+    """
+    Run many queries as concurrent agent sessions. Each session gets its own
+    AgentState and borrows a warm tool server from a shared pool.
+    """
+    pool_size = pool_size or concurrency
+    server = server_params()
+    if isinstance(server, str):
+        print(f"Opening {pool_size} sessions on {server} for {len(queries)} queries...")
+    else:
+        print(f"Starting {pool_size} tool servers for {len(queries)} queries...")
+    started = time.perf_counter()
+    results = [None] * len(queries)
+    limit = asyncio.Semaphore(concurrency)
+
+    async with ServerPool(server, pool_size) as pool:
+        print(f"Tool servers ready in {time.perf_counter() - started:.2f}s")
+
+        async def run_one(index, query):
+            async with limit, pool.acquire() as worker:
+                # The tool list is the same for every run on a worker; compile it and render the prompt once
+                if "system_prompt" not in worker.cache:
+                    worker.cache["tool_table"] = ToolTable(worker.tools)
+                    worker.cache["system_prompt"] = build_system_prompt(
+                        build_tools_description(worker.cache["tool_table"], verbose=False)
+                    )
+                state = AgentState(label=f"q{index + 1}")
+                run_started = time.perf_counter()
+                try:
+                    await run_agent(worker.session, worker.cache["tool_table"], worker.cache["system_prompt"], query, state)
+                except Exception as e:
+                    state.error = str(e)
+                results[index] = {
+                    "query": query,
+                    "final_answer": state.final_answer,
+                    "error": state.error,
+                    "iterations": state.iteration + 1,
+                    "seconds": round(time.perf_counter() - run_started, 3),
+                    "server": worker.index,
+                }
+
+        await asyncio.gather(*(run_one(i, q) for i, q in enumerate(queries)))
+
+    elapsed = time.perf_counter() - started
+    done = sum(1 for r in results if r["final_answer"] is not None)
+    print(f"\n=== {done}/{len(queries)} queries completed in {elapsed:.2f}s ===")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        print(f"Results written to {output}")
+    return results
 
 if __name__ == "__main__":
-    asyncio.run(main())
-    
-    
+    parser = argparse.ArgumentParser(description="Drive the MS Paint MCP tools with an LLM agent")
+    parser.add_argument("--queries", help="file with one query per line, run as concurrent sessions")
+    parser.add_argument("--concurrency", type=int, default=4, help="number of agent sessions run at once")
+    parser.add_argument("--pool-size", type=int, help="number of tool server processes, or of sessions on --server-url (default: --concurrency)")
+    parser.add_argument("--output", help="write one JSON result per query to this file")
+    parser.add_argument("--multi-action", action="store_true",
+                        help="let the model emit several FUNCTION_CALL lines per response (same as AGENT_MULTI_ACTION=1)")
+    parser.add_argument("--verify", help="verify drawing steps client-side: off, each, every:N or end (same as AGENT_VERIFY)")
+    parser.add_argument("--planner", action="store_true",
+                        help="let the first show_reasoning plan carry tool calls the client runs itself (same as AGENT_PLANNER=1)")
+    parser.add_argument("--journal", help="append every executed tool call to this file (same as AGENT_JOURNAL)")
+    parser.add_argument("--server-url",
+                        help="connect to a running HTTP/SSE tool server instead of spawning one (same as PAINT_SERVER_URL)")
+    cli = parser.parse_args()
+    if cli.server_url:
+        os.environ["PAINT_SERVER_URL"] = cli.server_url
+    if cli.journal:
+        journal = ToolJournal(cli.journal)
+    if cli.multi_action:
+        MULTI_ACTION = True
+    if cli.planner:
+        PLANNER = True
+    if cli.verify:
+        VerifyPolicy.parse(cli.verify)
+        VERIFY_POLICY = cli.verify
+
+    if cli.queries:
+        asyncio.run(run_queries(load_queries(cli.queries), cli.concurrency, cli.pool_size, cli.output))
+    else:
+        asyncio.run(main())
@@ -0,0 +1,38 @@
+from agent_history import ConversationHistory, estimate_tokens
+
+
+def batch_call(history, iteration, count=100):
+    operations = [{"type": "rectangle", "x1": i, "y1": i, "x2": i + 40, "y2": i + 40} for i in range(count)]
+    results = ", ".join(f"{i}. Rectangle drawn from ({i},{i}) to ({i + 40},{i + 40}) as #{i}" for i in range(count))
+    history.add_call(iteration, "draw_batch", {"operations": operations}, f"[{results}]")
+
+
+def test_large_recent_results_stay_within_the_budget():
+    history = ConversationHistory(token_budget=1500)
+    for iteration in range(1, 4):
+        batch_call(history, iteration)
+    text = history.render()
+    assert estimate_tokens(text) <= 1500
+    # The calls are still there, as one-line summaries
+    assert "#3 draw_batch(" in text
+
+
+def test_long_sessions_stay_within_the_budget():
+    history = ConversationHistory(token_budget=400)
+    for iteration in range(1, 300):
+        if iteration % 7 == 0:
+            batch_call(history, iteration, count=20)
+        else:
+            history.add_call(iteration, f"draw_shape_{iteration % 13}", {"x1": 1, "y1": 2}, "[Drawn as #1]")
+        text = history.render()
+        assert estimate_tokens(text) <= 400
+    assert "summarised" in text
+
+
+def test_small_recent_calls_are_rendered_in_full():
+    history = ConversationHistory()
+    history.add_call(1, "open_paint", {}, "[Paint opened]")
+    history.add_call(2, "draw_rectangle", {"x1": 1, "y1": 2, "x2": 3, "y2": 4}, "[Rectangle drawn as #1]")
+    text = history.render()
+    assert "In iteration 1, you called open_paint" in text
+    assert "In iteration 2, you called draw_rectangle" in text
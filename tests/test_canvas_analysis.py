@@ -0,0 +1,60 @@
+import numpy as np
+
+from canvas_analysis import CanvasAnalyzer
+from headless_backend import HeadlessBackend
+
+
+def summarize(analyzer):
+    shapes, texts = analyzer.summary()
+    return sorted(map(tuple, shapes.tolist())), sorted(map(tuple, texts.tolist()))
+
+
+def test_incremental_updates_match_a_full_analysis():
+    backend = HeadlessBackend(size=(800, 600))
+    backend.open()
+    incremental = CanvasAnalyzer()
+    rng = np.random.default_rng(3)
+    steps = []
+    for i in range(30):
+        x, y = rng.integers(0, 700, 2)
+        w, h = rng.integers(30, 150, 2)
+        steps.append(("oval" if i % 3 else "rectangle", int(x), int(y), int(x + w), int(y + h)))
+    steps += [("text", "Hello", 40, 500), ("text", "World", 300, 520)]
+
+    for step in steps:
+        if step[0] == "text":
+            backend.add_text(step[1], step[2], step[3])
+        else:
+            backend.draw_shape(*step)
+        frame = backend.capture()
+        incremental.update(frame)
+        full = CanvasAnalyzer()
+        full.update(frame)
+        assert summarize(incremental) == summarize(full)
+        assert sorted(map(tuple, incremental.boxes.tolist())) == sorted(map(tuple, full.boxes.tolist()))
+
+
+def test_counts_separate_shapes_and_text():
+    backend = HeadlessBackend(size=(800, 600))
+    backend.open()
+    backend.draw_shape("rectangle", 50, 50, 200, 150)
+    backend.draw_shape("oval", 300, 50, 450, 200)
+    backend.add_text("Hello", 50, 400)
+    analyzer = CanvasAnalyzer()
+    analyzer.update(backend.capture())
+    shapes, texts = analyzer.summary()
+    assert len(shapes) == 2 and len(texts) == 1
+
+
+def test_known_boxes_override_the_glyph_size_rule():
+    backend = HeadlessBackend(size=(800, 600))
+    backend.open()
+    backend.draw_shape("oval", 100, 100, 120, 120)
+    box = backend.add_text("Big", 300, 300, size=60)
+    analyzer = CanvasAnalyzer()
+    analyzer.update(backend.capture())
+    # By size alone the small oval reads as a glyph and the large letters as shapes
+    shapes, texts = analyzer.summary()
+    assert [100, 100, 121, 121] in texts.tolist() and len(shapes) > 1
+    shapes, texts = analyzer.summary(text_boxes=[box], shape_boxes=[(100, 100, 120, 120)])
+    assert len(shapes) == 1 and len(texts) == 1
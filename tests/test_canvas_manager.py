@@ -0,0 +1,25 @@
+import os
+
+from canvas_manager import CanvasManager
+from headless_backend import HeadlessBackend
+
+
+def test_servers_sharing_a_spill_dir_keep_their_own_canvases(tmp_path):
+    managers = [CanvasManager(HeadlessBackend, max_canvases=1, spill_dir=str(tmp_path)) for _ in range(2)]
+    for number, manager in enumerate(managers):
+        canvas = manager.get("s1")
+        canvas.open()
+        canvas.draw_shape("rectangle", 10, 10, 100 + number * 100, 100)
+        # Opening a second canvas spills the first
+        manager.get("s2").open()
+        assert canvas.spill_path is not None
+    first, second = (manager.get("s1") for manager in managers)
+    assert first.spill_path != second.spill_path
+
+    assert (first.capture() != second.capture()).any()
+    spill_dir = managers[0].spill_dir
+    managers[0].close()
+    assert not os.path.exists(spill_dir)
+    assert os.path.isdir(managers[1].spill_dir)
+    managers[1].close()
+    assert os.listdir(tmp_path) == []
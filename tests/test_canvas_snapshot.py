@@ -0,0 +1,45 @@
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+from canvas_snapshot import SnapshotCache
+
+
+def test_invalidate_does_not_wait_for_an_encode(monkeypatch):
+    cache = SnapshotCache()
+    frame = np.full((20, 30, 3), 255, dtype=np.uint8)
+    saving, release = threading.Event(), threading.Event()
+    save = Image.Image.save
+
+    def slow_save(self, *args, **kwargs):
+        saving.set()
+        release.wait(5)
+        return save(self, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, "save", slow_save)
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(data=cache.encode(0, frame, 1, "png")))
+    worker.start()
+    assert saving.wait(5)
+
+    done = threading.Event()
+    threading.Thread(target=lambda: (cache.invalidate(), done.set())).start()
+    try:
+        assert done.wait(1), "invalidate() blocked behind the encode"
+    finally:
+        release.set()
+        worker.join(5)
+
+    # The stale encoding is returned to its caller but not cached
+    assert result["data"].startswith(b"\x89PNG")
+    assert cache.get(0, 1, "png") is None
+
+
+def test_encode_caches_the_current_version():
+    cache = SnapshotCache()
+    frame = np.zeros((20, 30, 3), dtype=np.uint8)
+    data = cache.encode(cache.version, frame, 0.5, "png")
+    assert cache.get(cache.version, 0.5, "png") == data
+    assert Image.open(io.BytesIO(data)).size == (15, 10)
@@ -0,0 +1,20 @@
+import pytest
+
+from glyph_cache import GlyphAtlas
+from headless_backend import HeadlessBackend
+
+
+def test_family_names_resolve_to_font_files():
+    atlas = GlyphAtlas()
+    assert atlas.font("Arial", 20) is not None
+    with pytest.raises(ValueError, match="Font not found"):
+        atlas.font("No Such Font", 20)
+
+
+def test_unknown_font_does_not_stick():
+    backend = HeadlessBackend(size=(400, 200))
+    backend.open()
+    with pytest.raises(ValueError):
+        backend.add_text("Hi", 10, 10, font="No Such Font")
+    assert backend.add_text("", 10, 10) == (10, 10, 10, 10)
+    assert backend.add_text("Hi", 10, 10)[2] > 10
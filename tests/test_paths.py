@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from paths import _douglas_peucker, path_points, simplify_path
+
+
+def test_straight_run_collapses_to_its_endpoints():
+    points = np.array([[x, 0.0] for x in range(100)])
+    assert _douglas_peucker(points, 1.0).tolist() == [True] + [False] * 98 + [True]
+
+
+def test_keeps_corners_beyond_tolerance():
+    points = path_points([[0, 0], [50, 1], [100, 0], [100, 100]])
+    assert simplify_path(points, tolerance=2).tolist() == [[0, 0], [100, 0], [100, 100]]
+
+
+def test_backtracking_keeps_the_turning_point():
+    # The turning point lies on the chord's line, but beyond its end
+    assert simplify_path(path_points([[0, 0], [100, 0], [50, 0]])).tolist() == [[0, 0], [100, 0], [50, 0]]
+    assert simplify_path(path_points([[0, 0], [100, 0], [200, 0], [-50, 0]])).tolist() == [[0, 0], [200, 0], [-50, 0]]
+
+
+def test_closed_path_keeps_its_far_corners():
+    square = [[0, 0], [100, 0], [100, 100], [0, 100]]
+    points = path_points(square, closed=True)
+    assert points.tolist()[-1] == [0, 0]
+    assert simplify_path(points).tolist() == square + [[0, 0]]
+
+
+def test_closed_out_and_back_path():
+    # Start and end coincide, so every point is measured against the start point
+    points = path_points([[0, 0], [40, 0], [80, 0]], closed=True)
+    assert simplify_path(points).tolist() == [[0, 0], [80, 0], [0, 0]]
+
+
+def test_tolerance_rises_until_the_path_fits():
+    angles = np.linspace(0, 20 * np.pi, 5000)
+    spiral = np.column_stack([500 + angles * 10 * np.cos(angles), 500 + angles * 10 * np.sin(angles)])
+    assert len(simplify_path(spiral, tolerance=0, max_points=100)) <= 100
+
+
+def test_flat_lists_and_json():
+    assert path_points("[0, 0, 10, 10]").tolist() == [[0, 0], [10, 10]]
+    with pytest.raises(ValueError):
+        path_points([[1, 2]])
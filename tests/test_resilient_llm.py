@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from fake_llm import FlakyModel, ScriptedModel
+from llm_cache import CachedResponse
+from resilient_llm import ResilientGenerator
+
+
+async def attempt(model, prompt, timeout):
+    return await asyncio.wait_for(asyncio.to_thread(model.generate_content, prompt), timeout)
+
+
+def generator(**options):
+    options = {"backoff": 0.001, "max_backoff": 0.001, **options}
+    return ResilientGenerator(attempt, **options)
+
+
+def quiet(message):
+    pass
+
+
+def test_retries_a_failing_model():
+    model = FlakyModel(ScriptedModel(["FINAL_ANSWER: 1"]), error_rate=0.5, seed=1)
+    resilient = generator(retries=10)
+    response = asyncio.run(resilient.generate([model], "prompt", log=quiet))
+    assert response.text == "FINAL_ANSWER: 1"
+    assert resilient.retried == model.errors > 0
+
+
+def test_falls_back_once_a_model_fails_every_retry():
+    broken = FlakyModel(ScriptedModel([]), error_rate=1.0, model_name="broken")
+    backup = ScriptedModel(["FINAL_ANSWER: backup"], model_name="backup")
+    resilient = generator(retries=2)
+    response = asyncio.run(resilient.generate([broken, backup], "prompt", log=quiet))
+    assert response.text == "FINAL_ANSWER: backup"
+    assert broken.errors == 3 and resilient.fallbacks == 1
+
+
+def test_raises_the_last_error_when_every_model_fails():
+    broken = FlakyModel(ScriptedModel([]), error_rate=1.0)
+    with pytest.raises(RuntimeError, match="Injected"):
+        asyncio.run(generator(retries=1).generate([broken], "prompt", log=quiet))
+
+
+def test_deadline_and_hedge_follow_the_measured_latencies():
+    resilient = generator(timeout=10.0, min_timeout=0.05, hedge_percentile=50, min_samples=5)
+    assert resilient.deadline("slow") == 10.0 and resilient.hedge_delay("slow") is None
+    for seconds in (0.1, 0.1, 0.2, 0.2, 0.3):
+        resilient.tracker("slow").add(seconds)
+    assert resilient.deadline("slow") == pytest.approx(0.9)
+    assert resilient.hedge_delay("slow") == 0.2
+
+
+def test_hedges_a_stalled_request():
+    # The first request stalls; the duplicate sent after the p50 latency answers first
+    model = FlakyModel(ScriptedModel(["FINAL_ANSWER: fast"]), slow_rate=1.0, slow_delay=1.0)
+    resilient = generator(timeout=5.0, min_timeout=2.0, hedge_percentile=50, min_samples=1)
+    resilient.tracker(model.model_name).add(0.01)
+
+    async def scenario():
+        task = asyncio.ensure_future(resilient.generate([model], "prompt", log=quiet))
+        await asyncio.sleep(0.05)
+        model.slow_rate = 0.0
+        return await task
+
+    assert asyncio.run(scenario()).text == "FINAL_ANSWER: fast"
+    assert resilient.hedges == 1
+
+
+def test_timed_out_attempts_count_at_their_deadline():
+    model = FlakyModel(ScriptedModel([]), slow_rate=1.0, slow_delay=0.3)
+    resilient = generator(retries=0, timeout=0.05)
+    with pytest.raises((TimeoutError, asyncio.TimeoutError)):
+        asyncio.run(resilient.generate([model], "prompt", log=quiet))
+    assert list(resilient.tracker(model.model_name).samples) == [0.05]
+
+
+def test_cache_hits_are_not_model_latencies():
+    async def cached(model, prompt, timeout):
+        return CachedResponse("FINAL_ANSWER: cached")
+
+    resilient = ResilientGenerator(cached, min_samples=1, hedge_percentile=50)
+    for _ in range(30):
+        asyncio.run(resilient.generate([ScriptedModel([])], "prompt", log=quiet))
+    assert len(resilient.tracker("scripted")) == 0
+    assert resilient.deadline("scripted") == resilient.timeout
+    assert resilient.hedge_delay("scripted") is None
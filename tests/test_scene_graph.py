@@ -0,0 +1,81 @@
+import random
+import time
+
+import pytest
+
+from scene_graph import SceneGraph, box_distance, contains, intersects
+
+
+def random_scene(count=500, seed=1):
+    rng = random.Random(seed)
+    scene = SceneGraph()
+    for _ in range(count):
+        x, y = rng.randint(0, 2000), rng.randint(0, 2000)
+        scene.add("rectangle", (x, y, x + rng.randint(1, 150), y + rng.randint(1, 150)))
+    return scene, rng
+
+
+def test_add_numbers_primitives_in_drawing_order():
+    scene = SceneGraph()
+    assert scene.add("rectangle", (300, 200, 100, 50)) == 1
+    assert scene.add("text", (10, 10, 60, 30), "Hi") == 2
+    first, second = scene.all()
+    assert first.bbox == (100, 50, 300, 200)
+    assert second.text == "Hi" and second.z > first.z
+
+
+def test_queries_match_brute_force():
+    scene, rng = random_scene()
+    everything = scene.all()
+    for _ in range(50):
+        x, y = rng.randint(-100, 2100), rng.randint(-100, 2100)
+        box = (x, y, x + rng.randint(0, 400), y + rng.randint(0, 400))
+        assert scene.region(box) == [p for p in everything if intersects(box, p.bbox)]
+        assert scene.region(box, inside=True) == [p for p in everything if contains(box, p.bbox)]
+
+        expected = sorted(box_distance((x, y, x, y), p.bbox) for p in everything)[:5]
+        assert [distance for distance, _ in scene.nearest(x, y, limit=5)] == expected
+
+    id = rng.randint(1, len(scene))
+    bbox = scene.get(id).bbox
+    assert scene.overlapping(id) == [p for p in everything if p.id != id and intersects(bbox, p.bbox)]
+    assert scene.inside(id) == [p for p in everything if p.id != id and contains(bbox, p.bbox)]
+
+
+def test_relation():
+    scene = SceneGraph()
+    outer = scene.add("rectangle", (0, 0, 200, 200))
+    inner = scene.add("oval", (50, 50, 100, 100))
+    apart = scene.add("rectangle", (300, 0, 400, 100))
+    assert scene.relation(inner, outer) == f"#{inner} is inside #{outer}"
+    assert scene.relation(outer, apart) == f"#{outer} and #{apart} are apart, 100 px between them"
+    with pytest.raises(KeyError):
+        scene.relation(outer, 99)
+
+
+def test_huge_boxes_and_far_points_stay_fast():
+    scene, _ = random_scene()
+    start = time.perf_counter()
+    huge = scene.add("rectangle", (0, 0, 100000, 100000))
+    far = scene.add("rectangle", (10**6, 10**6, 10**6 + 10, 10**6 + 10))
+    assert scene.nearest(10**7, 10**7)[0][1].id == far
+    assert huge in [p.id for p in scene.region((50000, 50000, 50001, 50001))]
+    assert len(scene.region((-10**6, -10**6, 10**7, 10**7))) == len(scene)
+    assert [p.id for _, p in scene.nearest(50000, 50000, limit=1)] == [huge]
+    assert time.perf_counter() - start < 0.5
+
+
+def test_query_canvas_names_missing_arguments(monkeypatch):
+    import paint_mcp_tools
+    monkeypatch.setattr(paint_mcp_tools, "backend_name", "headless")
+    result = paint_mcp_tools.query_canvas("region", x1=0, y1=0)
+    assert result["content"][0].text == "Error querying canvas: query 'region' needs x2, y2"
+
+
+@pytest.mark.parametrize("query", ["list", "nearest"])
+@pytest.mark.parametrize("limit", [0, -1])
+def test_query_canvas_rejects_limits_below_one(monkeypatch, query, limit):
+    import paint_mcp_tools
+    monkeypatch.setattr(paint_mcp_tools, "backend_name", "headless")
+    result = paint_mcp_tools.query_canvas(query, x1=0, y1=0, limit=limit)
+    assert result["content"][0].text == f"Error querying canvas: limit must be at least 1, got {limit}"
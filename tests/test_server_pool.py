@@ -0,0 +1,48 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from mcp import StdioServerParameters
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED, ErrorData
+
+import server_pool
+from server_pool import ServerPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def headless_server():
+    return StdioServerParameters(
+        command=sys.executable,
+        args=[os.path.join(ROOT, "paint_mcp_tools.py"), "--backend", "headless"],
+        cwd=ROOT,
+        env=dict(os.environ),
+    )
+
+
+def test_stopped_server_is_dropped_and_respawned(monkeypatch):
+    monkeypatch.setattr(server_pool, "RESTART_DELAY", 0)
+
+    async def run():
+        async with ServerPool(headless_server(), 1) as pool:
+            with pytest.raises(McpError):
+                async with pool.acquire() as worker:
+                    raise McpError(ErrorData(code=CONNECTION_CLOSED, message="Connection closed"))
+            assert not worker.alive
+
+            async with pool.acquire() as fresh:
+                assert fresh is not worker and fresh.alive
+                assert fresh.index == worker.index
+                result = await fresh.session.call_tool("open_paint", {})
+                assert not result.isError
+
+            # Ordinary tool errors keep the worker in the pool
+            with pytest.raises(ValueError):
+                async with pool.acquire() as same:
+                    raise ValueError("bad arguments")
+            async with pool.acquire() as again:
+                assert again is same is fresh
+
+    asyncio.run(asyncio.wait_for(run(), 60))
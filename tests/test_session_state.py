@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from session_state import SessionBusy, SessionState
+
+
+def test_requests_over_the_limit_wait_for_a_slot():
+    state = SessionState("s1", max_in_flight=2)
+    running, peak = 0, 0
+
+    async def request():
+        nonlocal running, peak
+        async with state:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def scenario():
+        await asyncio.gather(*(request() for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+    assert state.calls == 6 and state.rejected == 0 and state.in_flight == 0
+
+
+def test_request_fails_when_no_slot_frees_up_in_time():
+    state = SessionState("s1", max_in_flight=1, wait_timeout=0.01)
+
+    async def scenario():
+        async with state:
+            with pytest.raises(SessionBusy):
+                async with state:
+                    pass
+
+    asyncio.run(scenario())
+    assert state.rejected == 1 and state.waiting == 0
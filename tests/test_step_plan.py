@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from step_plan import PlanError, execute_plan, levels, parse_plan
+from tool_table import BATCH_TOOL
+
+
+def rectangle(id, after=(), x=0):
+    return {"id": id, "call": {"name": "draw_rectangle", "args": {"x1": x, "y1": 0, "x2": x + 10, "y2": 10}},
+            "after": list(after)}
+
+
+def recorder(fail=()):
+    """run_call that logs the calls and fails draw_batch operations and calls whose x1 is in `fail`"""
+    calls = []
+
+    async def run_call(name, args):
+        calls.append((name, args))
+        if name == BATCH_TOOL:
+            results = [f"{i}. Error in rectangle operation" if op.get("x1") in fail else f"{i}. Rectangle drawn"
+                       for i, op in enumerate(args["operations"], start=1)]
+            return results, f"[{', '.join(results)}]"
+        result = "Error drawing" if args.get("x1") in fail else "Done"
+        return [result], f"[{result}]"
+    return calls, run_call
+
+
+def test_levels_follow_dependencies():
+    plan = parse_plan([rectangle("c", after=["b"]), rectangle("a"), rectangle("b", after=["a"])])
+    assert [[step.id for step in level] for level in levels(plan)] == [["a"], ["b"], ["c"]]
+    with pytest.raises(PlanError):
+        levels(parse_plan([rectangle("a", after=["b"]), rectangle("b", after=["a"])]))
+
+
+def test_drawing_steps_of_a_level_go_out_as_one_batch_before_other_calls():
+    plan = parse_plan([
+        rectangle("r1"), rectangle("r2", x=20),
+        {"id": "v", "call": {"name": "verify_task", "args": {"task": "shape"}}},
+        rectangle("r3", after=["r1", "r2"], x=40),
+    ])
+    calls, run_call = recorder()
+    report = asyncio.run(execute_plan(plan, run_call))
+    assert [name for name, _ in calls] == [BATCH_TOOL, "verify_task", "draw_rectangle"]
+    assert [op["x1"] for op in calls[0][1]["operations"]] == [0, 20]
+    assert report.complete
+
+
+def test_failed_batch_item_fails_only_its_step_and_its_dependents():
+    plan = parse_plan([
+        rectangle("r1"), rectangle("r2", x=20),
+        rectangle("after_r1", after=["r1"], x=40), rectangle("after_r2", after=["r2"], x=60),
+        {"id": "ask", "description": "Pick a colour"},
+        rectangle("after_ask", after=["ask"], x=80),
+    ])
+    calls, run_call = recorder(fail={20})
+    report = asyncio.run(execute_plan(plan, run_call))
+    assert report.status == {"r1": "done", "r2": "failed", "after_r1": "done", "after_r2": "skipped",
+                             "ask": "open", "after_ask": "waiting"}
+    assert not report.complete
+
+
+def test_level_calls_stay_within_the_concurrency_limit():
+    plan = parse_plan([{"id": f"q{i}", "call": {"name": "verify_task", "args": {"task": "shape"}}}
+                       for i in range(6)])
+    running, peak = 0, 0
+
+    async def run_call(name, args):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return None, "Verification successful"
+
+    report = asyncio.run(execute_plan(plan, run_call, max_concurrency=4))
+    assert peak == 4
+    assert report.ids("done") == [f"q{i}" for i in range(6)]
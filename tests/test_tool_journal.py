@@ -0,0 +1,67 @@
+import json
+
+from agent_history import result_failed
+from tool_journal import ToolJournal, load_runs, replay_plan
+from tool_table import unwrap_content
+
+RECT = {"type": "rectangle", "x1": 10, "y1": 10, "x2": 50, "y2": 50}
+BOGUS = {"type": "hexagon", "x1": 0, "y1": 0, "x2": 5, "y2": 5}
+TEXT = {"type": "text", "text": "error bars"}
+
+
+def journal_of(tmp_path, calls):
+    path = tmp_path / "journal.jsonl"
+    journal = ToolJournal(str(path))
+    journal.start_run("r1", "draw")
+    for name, args, result in calls:
+        journal.record("r1", name, args, result, 0.001)
+    return load_runs(str(path))["r1"]["calls"]
+
+
+def test_result_failed_matches_only_reported_failures():
+    assert result_failed("Error drawing rectangle: boom")
+    assert result_failed("Verification failed: Canvas shows 1 shape(s), expected 2.")
+    assert result_failed(["1. Rectangle drawn as #1", "2. Error in hexagon operation: unknown"])
+    assert not result_failed("Text:'error bars' added successfully as #3")
+    assert not result_failed(["1. Text:'failed attempts' added successfully as #1"])
+
+
+def test_unwrap_content_splits_fastmcp_json():
+    wrapped = json.dumps({"content": [{"type": "text", "text": "1. ok"}, {"type": "text", "text": "2. Error"}]})
+    assert unwrap_content([wrapped]) == ["1. ok", "2. Error"]
+    assert unwrap_content(["{not json"]) == ["{not json"]
+    assert unwrap_content(["a", "b"]) == ["a", "b"]
+
+
+def test_batch_records_failed_operations(tmp_path):
+    results = ["1. Rectangle drawn as #1", "2. Error in hexagon operation: unknown", "3. Text:'error bars' added as #2"]
+    (call,) = journal_of(tmp_path, [("draw_batch", {"operations": [RECT, BOGUS, TEXT]}, results)])
+    assert call["failed"] and call["failed_operations"] == [1]
+
+
+def test_replay_keeps_the_successful_operations_of_a_batch(tmp_path):
+    calls = journal_of(tmp_path, [
+        ("open_paint", {}, ["Paint opened successfully on secondary monitor and maximized"]),
+        ("draw_batch", {"operations": [RECT, BOGUS, TEXT]},
+         ["1. Rectangle drawn as #1", "2. Error in hexagon operation: unknown", "3. Text:'error bars' added as #2"]),
+        ("draw_oval", {"x1": 1, "y1": 1, "x2": 9, "y2": 9}, ["Error drawing oval: boom"]),
+        ("add_text_in_paint", {"text": "error bars"}, ["Text:'error bars' added successfully as #3"]),
+        ("verify_task", {"task": "shape", "expected_count": 1}, ["Verification successful"]),
+        ("query_canvas", {"query": "list"}, ["2 primitive(s)"]),
+    ])
+    assert replay_plan(calls) == [
+        ("open_paint", {}),
+        ("draw_batch", {"operations": [RECT, TEXT]}),
+        ("add_text_in_paint", {"text": "error bars"}),
+        ("verify_task", {"task": "shape", "expected_count": 1}),
+    ]
+    assert replay_plan(calls, batch=True, verify=False) == [
+        ("open_paint", {}),
+        ("draw_batch", {"operations": [RECT, TEXT, {"type": "text", "text": "error bars"}]}),
+    ]
+
+
+def test_replay_drops_a_batch_that_failed_as_a_whole(tmp_path):
+    calls = journal_of(tmp_path, [("draw_batch", {"operations": [RECT]}, ["Error drawing batch: Paint is gone"])])
+    assert calls[0]["failed_operations"] == [0]
+    assert replay_plan(calls) == []
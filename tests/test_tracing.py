@@ -0,0 +1,9 @@
+from tracing import percentile
+
+
+def test_nearest_rank_percentile():
+    values = [5, 1, 4, 2, 3, 6, 7, 8, 9, 10]
+    assert percentile(values, 50) == 5
+    assert percentile(values, 95) == 10
+    assert percentile(values, 0) == 1
+    assert percentile([0.2], 99) == 0.2
@@ -0,0 +1,62 @@
+import asyncio
+
+from mcp.shared.memory import create_connected_server_and_client_session
+
+import paint_mcp_tools
+
+
+def call(session, name, **arguments):
+    async def run():
+        result = await session.call_tool(name, arguments)
+        return result.content[0].text
+    return run()
+
+
+def test_verify_counts_sized_text_as_text(monkeypatch):
+    monkeypatch.setattr(paint_mcp_tools, "backend_name", "headless")
+
+    async def scenario():
+        async with create_connected_server_and_client_session(paint_mcp_tools.mcp._mcp_server) as session:
+            await call(session, "open_paint")
+            await call(session, "draw_rectangle", x1=100, y1=100, x2=300, y2=250)
+            await call(session, "add_text_in_paint", text="Hello World", x=400, y=400, size=40)
+            shapes = await call(session, "verify_task", task="shape", expected_count=1)
+            text = await call(session, "verify_task", task="text", expected_count=1)
+            return shapes, text
+
+    shapes, text = asyncio.run(scenario())
+    assert "Verification successful" in shapes, shapes
+    assert "Verification successful" in text, text
+
+
+def test_headless_text_keeps_the_last_size():
+    from headless_backend import HeadlessBackend
+    backend = HeadlessBackend(size=(400, 200))
+    backend.open()
+    default = backend.add_text("Hi", 10, 10)
+    large = backend.add_text("Hi", 10, 60, size=40)
+    again = backend.add_text("Hi", 10, 120)
+    height = lambda box: box[3] - box[1]
+    assert height(large) > 2 * height(default)
+    assert height(again) == height(large)
+    backend.open()
+    assert height(backend.add_text("Hi", 10, 10)) == height(default)
+
+
+def test_verify_counts_small_shapes_as_shapes(monkeypatch):
+    monkeypatch.setattr(paint_mcp_tools, "backend_name", "headless")
+
+    async def scenario():
+        async with create_connected_server_and_client_session(paint_mcp_tools.mcp._mcp_server) as session:
+            await call(session, "open_paint")
+            await call(session, "draw_oval", x1=100, y1=100, x2=400, y2=400)
+            await call(session, "draw_oval", x1=170, y1=180, x2=190, y2=200)
+            await call(session, "draw_oval", x1=300, y1=180, x2=320, y2=200)
+            await call(session, "add_text_in_paint", text="Face", x=500, y=200)
+            shapes = await call(session, "verify_task", task="shape", expected_count=3)
+            text = await call(session, "verify_task", task="text", expected_count=1)
+            return shapes, text
+
+    shapes, text = asyncio.run(scenario())
+    assert "Verification successful" in shapes, shapes
+    assert "Verification successful" in text, text
@@ -0,0 +1,194 @@
+# Append-only journal of the tool calls the agent executed, and LLM-free replay of it.
+#
+# talk2mcp-2.py writes one JSON line per run and per tool call when AGENT_JOURNAL
+# (or --journal) names a file. Replaying a run sends the recorded calls straight
+# to a fresh tool server, so a known drawing is regenerated for the cost of the
+# tool calls alone:
+#
+#   python tool_journal.py journal.jsonl                 lists the recorded runs
+#   python tool_journal.py journal.jsonl --replay RUN_ID [--batch] [--no-verify] [--backend headless]
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from agent_history import result_failed
+from tool_table import BATCH_TOOL, as_batch_operation, unwrap_content
+
+# Calls that do not change the canvas and are not needed to reproduce it
+DISPLAY_TOOLS = ("show_reasoning", "get_canvas_snapshot", "query_canvas")
+
+
+def failed_operations(arguments, result):
+    """Indexes of the failed operations of a draw_batch call, from its one result item per operation"""
+    count = len(arguments.get("operations") or ())
+    if not isinstance(result, list) or len(result) != count:
+        # The batch as a whole failed or returned something else
+        return list(range(count)) if result_failed(result) else []
+    return [index for index, item in enumerate(result) if result_failed(item)]
+
+
+class ToolJournal:
+    """Writes a "run" line when a session starts and a "call" line per executed tool call"""
+
+    def __init__(self, path=None, max_result_chars=200):
+        self.path = path
+        self.max_result_chars = max_result_chars
+        self._file = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("AGENT_JOURNAL") or None)
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def start_run(self, run_id, query):
+        self._write({"type": "run", "run_id": run_id, "time": time.time(), "query": query})
+
+    def record(self, run_id, name, arguments, result, seconds):
+        """
+        Record a call with its coerced arguments and its result, a string or a
+        list of content texts; long results are truncated. A draw_batch call
+        also records the indexes of its failed operations.
+        """
+        result_str = f"[{', '.join(result)}]" if isinstance(result, list) else result
+        record = {
+            "type": "call",
+            "run_id": run_id,
+            "name": name,
+            "args": arguments,
+            "result": result_str[:self.max_result_chars],
+            "failed": result_failed(result),
+            "ms": round(seconds * 1000, 3),
+        }
+        if name == BATCH_TOOL:
+            record["failed_operations"] = failed_operations(arguments, result)
+        self._write(record)
+
+    def _write(self, record):
+        if not self.enabled:
+            return
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+
+def load_runs(path):
+    """Map run_id -> {"query": ..., "calls": [...]} in journal order"""
+    runs = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            run = runs.setdefault(record["run_id"], {"query": None, "calls": []})
+            if record["type"] == "run":
+                run["query"] = record["query"]
+            else:
+                run["calls"].append(record)
+    return runs
+
+
+def replay_plan(calls, batch=False, verify=True, batch_size=100):
+    """
+    The (name, args) calls to send for a recorded run: successful calls only,
+    without display-only calls, optionally without verify_task, and with
+    consecutive drawing calls merged into draw_batch calls when `batch` is set.
+    Of a draw_batch call only the operations that succeeded are sent.
+    """
+    plan = []
+    operations = []
+
+    def flush():
+        if operations:
+            plan.append((BATCH_TOOL, {"operations": list(operations)}))
+            operations.clear()
+
+    for call in calls:
+        name, args = call["name"], call["args"]
+        if name == BATCH_TOOL and "failed_operations" in call:
+            failed = set(call["failed_operations"])
+            args = {**args, "operations": [op for i, op in enumerate(args["operations"]) if i not in failed]}
+            if not args["operations"]:
+                continue
+        elif call["failed"]:
+            continue
+        if name in DISPLAY_TOOLS or (not verify and name == "verify_task"):
+            continue
+        operation = as_batch_operation(name, args) if batch else None
+        if operation is not None:
+            operations.append(operation)
+        elif batch and name == BATCH_TOOL:
+            operations.extend(args["operations"])
+        else:
+            flush()
+            plan.append((name, args))
+            continue
+        if len(operations) >= batch_size:
+            flush()
+    flush()
+    return plan
+
+
+async def replay(plan, backend):
+    """Send `plan` to a new tool server; returns (results, seconds spent in tool calls)"""
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    server_params = StdioServerParameters(
+        command=sys.executable,
+        args=["paint_mcp_tools.py", "--backend", backend],
+        env=dict(os.environ)
+    )
+    results = []
+    tool_seconds = 0.0
+    async with stdio_client(server_params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            for name, args in plan:
+                started = time.perf_counter()
+                result = await session.call_tool(name, arguments=args)
+                tool_seconds += time.perf_counter() - started
+                results.append(unwrap_content([item.text for item in result.content if hasattr(item, "text")]))
+    return results, tool_seconds
+
+
+def print_runs(runs):
+    for run_id, run in runs.items():
+        calls = run["calls"]
+        ms = sum(call["ms"] for call in calls)
+        query = (run["query"] or "")[:60]
+        print(f"{run_id}  {len(calls):5} calls  {ms:9.1f} ms  {query}")
+
+
+async def main(path, run_id, batch, verify, backend):
+    runs = load_runs(path)
+    if run_id is None:
+        print_runs(runs)
+        return
+    if run_id not in runs:
+        sys.exit(f"No run {run_id} in {path}")
+    calls = runs[run_id]["calls"]
+    plan = replay_plan(calls, batch=batch, verify=verify)
+    started = time.perf_counter()
+    results, tool_seconds = await replay(plan, backend)
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for result in results if result_failed(result))
+    print(f"Replayed {len(calls)} recorded calls as {len(plan)} calls in {elapsed:.2f}s "
+          f"({tool_seconds:.2f}s in tools), {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or replay the tool calls recorded with AGENT_JOURNAL")
+    parser.add_argument("journal", help="JSONL journal file")
+    parser.add_argument("--replay", metavar="RUN_ID", help="replay this run against a new tool server")
+    parser.add_argument("--batch", action="store_true", help="merge consecutive drawing calls into draw_batch calls")
+    parser.add_argument("--no-verify", action="store_true", help="skip the recorded verify_task calls")
+    parser.add_argument("--backend", default=os.getenv("PAINT_BACKEND", "paint"), help="canvas backend of the server")
+    args = parser.parse_args()
+    asyncio.run(main(args.journal, args.replay, args.batch, not args.no_verify, args.backend))
@@ -0,0 +1,156 @@
+# The MCP tool list compiled once per server connection for the agent loop:
+# a name-indexed table whose entries carry a prebuilt argument coercer and the
+# tool's line of the system prompt, so nothing is re-derived on every call.
+import json
+
+_decoder = json.JSONDecoder()
+
+
+def _to_array(value):
+    if not isinstance(value, str):
+        return value
+    try:
+        # A JSON-encoded array (e.g. draw_batch operations)
+        return json.loads(value)
+    except json.JSONDecodeError:
+        # Convert a comma-separated string into a list of integers
+        return [int(x.strip()) for x in value.strip('[]').split(',')]
+
+
+# Conversion per JSON schema type; anything else is passed on as a string
+COERCERS = {
+    "integer": int,
+    "number": float,
+    "array": _to_array,
+}
+
+
+# The server's draw_batch tool takes a list of drawing operations; besides the
+# draw_<shape> tools, add_text_in_paint calls can be merged into it
+BATCH_TOOL = "draw_batch"
+TEXT_TOOL = "add_text_in_paint"
+
+
+def as_batch_operation(name, args):
+    """The draw_batch operation equivalent to a drawing call, or None for other tools"""
+    if name.startswith("draw_") and name != BATCH_TOOL:
+        return {"type": name[len("draw_"):], **args}
+    if name == TEXT_TOOL:
+        return {"type": "text", **args}
+    return None
+
+
+def unwrap_content(texts):
+    """
+    The content texts of a tool result. FastMCP sends a tool's
+    {"content": [...]} return value as one JSON text; its items are returned
+    instead, so e.g. every draw_batch operation keeps its own result.
+    """
+    if len(texts) != 1 or not texts[0].startswith("{"):
+        return texts
+    try:
+        value = json.loads(texts[0])
+    except json.JSONDecodeError:
+        return texts
+    items = value.get("content") if isinstance(value, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) and "text" in item for item in items):
+        return texts
+    return [item["text"] for item in items]
+
+
+def _schema_type(param_info):
+    """The JSON schema type of a parameter; Optional[T] parameters (anyOf T, null) count as T"""
+    if "type" in param_info:
+        return param_info["type"]
+    types = [option.get("type") for option in param_info.get("anyOf", ()) if option.get("type") != "null"]
+    return types[0] if len(types) == 1 else "unknown"
+
+
+class CompiledTool:
+    """One tool with its argument coercers and prompt line prepared up front"""
+
+    def __init__(self, tool, index):
+        self.tool = tool
+        self.name = getattr(tool, 'name', f'tool_{index}')
+        self.coercers = {}
+        try:
+            params = tool.inputSchema
+            desc = getattr(tool, 'description', 'No description available')
+            # Format the input schema in a more readable way
+            if 'properties' in params:
+                param_details = []
+                for param_name, param_info in params['properties'].items():
+                    param_type = _schema_type(param_info)
+                    param_details.append(f"{param_name}: {param_type}")
+                    self.coercers[param_name] = COERCERS.get(param_type, str)
+                params_str = ', '.join(param_details)
+            else:
+                params_str = 'no parameters'
+            self.fragment = f"{index + 1}. {self.name}({params_str}) - {desc}"
+            self.error = None
+        except Exception as e:
+            self.fragment = f"{index + 1}. Error processing tool"
+            self.error = e
+
+    def coerce(self, arguments):
+        """Convert each known argument in place to the type its schema declares"""
+        for param_name, coerce in self.coercers.items():
+            # None is left alone for Optional parameters
+            if arguments.get(param_name) is not None:
+                arguments[param_name] = coerce(arguments[param_name])
+        return arguments
+
+
+class ToolTable:
+    """Tools of one server by name, plus the rendered tool list for the system prompt"""
+
+    def __init__(self, tools):
+        self.tools = list(tools)
+        self.compiled = [CompiledTool(tool, i) for i, tool in enumerate(self.tools)]
+        self.by_name = {compiled.name: compiled for compiled in self.compiled}
+        self.description = "\n".join(compiled.fragment for compiled in self.compiled)
+
+    def __iter__(self):
+        return iter(self.tools)
+
+    def __len__(self):
+        return len(self.tools)
+
+    def get(self, name):
+        """The compiled tool called `name`, or None"""
+        return self.by_name.get(name)
+
+    @property
+    def names(self):
+        return list(self.by_name)
+
+
+def parse_call(text):
+    """
+    Return (name, args) from the JSON object of a FUNCTION_CALL line.
+
+    Tolerates what models tend to wrap around it: markdown backticks or a
+    ```json fence, text after the object, and a call or its args encoded
+    as a JSON string (double-encoded) instead of an object.
+    """
+    body = text.strip().strip("`").strip()
+    if body[:4].lower() == "json":
+        body = body[4:].lstrip()
+    call_obj = _decode_prefix(body)
+    # A double-encoded call decodes to a string holding the real object
+    while isinstance(call_obj, str):
+        call_obj = _decode_prefix(call_obj.strip())
+    if not isinstance(call_obj, dict):
+        raise ValueError(f"Expected a JSON object, got {type(call_obj).__name__}")
+    arguments = call_obj.get("args") or {}
+    if isinstance(arguments, str):
+        arguments = _decode_prefix(arguments.strip())
+    if not isinstance(arguments, dict):
+        raise ValueError(f"Expected the args to be a JSON object, got {type(arguments).__name__}")
+    return call_obj["name"], arguments
+
+
+def _decode_prefix(text):
+    """Decode the JSON value at the start of `text`, ignoring whatever follows it"""
+    value, _ = _decoder.raw_decode(text)
+    return value
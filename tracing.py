@@ -0,0 +1,139 @@
+# Structured latency tracing shared by talk2mcp-2.py and paint_mcp_tools.py.
+#
+# Spans are appended as JSON lines to the file named by PAINT_TRACE_FILE (tracing is
+# off when it is unset). Every span carries the run ID of the agent session that
+# caused it; the client sends it to the server in each tool call's _meta.
+#
+#   python tracing.py trace.jsonl [--run-id ID]   prints p50/p95 per stage and tool
+import argparse
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+TRACE_FILE_ENV = "PAINT_TRACE_FILE"
+
+_run_id = contextvars.ContextVar("run_id", default=None)
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+def current_run_id():
+    return _run_id.get()
+
+
+def set_run_id(run_id):
+    """Set the run ID for the current task/context; returns a token for reset_run_id"""
+    return _run_id.set(run_id)
+
+
+def reset_run_id(token):
+    _run_id.reset(token)
+
+
+class Tracer:
+    """Writes one JSON line per span: name, start time, duration and attributes"""
+
+    def __init__(self, path=None, process="client"):
+        self.path = path
+        self.process = process
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, process):
+        return cls(os.getenv(TRACE_FILE_ENV) or None, process)
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Time the enclosed block. Yields the attribute dict, so the block can
+        add attributes (e.g. whether a cache was hit) before the span is written.
+        """
+        if not self.enabled:
+            yield attrs
+            return
+        started = time.time()
+        t0 = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self._write({
+                "run_id": attrs.pop("run_id", None) or current_run_id(),
+                "process": self.process,
+                "pid": os.getpid(),
+                "name": name,
+                "start": started,
+                "ms": round((time.perf_counter() - t0) * 1000, 3),
+                **attrs,
+            })
+
+    def _write(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            # One write per line keeps lines from several processes intact
+            self._file.write(line)
+            self._file.flush()
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of `values`: the smallest value at or above q percent of them"""
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarize(path, run_id=None):
+    """Return rows of (stage, count, p50, p95, max) in milliseconds"""
+    durations = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if run_id and record.get("run_id") != run_id:
+                continue
+            stage = f"{record['process']}:{record['name']}"
+            if record.get("tool"):
+                stage += f"[{record['tool']}]"
+            durations[stage].append(record["ms"])
+    rows = []
+    for stage, values in sorted(durations.items()):
+        values.sort()
+        rows.append((stage, len(values), percentile(values, 50), percentile(values, 95), values[-1]))
+    return rows
+
+
+def print_summary(path, run_id=None):
+    rows = summarize(path, run_id)
+    if not rows:
+        print("No spans found.")
+        return
+    width = max(len(row[0]) for row in rows)
+    print(f"{'stage'.ljust(width)}  {'count':>6}  {'p50 ms':>9}  {'p95 ms':>9}  {'max ms':>9}")
+    for stage, count, p50, p95, peak in rows:
+        print(f"{stage.ljust(width)}  {count:>6}  {p50:>9.2f}  {p95:>9.2f}  {peak:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a span trace written with PAINT_TRACE_FILE")
+    parser.add_argument("trace", help="JSONL trace file")
+    parser.add_argument("--run-id", help="only include spans of this run")
+    args = parser.parse_args()
+    print_summary(args.trace, args.run_id)
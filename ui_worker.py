@@ -0,0 +1,76 @@
+# Dedicated thread for blocking UI automation, so tool handlers never block the event loop
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+def wait_until(predicate, timeout=2.0, interval=0.02):
+    """
+    Poll `predicate` until it returns a truthy value or `timeout` seconds pass.
+    Returns the last value, so callers can tell a timeout from success.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        value = predicate()
+        if value or time.monotonic() >= deadline:
+            return value
+        time.sleep(interval)
+
+
+class UIWorker:
+    """
+    Runs submitted callables one at a time, in order, on a single thread.
+
+    UI automation must not run concurrently (there is one mouse and one
+    keyboard) and COM-based automation is tied to the thread that set it up,
+    so every backend call goes through the same long-lived thread. Tool
+    handlers await the returned future and the event loop stays free to serve
+    other requests meanwhile.
+    """
+
+    def __init__(self, name="ui-worker"):
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            future, context, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                # Run in the submitter's context so context variables (e.g. the trace run ID) carry over
+                future.set_result(context.run(fn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` and return a concurrent.futures.Future"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, contextvars.copy_context(), fn, args, kwargs))
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` and await its result"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stop(self):
+        """Let the thread finish the queued work and exit"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None